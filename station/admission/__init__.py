@@ -0,0 +1,7 @@
+"""Package that protects the station from more connections and data than it can handle."""
+
+from .admission import AdmissionControl
+from .backpressure import Backpressure
+from .token_bucket import TokenBucket
+
+__all__ = ('AdmissionControl', 'Backpressure', 'TokenBucket', )
@@ -0,0 +1,57 @@
+from typing import Dict
+
+from .token_bucket import TokenBucket
+
+
+class AdmissionControl:
+    """Decides whether station accepts a new connection, so a reconnect storm can not overwhelm it.
+
+    Connections are rejected (closed right away, devices retry later) when station already serves
+    `max_connections` of them or when they arrive faster than `accept_rate` per second, beyond a burst of `accept_burst`.
+    Accepted connections have `handshake_timeout` seconds to send their first bytes, so protocol can be identified.
+
+    Attributes:
+        max_connections:
+            Maximum amount of connections served at once, `0` for no limit.
+        handshake_timeout:
+            Seconds to wait for the first bytes of a connection.
+        rejected:
+            Total amount of rejected connections by reason, `full` or `rate`.
+        handshake_timeouts:
+            Total amount of connections closed because they did not send anything in time.
+    """
+
+    def __init__(self, max_connections: int = 0, accept_rate: float = 0.0, accept_burst: int = 100, handshake_timeout: float = 10.0) -> None:
+        self.max_connections = max_connections
+        self.handshake_timeout = handshake_timeout
+        self.rejected: Dict[str, int] = {'full': 0, 'rate': 0}
+        self.handshake_timeouts = 0
+        self._accept_bucket = TokenBucket(accept_rate, accept_burst) if accept_rate > 0 else None
+
+    def stats(self) -> Dict[str, int]:
+        """Return counters of rejected connections."""
+        return {
+            'rejected_full': self.rejected['full'],
+            'rejected_rate': self.rejected['rate'],
+            'handshake_timeouts': self.handshake_timeouts,
+        }
+
+    def admit(self, active_connections: int) -> str | None:
+        """Decide whether to accept a new connection.
+
+        Args:
+            active_connections:
+                Amount of connections station is serving, not including the new one.
+
+        Returns:
+            `None` if connection is accepted, reason of rejection otherwise.
+        """
+        if self.max_connections and active_connections >= self.max_connections:
+            reason = 'full'
+        elif self._accept_bucket is not None and not self._accept_bucket.try_acquire():
+            reason = 'rate'
+        else:
+            return None
+
+        self.rejected[reason] += 1
+        return reason
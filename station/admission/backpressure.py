@@ -0,0 +1,80 @@
+import asyncio
+from typing import TYPE_CHECKING, Dict
+
+from logger import logger
+
+if TYPE_CHECKING:
+    from pipeline import BaseStage
+    from uplink import UplinkFanout, UplinkQueue
+
+
+class Backpressure:
+    """Stops protocols from reading their devices while the uplink is backlogged.
+
+    Once more than `high_water` payloads wait in the uplink, protocols wait before their next read
+    until the backlog drains below `low_water`. Unread data stays in stream reader's buffer and then in the
+    kernel's socket buffers, TCP flow control makes devices hold on to their records instead of the station
+    holding them in memory. Backlog is sampled every `interval` seconds, so checking it costs nothing per packet.
+
+    Attributes:
+        uplink:
+            Uplink whose `depth` is watched.
+        high_water:
+            Backlog above which reading is paused.
+        low_water:
+            Backlog below which reading is resumed.
+        interval:
+            Seconds between samples of the backlog.
+        pauses:
+            Total amount of times reading was paused.
+    """
+
+    def __init__(self, uplink: 'BaseStage | UplinkQueue | UplinkFanout', high_water: int, low_water: int, interval: float = 0.05) -> None:
+        self.uplink = uplink
+        self.high_water = high_water
+        self.low_water = low_water
+        self.interval = interval
+        self.pauses = 0
+        self._resumed = asyncio.Event()
+        self._resumed.set()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def paused(self) -> bool:
+        return not self._resumed.is_set()
+
+    def stats(self) -> Dict[str, int]:
+        return {'paused': int(self.paused), 'pauses': self.pauses}
+
+    def start(self) -> None:
+        """Start sampling the backlog, must be called from within a running event loop."""
+        self._task = asyncio.create_task(self._watch())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+        # Protocols still waiting must not be left hanging.
+        self._resumed.set()
+
+    async def wait(self) -> None:
+        """Return once reading devices is allowed, right away unless uplink is backlogged."""
+        if not self._resumed.is_set():
+            await self._resumed.wait()
+
+    def update(self, depth: int) -> None:
+        """Pause or resume reading according to the current backlog."""
+        if depth > self.high_water and self._resumed.is_set():
+            self._resumed.clear()
+            self.pauses += 1
+            logger.warning('Uplink backlog of %s payloads is above %s, stopped reading devices until it drains below %s.', depth, self.high_water, self.low_water)
+        elif depth < self.low_water and not self._resumed.is_set():
+            self._resumed.set()
+            logger.warning('Uplink backlog drained to %s payloads, resumed reading devices.', depth)
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            self.update(self.uplink.depth)
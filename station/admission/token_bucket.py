@@ -0,0 +1,42 @@
+import time
+
+
+class TokenBucket:
+    """Rate limiter that allows bursts of up to `burst` events and `rate` events per second on average.
+
+    Attributes:
+        rate:
+            Tokens added per second.
+        burst:
+            Maximum amount of tokens, bucket starts full.
+        tokens:
+            Tokens currently available.
+    """
+
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self._updated_at = time.monotonic()
+
+    def try_acquire(self, now: float | None = None) -> bool:
+        """Take a token if one is available.
+
+        Args:
+            now:
+                `time.monotonic()`, read when not given.
+
+        Returns:
+            Whether a token was taken.
+        """
+        if now is None:
+            now = time.monotonic()
+
+        self.tokens = min(self.burst, self.tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+        if self.tokens < 1:
+            return False
+
+        self.tokens -= 1
+        return True
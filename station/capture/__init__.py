@@ -0,0 +1,6 @@
+"""Package that records raw traffic of devices into segment files and reads it back for replaying."""
+
+from .format import CaptureRecord, read_segment, SEGMENT_SUFFIX, OPENED, RECEIVED, IDENTIFIED, CLOSED
+from .writer import CaptureWriter
+
+__all__ = ('CaptureRecord', 'read_segment', 'SEGMENT_SUFFIX', 'OPENED', 'RECEIVED', 'IDENTIFIED', 'CLOSED', 'CaptureWriter', )
@@ -0,0 +1,49 @@
+import struct
+from typing import BinaryIO, Iterator, NamedTuple
+
+# Every segment file starts with it, version is bumped when format of records changes.
+MAGIC = b'GPSCAP01'
+SEGMENT_SUFFIX = '.capture'
+
+# Timestamp (`time.time()`), connection id, kind of the record and length of data that follows the header.
+RECORD_HEADER = struct.Struct('<dIBI')
+
+# Kinds of records, data of `OPENED` is `address:port` of the peer, of `IDENTIFIED` IMEI of the device
+# and of `RECEIVED` bytes read from the connection. `CLOSED` has no data.
+OPENED = 0
+RECEIVED = 1
+IDENTIFIED = 2
+CLOSED = 3
+
+
+class CaptureRecord(NamedTuple):
+    timestamp: float
+    connection_id: int
+    kind: int
+    data: bytes
+
+
+def read_segment(file: BinaryIO) -> Iterator[CaptureRecord]:
+    """Read records of a capture segment file opened in binary mode.
+
+    Last record of a segment that was being written when station stopped can be incomplete, it is skipped.
+
+    Raises:
+        ValueError: If file is not a capture segment.
+    """
+    if file.read(len(MAGIC)) != MAGIC:
+        raise ValueError(f'{getattr(file, "name", file)} is not a capture segment.')
+
+    while True:
+        header = file.read(RECORD_HEADER.size)
+
+        if len(header) < RECORD_HEADER.size:
+            return
+
+        timestamp, connection_id, kind, length = RECORD_HEADER.unpack(header)
+        data = file.read(length)
+
+        if len(data) < length:
+            return
+
+        yield CaptureRecord(timestamp, connection_id, kind, data)
@@ -0,0 +1,142 @@
+import asyncio
+import os
+import time
+from typing import BinaryIO, List
+
+from logger import logger
+
+from .format import MAGIC, SEGMENT_SUFFIX, RECORD_HEADER, OPENED, RECEIVED, IDENTIFIED, CLOSED
+
+
+class CaptureWriter:
+    """Records raw bytes read from every connection into compact binary segment files, so they can be replayed.
+
+    Records are appended to an in-memory buffer and written out every `flush_interval` seconds (or once the buffer
+    reaches `buffer_size`), capturing costs a few appends per read. A new segment is started once the current one
+    reaches `segment_size`, oldest segments are deleted when their total size exceeds `max_size`.
+    Segments of a single run of the writer are named `<run>-<sequence>.capture`, where run is the time writer was
+    started at in milliseconds, connection ids are only unique within a run.
+
+    Attributes:
+        directory:
+            Directory segments are written to.
+        segment_size:
+            Size in bytes after which a new segment is started.
+        max_size:
+            Maximum total size of all segments in the directory, in bytes.
+        flush_interval:
+            Maximum amount of seconds records stay in the buffer.
+        buffer_size:
+            Size of the buffer in bytes after which it is written out right away.
+        run:
+            Id of the current run, prefix of its segment names.
+        dropped:
+            Total amount of segments deleted because `max_size` was exceeded.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        segment_size: int = 64_000_000,
+        max_size: int = 10_000_000_000,
+        flush_interval: float = 1.0,
+        buffer_size: int = 1_000_000,
+    ) -> None:
+        self.directory = directory
+        self.segment_size = segment_size
+        self.max_size = max_size
+        self.flush_interval = flush_interval
+        self.buffer_size = buffer_size
+        self.run = int(time.time() * 1000)
+        self.dropped = 0
+
+        os.makedirs(directory, exist_ok=True)
+
+        self._segments: List[str] = sorted(filename for filename in os.listdir(directory) if filename.endswith(SEGMENT_SUFFIX))
+        self._size = sum(os.path.getsize(os.path.join(directory, filename)) for filename in self._segments)
+        self._sequence = 0
+        self._buffer = bytearray()
+        self._next_connection_id = 0
+        self._file: BinaryIO = self._open_segment()
+        self._flush_task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        """Start background task that writes out the buffer, must be called from within a running event loop."""
+        self._flush_task = asyncio.create_task(self._flush_periodically())
+
+    async def close(self) -> None:
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+
+        self.flush()
+        self._file.close()
+        logger.info('Capture closed, last segment: %s', self._segments[-1])
+
+    def opened(self, peer: str) -> int:
+        """Record a new connection and return its id that the rest of its records are written with."""
+        connection_id = self._next_connection_id
+        self._next_connection_id = (connection_id + 1) & 0xFFFFFFFF
+        self._append(OPENED, connection_id, peer.encode())
+        return connection_id
+
+    def received(self, connection_id: int, data: bytes) -> None:
+        self._append(RECEIVED, connection_id, data)
+
+    def identified(self, connection_id: int, imei: str) -> None:
+        self._append(IDENTIFIED, connection_id, imei.encode())
+
+    def closed(self, connection_id: int) -> None:
+        self._append(CLOSED, connection_id, b'')
+
+    def flush(self) -> None:
+        """Write out buffered records, starting a new segment (and deleting oldest ones) when needed."""
+        if not self._buffer:
+            return
+
+        try:
+            self._file.write(self._buffer)
+            self._file.flush()
+        except OSError as e:
+            # Capture is a debugging aid, it must never take connections down with it.
+            logger.error('Could not write capture, dropped %s bytes of it. %s: %s', len(self._buffer), e.__class__.__name__, e)
+            self._buffer.clear()
+            return
+
+        self._size += len(self._buffer)
+        self._buffer.clear()
+
+        if self._file.tell() >= self.segment_size:
+            self._file.close()
+            self._file = self._open_segment()
+
+        while self._size > self.max_size and len(self._segments) > 1:
+            oldest = self._segments.pop(0)
+            path = os.path.join(self.directory, oldest)
+            self._size -= os.path.getsize(path)
+            os.remove(path)
+            self.dropped += 1
+            logger.warning('Capture exceeded %s bytes, deleted its oldest segment %s.', self.max_size, oldest)
+
+    def _append(self, kind: int, connection_id: int, data: bytes) -> None:
+        buffer = self._buffer
+        buffer += RECORD_HEADER.pack(time.time(), connection_id, kind, len(data))
+        buffer += data
+
+        if len(buffer) >= self.buffer_size:
+            self.flush()
+
+    def _open_segment(self) -> BinaryIO:
+        filename = f'{self.run}-{self._sequence:06d}{SEGMENT_SUFFIX}'
+        self._sequence += 1
+        self._segments.append(filename)
+        file = open(os.path.join(self.directory, filename), 'wb')
+        file.write(MAGIC)
+        self._size += len(MAGIC)
+        return file
+
+    async def _flush_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            self.flush()
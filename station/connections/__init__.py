@@ -0,0 +1,6 @@
+"""Package that keeps track of devices connected to the station."""
+
+from .registry import Connection, ConnectionListener, ConnectionRegistry
+from .timer_wheel import TimerWheel
+
+__all__ = ('Connection', 'ConnectionListener', 'ConnectionRegistry', 'TimerWheel', )
@@ -0,0 +1,240 @@
+import asyncio
+import time
+from typing import TYPE_CHECKING, Dict, List, Tuple
+
+from logger import logger
+from metrics import CONNECTIONS_CLOSED
+
+from .timer_wheel import TimerWheel
+
+# `protocols` import this package, importing them at runtime would be circular.
+if TYPE_CHECKING:
+    from capture import CaptureWriter
+    from protocols import BaseProtocol
+
+# (address, port) of the remote end of a connection.
+Peer = Tuple[str, int]
+
+
+class Connection:
+    """A device connected to the station.
+
+    Attributes:
+        peer:
+            Address and port of the device.
+        writer:
+            Stream writer of the connection, used to close it and to send data to the device.
+        registry:
+            Registry the connection belongs to.
+        imei:
+            IMEI of the device, `None` until the device sends its first packet that can be decoded.
+        protocol:
+            Protocol instance serving the connection, `None` until protocol is identified.
+        last_activity:
+            `time.monotonic()` of the last time data was read from the device.
+        closed_reason:
+            Why the registry closed the connection, `None` if it did not.
+        timer_slot:
+            Slot of registry's timer wheel the connection is scheduled in.
+        capture_id:
+            Id of the connection in registry's capture, `None` when traffic is not captured.
+    """
+
+    __slots__ = ('peer', 'writer', 'registry', 'imei', 'protocol', 'last_activity', 'closed_reason', 'timer_slot', 'capture_id')
+
+    def __init__(self, peer: Peer, writer: asyncio.StreamWriter, registry: 'ConnectionRegistry') -> None:
+        self.peer = peer
+        self.writer = writer
+        self.registry = registry
+        self.imei: str | None = None
+        self.protocol: 'BaseProtocol | None' = None
+        self.last_activity = time.monotonic()
+        self.closed_reason: str | None = None
+        self.timer_slot: int | None = None
+        self.capture_id: int | None = None
+
+    def received(self, data: bytes) -> None:
+        """Record that data was read from the device (and capture it, if enabled), called by protocols after every read."""
+        self.last_activity = time.monotonic()
+
+        if self.capture_id is not None:
+            self.registry.capture.received(self.capture_id, data)
+
+    def close(self, reason: str) -> None:
+        """Close the connection right away, without waiting for buffered data to be sent.
+
+        Pending read of the protocol serving the connection returns `b''`, so it terminates as if device disconnected.
+        """
+        self.closed_reason = reason
+        self.writer.transport.abort()
+
+
+class ConnectionListener:
+    """Receives events of devices connected to a `ConnectionRegistry`, subclasses override the ones they need."""
+
+    def device_identified(self, connection: Connection) -> None:
+        """Called once the device of `connection` reported its IMEI."""
+
+    def device_disconnected(self, connection: Connection) -> None:
+        """Called when connection of an identified device is unregistered."""
+
+    def device_replied(self, connection: Connection, reply_key: str, reply: str) -> None:
+        """Called when device replied to a command that was sent to it.
+
+        Args:
+            connection:
+                Connection the reply was read from.
+            reply_key:
+                Protocol specific identifier of the command being replied to.
+            reply:
+                Reply as the device sent it.
+        """
+
+
+class ConnectionRegistry:
+    """Station's connections, indexed by peer address and by IMEI of the device.
+
+    Connections that do not send anything for `idle_timeout` seconds (e.g. half-open ones left behind
+    by cellular networks) are closed by a single background task that advances a `TimerWheel`, so reads
+    do not need timeouts of their own and recording activity of a connection is a single assignment.
+    When a device connects again while its previous connection is still registered, the previous
+    (stale) connection is closed as soon as the new one identifies the device.
+
+    Attributes:
+        idle_timeout:
+            Seconds a connection can stay silent before it is closed.
+        by_peer:
+            Connections by address and port of the device.
+        by_imei:
+            Connections by IMEI of the device, only those whose device was identified.
+        closed_idle:
+            Total amount of connections closed because they were idle.
+        closed_replaced:
+            Total amount of connections closed because the same device connected again.
+        listeners:
+            Notified when devices are identified, disconnect or reply to commands.
+        capture:
+            Writer raw traffic of every connection is recorded with, `None` when it is not captured.
+    """
+
+    def __init__(self, idle_timeout: float = 600.0, resolution: float = 1.0, capture: 'CaptureWriter | None' = None) -> None:
+        self.idle_timeout = idle_timeout
+        self.by_peer: Dict[Peer, Connection] = {}
+        self.by_imei: Dict[str, Connection] = {}
+        self.closed_idle = 0
+        self.closed_replaced = 0
+        self.listeners: List[ConnectionListener] = []
+        self.capture = capture
+        self._wheel: TimerWheel[Connection] = TimerWheel(resolution, slot_count=max(int(idle_timeout / resolution) + 2, 2))
+        self._expiry_task: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return len(self.by_peer)
+
+    def stats(self) -> Dict[str, int]:
+        """Return counters describing registered and closed connections."""
+        return {
+            'identified': len(self.by_imei),
+            'closed_idle': self.closed_idle,
+            'closed_replaced': self.closed_replaced,
+        }
+
+    def start(self) -> None:
+        """Start background task that closes idle connections, must be called from within a running event loop."""
+        self._expiry_task = asyncio.create_task(self._close_idle_periodically())
+
+    async def close(self) -> None:
+        if self._expiry_task is not None:
+            self._expiry_task.cancel()
+            await asyncio.gather(self._expiry_task, return_exceptions=True)
+            self._expiry_task = None
+
+    def register(self, peer: Peer, writer: asyncio.StreamWriter) -> Connection:
+        """Register a newly accepted connection and start tracking its idle time."""
+        connection = Connection(peer, writer, self)
+        self.by_peer[peer] = connection
+
+        if self.capture is not None:
+            connection.capture_id = self.capture.opened(f'{peer[0]}:{peer[1]}')
+        connection.timer_slot = self._wheel.add(connection, connection.last_activity + self.idle_timeout)
+        return connection
+
+    def unregister(self, connection: Connection) -> None:
+        """Forget a connection that was closed."""
+        if self.by_peer.get(connection.peer) is connection:
+            del self.by_peer[connection.peer]
+
+        if connection.imei is not None and self.by_imei.get(connection.imei) is connection:
+            del self.by_imei[connection.imei]
+
+            for listener in self.listeners:
+                listener.device_disconnected(connection)
+
+        if connection.timer_slot is not None:
+            self._wheel.discard(connection, connection.timer_slot)
+            connection.timer_slot = None
+
+        if connection.capture_id is not None:
+            self.capture.closed(connection.capture_id)
+            connection.capture_id = None
+
+    def identify(self, connection: Connection, imei: str) -> None:
+        """Associate connection with IMEI of its device, closing the device's previous connection if there is one.
+
+        Args:
+            connection:
+                Registered connection.
+            imei:
+                IMEI the device reported.
+        """
+        if connection.imei is not None and self.by_imei.get(connection.imei) is connection:
+            del self.by_imei[connection.imei]
+
+        connection.imei = imei
+        previous = self.by_imei.get(imei)
+
+        if connection.capture_id is not None:
+            self.capture.identified(connection.capture_id, imei)
+        self.by_imei[imei] = connection
+
+        if previous is not None and previous is not connection:
+            self.closed_replaced += 1
+            CONNECTIONS_CLOSED.labels('replaced').inc()
+            logger.info('Device IMEI:%s connected again from %s:%s, closing its previous connection from %s:%s.', imei, connection.peer[0], connection.peer[1], previous.peer[0], previous.peer[1])
+            previous.close('replaced')
+
+        for listener in self.listeners:
+            listener.device_identified(connection)
+
+    def reply_received(self, connection: Connection, reply_key: str, reply: str) -> None:
+        """Pass reply of a device to a command on to listeners, see `ConnectionListener.device_replied`."""
+        for listener in self.listeners:
+            listener.device_replied(connection, reply_key, reply)
+
+    def close_idle(self, now: float) -> None:
+        """Close connections that have been idle for `idle_timeout` seconds as of `now`."""
+        for connection in self._wheel.advance(now):
+            connection.timer_slot = None
+
+            if self.by_peer.get(connection.peer) is not connection:
+                continue
+
+            deadline = connection.last_activity + self.idle_timeout
+
+            if deadline > now:
+                connection.timer_slot = self._wheel.add(connection, deadline)
+                continue
+
+            self.closed_idle += 1
+            CONNECTIONS_CLOSED.labels('idle').inc()
+            logger.info('Closing connection that was idle for %.0f seconds. (%s:%s - IMEI:%s)', now - connection.last_activity, connection.peer[0], connection.peer[1], connection.imei)
+            connection.close('idle')
+
+    async def _close_idle_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self._wheel.resolution)
+
+            try:
+                self.close_idle(time.monotonic())
+            except Exception as e:
+                logger.critical('Got an unexpected exception when closing idle connections. %s: %s', e.__class__.__name__, e, exc_info=True)
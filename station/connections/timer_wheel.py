@@ -0,0 +1,65 @@
+import math
+from typing import Generic, List, Set, TypeVar
+
+T = TypeVar('T')
+
+
+class TimerWheel(Generic[T]):
+    """Hashed timing wheel of entries with deadlines, advanced by a single periodic task.
+
+    Time is split into ticks of `resolution` seconds, every slot of the wheel holds entries whose deadline falls
+    into one of its ticks. Adding and discarding an entry is O(1) and advancing the wheel only visits entries
+    of the slots it passes. Deadlines further away than one revolution are fine, such entries are simply put
+    back when their slot comes around too early. Entries are not moved when their deadline is postponed,
+    owner re-checks the real deadline of every returned entry and calls `add` again if it is not due yet.
+
+    Attributes:
+        resolution:
+            Length of a tick in seconds, deadlines are rounded up to it.
+    """
+
+    def __init__(self, resolution: float = 1.0, slot_count: int = 512) -> None:
+        self.resolution = resolution
+        self._slots: List[Set[T]] = [set() for _ in range(slot_count)]
+        self._current_tick: int | None = None
+
+    def __len__(self) -> int:
+        return sum(len(slot) for slot in self._slots)
+
+    def add(self, entry: T, deadline: float) -> int:
+        """Schedule `entry` to be returned by `advance` once `deadline` (in seconds of a monotonic clock) passes.
+
+        Returns:
+            Slot the entry was put in, pass it to `discard` to unschedule the entry.
+        """
+        tick = math.ceil(deadline / self.resolution)
+
+        # Deadline in a tick that was already advanced over is due on the next `advance`.
+        if self._current_tick is not None and tick <= self._current_tick:
+            tick = self._current_tick + 1
+
+        slot = tick % len(self._slots)
+        self._slots[slot].add(entry)
+        return slot
+
+    def discard(self, entry: T, slot: int) -> None:
+        """Unschedule `entry` that `add` put in `slot`, if it was not returned by `advance` yet."""
+        self._slots[slot].discard(entry)
+
+    def advance(self, now: float) -> List[T]:
+        """Move the wheel to `now` and return entries of all slots passed on the way."""
+        tick = math.floor(now / self.resolution)
+
+        if self._current_tick is None:
+            self._current_tick = tick - 1
+
+        due: List[T] = []
+
+        # No need to go around more than once, that would visit the same slots again.
+        for passed_tick in range(max(self._current_tick + 1, tick - len(self._slots) + 1), tick + 1):
+            slot = self._slots[passed_tick % len(self._slots)]
+            due.extend(slot)
+            slot.clear()
+
+        self._current_tick = tick
+        return due
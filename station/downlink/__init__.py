@@ -0,0 +1,6 @@
+"""Package that queues commands for devices and writes them on the devices' own connections."""
+
+from .command import DownlinkCommand, COMMAND_GROUPS
+from .dispatcher import DownlinkDispatcher
+
+__all__ = ('DownlinkCommand', 'COMMAND_GROUPS', 'DownlinkDispatcher', )
@@ -0,0 +1,104 @@
+import asyncio
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict
+
+# Commands of the same group change the same setting of a device, a newer one makes queued older ones redundant.
+COMMAND_GROUPS = {
+    'cut_fuel': 'fuel',
+    'restore_fuel': 'fuel',
+    'set_interval': 'interval',
+}
+
+# Statuses of a command, those in `FINAL_STATUSES` never change again.
+QUEUED = 'queued'
+SENT = 'sent'
+CONFIRMED = 'confirmed'
+SUPERSEDED = 'superseded'
+EXPIRED = 'expired'
+UNCONFIRMED = 'unconfirmed'
+FAILED = 'failed'
+FINAL_STATUSES = frozenset({CONFIRMED, SUPERSEDED, EXPIRED, UNCONFIRMED, FAILED})
+
+
+@dataclass(slots=True, eq=False)
+class DownlinkCommand:
+    """Command waiting to be (or already) sent to a device.
+
+    Commands are protocol independent, protocols encode them to bytes of their own format
+    (see `BaseProtocol.encode_command`).
+
+    Attributes:
+        imei:
+            IMEI of the device the command is for.
+        type:
+            One of `COMMAND_GROUPS` keys, e.g. `cut_fuel`.
+        arguments:
+            Arguments of the command, e.g. `{'interval': 30}` for `set_interval`.
+        id:
+            Unique id of the command.
+        status:
+            Current status, one of the status constants of this module.
+        attempts:
+            How many times command was written to the device.
+        reply:
+            Reply of the device that confirmed the command.
+        error:
+            Why command failed, expired or was superseded.
+        created_at:
+            `time.time()` of when the command was submitted.
+        sent_at:
+            `time.time()` of the last time command was written to the device.
+        finished_at:
+            `time.time()` of when command reached one of `FINAL_STATUSES`.
+        finished:
+            Set once command reaches one of `FINAL_STATUSES`.
+        reply_key:
+            What device's reply must contain to confirm the command, provided by the protocol when the command is sent.
+    """
+
+    imei: str
+    type: str
+    arguments: Dict[str, Any] = field(default_factory=dict)
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = QUEUED
+    attempts: int = 0
+    reply: str | None = None
+    error: str | None = None
+    created_at: float = field(default_factory=time.time)
+    sent_at: float | None = None
+    finished_at: float | None = None
+    finished: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+    reply_key: str | None = field(default=None, repr=False)
+
+    @property
+    def group(self) -> str:
+        return COMMAND_GROUPS[self.type]
+
+    def is_redundant_with(self, other: 'DownlinkCommand') -> bool:
+        """Whether `other` would have exactly the same effect on the device."""
+        return self.type == other.type and self.arguments == other.arguments
+
+    def finish(self, status: str, reply: str | None = None, error: str | None = None) -> None:
+        self.status = status
+        self.reply = reply
+        self.error = error
+        self.finished_at = time.time()
+        self.finished.set()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return command in the form it is returned by the local API."""
+        return {
+            'id': self.id,
+            'imei': self.imei,
+            'type': self.type,
+            'arguments': self.arguments,
+            'status': self.status,
+            'attempts': self.attempts,
+            'reply': self.reply,
+            'error': self.error,
+            'created_at': self.created_at,
+            'sent_at': self.sent_at,
+            'finished_at': self.finished_at,
+        }
@@ -0,0 +1,268 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Tuple
+
+from connections import Connection, ConnectionListener, ConnectionRegistry
+from logger import logger
+from metrics import DOWNLINK_COMMANDS
+from protocols.exceptions import UnsupportedCommandError
+
+from .command import (
+    COMMAND_GROUPS, QUEUED, SENT, CONFIRMED, SUPERSEDED, EXPIRED, UNCONFIRMED, FAILED, DownlinkCommand,
+)
+
+
+class DownlinkDispatcher(ConnectionListener):
+    """Queues commands for devices and writes them on the devices' own connections.
+
+    Every device has its own queue of commands and at most one command in flight: the next one is written
+    only after the device replied to the previous one (or did not reply within `reply_timeout` seconds, in which
+    case the command is written again, up to `max_attempts` times). Commands for devices that are not connected
+    wait until the device connects, up to `command_ttl` seconds.
+
+    Submitting a command that would have exactly the same effect as a queued or in-flight one returns the existing command,
+    submitting a different command of the same group (e.g. `restore_fuel` after `cut_fuel`) supersedes the queued one.
+    Queued commands of the group are also superseded when the in-flight command is returned, so a device never receives
+    a burst of commands that undo each other and always ends up in the state that was asked for last.
+
+    Attributes:
+        connections:
+            Registry of connected devices, dispatcher listens to its events.
+        reply_timeout:
+            Seconds to wait for the device to reply to a command before writing it again.
+        max_attempts:
+            How many times a command is written before it is given up on as unconfirmed.
+        command_ttl:
+            Seconds a command can wait for its device to connect, finished commands are kept for as long.
+    """
+
+    def __init__(
+        self,
+        connections: ConnectionRegistry,
+        reply_timeout: float = 30.0,
+        max_attempts: int = 3,
+        command_ttl: float = 3600.0,
+    ) -> None:
+        self.connections = connections
+        self.reply_timeout = reply_timeout
+        self.max_attempts = max_attempts
+        self.command_ttl = command_ttl
+        self.commands: Dict[str, DownlinkCommand] = {}
+        self._queues: Dict[str, Deque[DownlinkCommand]] = {}
+        self._in_flight: Dict[str, Tuple[DownlinkCommand, Connection, asyncio.TimerHandle]] = {}
+        self._sweep_task: asyncio.Task | None = None
+        connections.listeners.append(self)
+
+    def stats(self) -> Dict[str, int]:
+        """Return amounts of queued and in-flight commands."""
+        return {
+            'queued': sum(len(queue) for queue in self._queues.values()),
+            'in_flight': len(self._in_flight),
+        }
+
+    def start(self) -> None:
+        """Start background task that expires old commands, must be called from within a running event loop."""
+        self._sweep_task = asyncio.create_task(self._sweep_periodically())
+
+    async def close(self) -> None:
+        if self._sweep_task is not None:
+            self._sweep_task.cancel()
+            await asyncio.gather(self._sweep_task, return_exceptions=True)
+            self._sweep_task = None
+
+        for _, _, timer in self._in_flight.values():
+            timer.cancel()
+
+    def submit(self, imei: str, command_type: str, arguments: Dict[str, Any] | None = None) -> DownlinkCommand:
+        """Queue a command for a device, it is sent right away if device is connected and has no command in flight.
+
+        Args:
+            imei:
+                IMEI of the device.
+            command_type:
+                One of `COMMAND_GROUPS` keys.
+            arguments:
+                Arguments of the command, `{'interval': <seconds>}` for `set_interval`.
+
+        Returns:
+            Queued command, or an existing one if it would have the same effect.
+
+        Raises:
+            ValueError: when command type is not known or its arguments are not valid.
+        """
+        command = DownlinkCommand(imei, command_type, validate_arguments(command_type, arguments or {}))
+        in_flight = self._in_flight.get(imei)
+
+        if in_flight is not None and in_flight[0].is_redundant_with(command):
+            # Queued commands of the group would undo the in-flight one that is already what was asked for last.
+            self._supersede(imei, command, in_flight[0])
+            return in_flight[0]
+
+        for queued in self._queues.get(imei, ()):
+            if queued.group == command.group and queued.is_redundant_with(command):
+                return queued
+
+        self._supersede(imei, command, command)
+        self._queues.setdefault(imei, deque()).append(command)
+        self.commands[command.id] = command
+        self._send_next(imei)
+        return command
+
+    def get(self, command_id: str) -> DownlinkCommand | None:
+        return self.commands.get(command_id)
+
+    def device_commands(self, imei: str) -> List[DownlinkCommand]:
+        """Return commands of a device that have not been forgotten yet, oldest first."""
+        return [command for command in self.commands.values() if command.imei == imei]
+
+    def device_identified(self, connection: Connection) -> None:
+        in_flight = self._in_flight.get(connection.imei)
+
+        # Device connected again before replying, its new connection gets the command again.
+        if in_flight is not None and in_flight[1] is not connection:
+            self._requeue(connection.imei)
+
+        self._send_next(connection.imei)
+
+    def device_disconnected(self, connection: Connection) -> None:
+        in_flight = self._in_flight.get(connection.imei)
+
+        if in_flight is not None and in_flight[1] is connection:
+            self._requeue(connection.imei)
+
+    def device_replied(self, connection: Connection, reply_key: str, reply: str) -> None:
+        in_flight = self._in_flight.get(connection.imei)
+
+        if in_flight is None or in_flight[0].reply_key != reply_key:
+            logger.info('Device IMEI:%s replied to a command that is not in flight. Reply: %s', connection.imei, reply)
+            return
+
+        command, _, timer = self._in_flight.pop(connection.imei)
+        timer.cancel()
+        self._finish(command, CONFIRMED, reply=reply)
+        logger.info('Device IMEI:%s confirmed %s command %s after %.1f seconds.', command.imei, command.type, command.id, time.time() - command.sent_at)
+        self._send_next(command.imei)
+
+    def expire(self, now: float) -> None:
+        """Expire commands that waited for their device for `command_ttl` seconds and forget old finished ones."""
+        for imei, queue in list(self._queues.items()):
+            while queue and now - queue[0].created_at >= self.command_ttl:
+                self._finish(queue.popleft(), EXPIRED, error=f'Device was not connected for {self.command_ttl:.0f} seconds.')
+
+            if not queue:
+                del self._queues[imei]
+
+        for command_id, command in list(self.commands.items()):
+            if command.finished_at is not None and now - command.finished_at >= self.command_ttl:
+                del self.commands[command_id]
+
+    def _send_next(self, imei: str) -> None:
+        if imei in self._in_flight:
+            return
+
+        connection = self.connections.by_imei.get(imei)
+        queue = self._queues.get(imei)
+
+        if connection is None or connection.protocol is None or not queue:
+            return
+
+        while queue:
+            command = queue.popleft()
+
+            try:
+                data, command.reply_key = connection.protocol.encode_command(command)
+            except (UnsupportedCommandError, ValueError) as e:
+                self._finish(command, FAILED, error=f'{e.__class__.__name__}: {e}')
+                logger.warning('Could not encode %s command %s for device IMEI:%s. %s: %s', command.type, command.id, imei, e.__class__.__name__, e)
+                continue
+
+            # Commands are written to the protocol's writer without waiting, they are small and count towards its buffer,
+            # so the protocol's next `write_to_device` waits for them too if they take it above `write_high_water`.
+            connection.writer.write(data)
+            command.status = SENT
+            command.attempts += 1
+            command.sent_at = time.time()
+            timer = asyncio.get_running_loop().call_later(self.reply_timeout, self._reply_timed_out, command)
+            self._in_flight[imei] = (command, connection, timer)
+            logger.info('Sent %s command %s to device IMEI:%s (attempt %s).', command.type, command.id, imei, command.attempts)
+            break
+
+        if not queue:
+            del self._queues[imei]
+
+    def _reply_timed_out(self, command: DownlinkCommand) -> None:
+        in_flight = self._in_flight.get(command.imei)
+
+        if in_flight is None or in_flight[0] is not command:
+            return
+
+        if command.attempts >= self.max_attempts:
+            del self._in_flight[command.imei]
+            self._finish(command, UNCONFIRMED, error=f'Device did not reply to {command.attempts} attempts.')
+            logger.warning('Device IMEI:%s did not reply to %s command %s, giving up after %s attempts.', command.imei, command.type, command.id, command.attempts)
+            self._send_next(command.imei)
+        else:
+            self._requeue(command.imei)
+            self._send_next(command.imei)
+
+    def _requeue(self, imei: str) -> None:
+        """Put command in flight back to the front of device's queue, unless a newer command of the same group is queued."""
+        command, _, timer = self._in_flight.pop(imei)
+        timer.cancel()
+        queue = self._queues.setdefault(imei, deque())
+        newer = next((queued for queued in queue if queued.group == command.group), None)
+
+        if newer is not None:
+            self._finish(command, SUPERSEDED, error=f'Superseded by command {newer.id}.')
+        else:
+            command.status = QUEUED
+            queue.appendleft(command)
+
+    def _supersede(self, imei: str, command: DownlinkCommand, superseded_by: DownlinkCommand) -> None:
+        """Finish queued commands of the device that are in the same group as `command` as superseded by `superseded_by`."""
+        queue = self._queues.get(imei)
+
+        if not queue:
+            return
+
+        for queued in list(queue):
+            if queued.group == command.group:
+                queue.remove(queued)
+                self._finish(queued, SUPERSEDED, error=f'Superseded by command {superseded_by.id}.')
+
+        if not queue:
+            del self._queues[imei]
+
+    def _finish(self, command: DownlinkCommand, status: str, reply: str | None = None, error: str | None = None) -> None:
+        command.finish(status, reply=reply, error=error)
+        DOWNLINK_COMMANDS.labels(status).inc()
+
+    async def _sweep_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(min(self.command_ttl, 60.0))
+
+            try:
+                self.expire(time.time())
+            except Exception as e:
+                logger.critical('Got an unexpected exception when expiring downlink commands. %s: %s', e.__class__.__name__, e, exc_info=True)
+
+
+def validate_arguments(command_type: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+    """Return arguments of a command that are relevant to its type.
+
+    Raises:
+        ValueError: when command type is not known or its arguments are not valid.
+    """
+    if command_type not in COMMAND_GROUPS:
+        raise ValueError(f'Unknown command type {command_type!r}, expected one of: {", ".join(COMMAND_GROUPS)}.')
+
+    if command_type == 'set_interval':
+        interval = arguments.get('interval')
+
+        if not isinstance(interval, int) or isinstance(interval, bool) or not 10 <= interval <= 65535:
+            raise ValueError('Command set_interval requires integer "interval" between 10 and 65535 seconds.')
+
+        return {'interval': interval}
+
+    return {}
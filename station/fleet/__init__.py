@@ -0,0 +1,5 @@
+"""Package that keeps last known state of every device, so it can be queried without the backend."""
+
+from .state import FleetState, FLAG_FIELDS
+
+__all__ = ('FleetState', 'FLAG_FIELDS', )
@@ -0,0 +1,85 @@
+"""Snapshot file of the fleet state.
+
+A snapshot is a header followed by every column of `FleetState` one after another, columns are written and read
+with a single copy each through a memory map. Numbers are in the byte order of the machine, snapshots are
+meant to warm-start the station on the same host, not to be moved around.
+"""
+
+import mmap
+import os
+import struct
+from array import array
+from typing import List, Tuple
+
+MAGIC = b'GPSFLT01'
+# Magic, amount of slots, width of an IMEI in bytes.
+HEADER = struct.Struct('<8sII')
+IMEI_WIDTH = 16
+# Type codes of numeric columns, in the order they are stored.
+COLUMN_TYPES = ('d', 'd', 'f', 'B', 'd')
+
+
+def write_snapshot(path: str, imeis: bytes, columns: List[bytes]) -> None:
+    """Write a snapshot, replacing the previous one only once the new one is complete.
+
+    Args:
+        path:
+            Path of the snapshot file.
+        imeis:
+            IMEI of every slot, `IMEI_WIDTH` bytes each, padded with zero bytes.
+        columns:
+            Bytes of every numeric column, in the order of `COLUMN_TYPES`.
+    """
+    slots = len(imeis) // IMEI_WIDTH
+    parts = [HEADER.pack(MAGIC, slots, IMEI_WIDTH), imeis, *columns]
+    size = sum(len(part) for part in parts)
+    temporary_path = f'{path}.tmp'
+
+    with open(temporary_path, 'w+b') as file:
+        file.truncate(size)
+
+        with mmap.mmap(file.fileno(), size) as memory:
+            offset = 0
+
+            for part in parts:
+                memory[offset:offset + len(part)] = part
+                offset += len(part)
+
+            memory.flush()
+
+    os.replace(temporary_path, path)
+
+
+def read_snapshot(path: str) -> Tuple[List[str], List[array]]:
+    """Read a snapshot.
+
+    Returns:
+        IMEI of every slot (empty for free slots) and every numeric column, in the order of `COLUMN_TYPES`.
+
+    Raises:
+        ValueError: If file is not a complete snapshot.
+    """
+    with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as memory:
+        if len(memory) < HEADER.size:
+            raise ValueError('file is shorter than the header')
+
+        magic, slots, imei_width = HEADER.unpack_from(memory)
+
+        if magic != MAGIC:
+            raise ValueError('file is not a fleet state snapshot')
+
+        columns = [array(type_code) for type_code in COLUMN_TYPES]
+        size = HEADER.size + slots * (imei_width + sum(column.itemsize for column in columns))
+
+        if len(memory) != size:
+            raise ValueError(f'file is {len(memory)} bytes instead of {size}')
+
+        offset = HEADER.size + slots * imei_width
+        raw_imeis = memory[HEADER.size:offset]
+        imeis = [raw_imeis[start:start + imei_width].rstrip(b'\0').decode('ascii') for start in range(0, len(raw_imeis), imei_width)]
+
+        for column in columns:
+            column.frombytes(memory[offset:offset + slots * column.itemsize])
+            offset += slots * column.itemsize
+
+    return imeis, columns
@@ -0,0 +1,251 @@
+import asyncio
+import time
+from array import array
+from typing import Any, Dict, Iterator, List, Tuple
+
+from logger import logger
+from protocols.payloads import BaseLocationPayload
+
+from .snapshot import COLUMN_TYPES, IMEI_WIDTH, read_snapshot, write_snapshot
+
+# Boolean fields of payloads kept as bits of the `flags` column, in bit order. Missing fields are `False`.
+FLAG_FIELDS = ('valid', 'accessories_off', 'cut_fuel', 'shock_alarm', 'battery_cut_off')
+VALID_FLAG = 0b1
+
+
+class FleetState:
+    """Last known state of every device heard from, the answer to "where is this vehicle right now".
+
+    State is stored in columns, one machine-typed array per field indexed by slot, and a dictionary from IMEI to
+    slot, which costs a few dozen bytes per device instead of an object per device. Slots of devices not heard
+    from for `max_age` seconds are freed and reused. Position and speed only come from valid fixes (unless
+    device has not sent a valid one yet), last seen time and flags come from every fix.
+
+    With `snapshot_path`, columns are written to a snapshot file (see `fleet.snapshot`) every `snapshot_interval`
+    seconds and on close, and read back on start, so a restarted station knows where devices are right away.
+
+    Attributes:
+        max_devices:
+            Maximum amount of devices, fixes of new devices are not recorded once it is reached.
+        max_age:
+            Seconds after which a device that was not heard from is forgotten, `0` keeps devices forever.
+        snapshot_path:
+            Path of the snapshot file, `None` disables snapshots.
+        snapshot_interval:
+            Seconds between snapshots, devices are expired as often.
+        slots:
+            Slot of every device by IMEI.
+        imeis:
+            IMEI of every slot, empty for free slots.
+        latitude:
+            Latitude of every slot.
+        longitude:
+            Longitude of every slot.
+        speed:
+            Speed of every slot, in units of the payload.
+        flags:
+            Bits of `FLAG_FIELDS` of every slot.
+        seen_at:
+            Unix time of the last fix of every slot.
+        rejected:
+            Total amount of fixes not recorded because `max_devices` was reached (or IMEI was longer than 16 characters).
+    """
+
+    def __init__(
+        self,
+        max_devices: int = 100_000,
+        max_age: float = 2_592_000.0,
+        snapshot_path: str | None = None,
+        snapshot_interval: float = 30.0,
+    ) -> None:
+        self.max_devices = max_devices
+        self.max_age = max_age
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self.slots: Dict[str, int] = {}
+        self.imeis: List[str] = []
+        self.latitude, self.longitude, self.speed, self.flags, self.seen_at = (array(type_code) for type_code in COLUMN_TYPES)
+        self.rejected = 0
+
+        self._free: List[int] = []
+        self._snapshot_task: asyncio.Task | None = None
+
+    @property
+    def columns(self) -> Tuple[array, ...]:
+        """Numeric columns, in the order of `COLUMN_TYPES`."""
+        return self.latitude, self.longitude, self.speed, self.flags, self.seen_at
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'devices': len(self.slots),
+            'slots': len(self.imeis),
+            'rejected': self.rejected,
+        }
+
+    def start(self) -> None:
+        """Load the snapshot and start expiring devices and taking new snapshots, must be called from within a running event loop."""
+        if self.snapshot_path is not None:
+            try:
+                self.load(self.snapshot_path)
+            except FileNotFoundError:
+                pass
+            except (OSError, ValueError) as e:
+                logger.error('Could not load fleet state snapshot "%s", starting empty. %s: %s', self.snapshot_path, e.__class__.__name__, e)
+            else:
+                logger.info('Loaded state of %s devices from "%s".', len(self.slots), self.snapshot_path)
+
+        self._snapshot_task = asyncio.create_task(self._snapshot_periodically())
+
+    async def close(self) -> None:
+        if self._snapshot_task is None:
+            return
+
+        self._snapshot_task.cancel()
+        await asyncio.gather(self._snapshot_task, return_exceptions=True)
+        self._snapshot_task = None
+        await self.snapshot()
+
+    def update(self, location_payload: BaseLocationPayload, now: float | None = None) -> None:
+        """Record a fix as the last known state of its device.
+
+        Args:
+            location_payload:
+                Decoded fix.
+            now:
+                Unix time the fix was received at, read when not given.
+        """
+        imei = location_payload.device_serial_number
+        slot = self.slots.get(imei)
+        flags = 0
+
+        for bit, name in enumerate(FLAG_FIELDS):
+            if getattr(location_payload, name, False):
+                flags |= 1 << bit
+
+        if slot is None:
+            slot = self._allocate(imei)
+
+            if slot is None:
+                self.rejected += 1
+                return
+        elif not flags & VALID_FLAG:
+            self.flags[slot] = flags
+            self.seen_at[slot] = time.time() if now is None else now
+            return
+
+        self.latitude[slot] = location_payload.latitude
+        self.longitude[slot] = location_payload.longitude
+        self.speed[slot] = getattr(location_payload, 'speed', 0.0)
+        self.flags[slot] = flags
+        self.seen_at[slot] = time.time() if now is None else now
+
+    def get(self, imei: str) -> Dict[str, Any] | None:
+        """Return last known state of a device, `None` if it is not known."""
+        slot = self.slots.get(imei)
+        return self.device(slot) if slot is not None else None
+
+    def query(self, bbox: Tuple[float, float, float, float] | None = None, max_age: float = 0.0) -> Iterator[Dict[str, Any]]:
+        """Return last known state of every device, optionally only of those within a bounding box or seen recently.
+
+        Args:
+            bbox:
+                `(min_longitude, min_latitude, max_longitude, max_latitude)`, like GeoJSON bounding boxes.
+            max_age:
+                Seconds since the last fix, `0` returns devices regardless of when they were seen.
+        """
+        seen_after = time.time() - max_age if max_age > 0 else 0.0
+
+        if bbox is None:
+            for slot, seen_at in enumerate(self.seen_at):
+                if self.imeis[slot] and seen_at >= seen_after:
+                    yield self.device(slot)
+
+            return
+
+        min_longitude, min_latitude, max_longitude, max_latitude = bbox
+
+        for slot, (latitude, longitude) in enumerate(zip(self.latitude, self.longitude)):
+            if (
+                min_latitude <= latitude <= max_latitude
+                and min_longitude <= longitude <= max_longitude
+                and self.imeis[slot]
+                and self.seen_at[slot] >= seen_after
+            ):
+                yield self.device(slot)
+
+    def device(self, slot: int) -> Dict[str, Any]:
+        """Return state stored in a slot."""
+        flags = self.flags[slot]
+        return {
+            'imei': self.imeis[slot],
+            'latitude': self.latitude[slot],
+            'longitude': self.longitude[slot],
+            # Speed is stored in single precision, payloads have two decimal places.
+            'speed': round(self.speed[slot], 2),
+            **{name: bool(flags >> bit & 1) for bit, name in enumerate(FLAG_FIELDS)},
+            'seen_at': self.seen_at[slot],
+        }
+
+    def expire(self, now: float | None = None) -> int:
+        """Forget devices that were not heard from for `max_age` seconds and return how many were forgotten."""
+        if self.max_age <= 0:
+            return 0
+
+        seen_before = (time.time() if now is None else now) - self.max_age
+        expired = [slot for slot, seen_at in enumerate(self.seen_at) if seen_at < seen_before and self.imeis[slot]]
+
+        for slot in expired:
+            del self.slots[self.imeis[slot]]
+            self.imeis[slot] = ''
+            self._free.append(slot)
+
+        return len(expired)
+
+    async def snapshot(self) -> None:
+        """Write columns to the snapshot file, file is written in a thread."""
+        if self.snapshot_path is None:
+            return
+
+        # Columns are copied while nothing else runs, so the snapshot is consistent.
+        imeis = b''.join(imei.encode('ascii').ljust(IMEI_WIDTH, b'\0') for imei in self.imeis)
+        columns = [column.tobytes() for column in self.columns]
+
+        try:
+            await asyncio.to_thread(write_snapshot, self.snapshot_path, imeis, columns)
+        except OSError as e:
+            logger.error('Could not write fleet state snapshot "%s". %s: %s', self.snapshot_path, e.__class__.__name__, e)
+
+    def load(self, path: str) -> None:
+        """Replace state with the one in a snapshot file, see `fleet.snapshot.read_snapshot` for exceptions."""
+        imeis, columns = read_snapshot(path)
+        self.imeis = imeis
+        self.latitude, self.longitude, self.speed, self.flags, self.seen_at = columns
+        self.slots = {imei: slot for slot, imei in enumerate(imeis) if imei}
+        self._free = [slot for slot, imei in enumerate(imeis) if not imei]
+
+    def _allocate(self, imei: str) -> int | None:
+        """Return a free slot for a new device, `None` if there is none and `max_devices` was reached."""
+        # IMEI has to fit in the snapshot, every protocol's IMEI does.
+        if len(imei) > IMEI_WIDTH or not imei.isascii():
+            return None
+
+        if self._free:
+            slot = self._free.pop()
+            self.imeis[slot] = imei
+        elif len(self.imeis) < self.max_devices:
+            slot = len(self.imeis)
+            self.imeis.append(imei)
+
+            for column in self.columns:
+                column.append(0)
+        else:
+            return None
+
+        self.slots[imei] = slot
+        return slot
+
+    async def _snapshot_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.snapshot_interval)
+            self.expire()
+            await self.snapshot()
@@ -0,0 +1,6 @@
+"""Package that tells which geofences a fix is in, using polygons loaded from a local file."""
+
+from .exceptions import GeofenceFileError
+from .index import Fence, GeofenceIndex, load_geofences
+
+__all__ = ('Fence', 'GeofenceFileError', 'GeofenceIndex', 'load_geofences', )
@@ -0,0 +1,6 @@
+"""Module for exceptions that can occur when loading geofences."""
+
+
+class GeofenceFileError(Exception):
+    """Geofence file could not be read or is not a GeoJSON collection of polygons with ids."""
+    pass
@@ -0,0 +1,161 @@
+import json
+import math
+from typing import Dict, Iterable, List, Tuple
+
+from .exceptions import GeofenceFileError
+
+# Ring of a polygon as (longitude, latitude) points, like in GeoJSON.
+Ring = List[Tuple[float, float]]
+
+
+class Fence:
+    """Geofence made of one or more polygons, point is inside it when it is inside any of them.
+
+    Attributes:
+        id:
+            Id of the fence, as it is reported uplink.
+        polygons:
+            Outer ring and holes of every polygon.
+        bbox:
+            `(min_longitude, min_latitude, max_longitude, max_latitude)` of all polygons.
+    """
+
+    __slots__ = ('id', 'polygons', 'bbox')
+
+    def __init__(self, id: str, polygons: List[Tuple[Ring, List[Ring]]]) -> None:
+        self.id = id
+        self.polygons = polygons
+        longitudes = [longitude for ring, _ in polygons for longitude, _ in ring]
+        latitudes = [latitude for ring, _ in polygons for _, latitude in ring]
+        self.bbox = (min(longitudes), min(latitudes), max(longitudes), max(latitudes))
+
+    def contains(self, latitude: float, longitude: float) -> bool:
+        min_longitude, min_latitude, max_longitude, max_latitude = self.bbox
+
+        if not (min_latitude <= latitude <= max_latitude and min_longitude <= longitude <= max_longitude):
+            return False
+
+        for ring, holes in self.polygons:
+            if ring_contains(ring, longitude, latitude) and not any(ring_contains(hole, longitude, latitude) for hole in holes):
+                return True
+
+        return False
+
+
+class GeofenceIndex:
+    """Grid index of geofences, answers which fences a point is in without testing every fence.
+
+    Fences are registered in every `cell_size` x `cell_size` degrees cell their bounding box overlaps,
+    so a lookup only tests polygons of fences registered in the point's cell. Fences whose bounding box
+    spans more than `max_cells` cells (e.g. a whole country) are tested on every lookup instead, by bounding box first.
+
+    Attributes:
+        fences:
+            All indexed fences.
+        cell_size:
+            Size of a grid cell in degrees.
+        cells:
+            Fences registered in every grid cell by `(latitude, longitude)` cell number.
+        large:
+            Fences that are too large to register in cells.
+    """
+
+    def __init__(self, fences: Iterable[Fence], cell_size: float = 0.01, max_cells: int = 10_000) -> None:
+        self.fences = list(fences)
+        self.cell_size = cell_size
+        self.cells: Dict[Tuple[int, int], List[Fence]] = {}
+        self.large: List[Fence] = []
+
+        for fence in self.fences:
+            min_longitude, min_latitude, max_longitude, max_latitude = fence.bbox
+            first_row, first_column = self.cell(min_latitude, min_longitude)
+            last_row, last_column = self.cell(max_latitude, max_longitude)
+
+            if (last_row - first_row + 1) * (last_column - first_column + 1) > max_cells:
+                self.large.append(fence)
+                continue
+
+            for row in range(first_row, last_row + 1):
+                for column in range(first_column, last_column + 1):
+                    self.cells.setdefault((row, column), []).append(fence)
+
+    def cell(self, latitude: float, longitude: float) -> Tuple[int, int]:
+        return math.floor(latitude / self.cell_size), math.floor(longitude / self.cell_size)
+
+    def lookup(self, latitude: float, longitude: float) -> Tuple[str, ...]:
+        """Return ids of fences the point is in, sorted."""
+        candidates = self.cells.get(self.cell(latitude, longitude))
+
+        if candidates is None and not self.large:
+            return ()
+
+        return tuple(sorted(
+            fence.id for fence in (*(candidates or ()), *self.large) if fence.contains(latitude, longitude)
+        ))
+
+
+def ring_contains(ring: Ring, x: float, y: float) -> bool:
+    """Tell whether point is inside a ring by counting crossings of a ray cast from it (even-odd rule)."""
+    inside = False
+    previous_x, previous_y = ring[-1]
+
+    for current_x, current_y in ring:
+        if (current_y > y) != (previous_y > y) and x < (previous_x - current_x) * (y - current_y) / (previous_y - current_y) + current_x:
+            inside = not inside
+
+        previous_x, previous_y = current_x, current_y
+
+    return inside
+
+
+def load_geofences(path: str) -> List[Fence]:
+    """Load geofences from a GeoJSON file.
+
+    File is a `FeatureCollection` whose features have `Polygon` or `MultiPolygon` geometry and an id,
+    either as `id` of the feature or as `id` (or `name`) in its properties.
+
+    Args:
+        path:
+            Path of the file.
+
+    Returns:
+        Fences in the order of features.
+
+    Raises:
+        GeofenceFileError: If file can not be read or parsed, or a feature is not a polygon with an id.
+    """
+    try:
+        with open(path, 'rb') as file:
+            collection = json.load(file)
+    except (OSError, ValueError) as e:
+        raise GeofenceFileError(f'Could not read geofence file "{path}". {e.__class__.__name__}: {e}') from e
+
+    if not isinstance(collection, dict) or collection.get('type') != 'FeatureCollection':
+        raise GeofenceFileError(f'Geofence file "{path}" is not a GeoJSON FeatureCollection.')
+
+    fences: List[Fence] = []
+
+    for number, feature in enumerate(collection.get('features', [])):
+        try:
+            properties = feature.get('properties') or {}
+            fence_id = feature.get('id', properties.get('id', properties.get('name')))
+            geometry = feature['geometry']
+
+            if fence_id is None:
+                raise ValueError('feature has no id')
+
+            if geometry['type'] == 'Polygon':
+                polygons = [geometry['coordinates']]
+            elif geometry['type'] == 'MultiPolygon':
+                polygons = geometry['coordinates']
+            else:
+                raise ValueError(f'{geometry["type"]} geometry is not supported')
+
+            fences.append(Fence(str(fence_id), [
+                ([(float(x), float(y)) for x, y, *_ in rings[0]], [[(float(x), float(y)) for x, y, *_ in hole] for hole in rings[1:]])
+                for rings in polygons
+            ]))
+        except (KeyError, TypeError, ValueError, IndexError, AttributeError) as e:
+            raise GeofenceFileError(f'Could not load feature {number} of geofence file "{path}". {e.__class__.__name__}: {e}') from e
+
+    return fences
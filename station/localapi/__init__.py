@@ -0,0 +1,5 @@
+"""Package with HTTP server for operators and local tooling."""
+
+from .server import LocalApi
+
+__all__ = ('LocalApi', )
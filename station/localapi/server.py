@@ -0,0 +1,138 @@
+import asyncio
+
+from aiohttp import web
+
+from downlink import DownlinkDispatcher
+from fleet import FleetState
+from logger import logger
+from metrics import MetricsRegistry
+
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class LocalApi:
+    """Small HTTP server for operators and local tooling, e.g. Prometheus scraping `/metrics`.
+
+    When given a downlink dispatcher, it also queues commands for devices:
+    `POST /devices/{imei}/commands` with a JSON body like `{"type": "set_interval", "interval": 30}` returns the queued
+    command (`202`), or the finished one (`200`) when `?wait=<seconds>` is given and device replies in time.
+    `GET /devices/{imei}/commands` and `GET /commands/{id}` return commands that were submitted before.
+
+    When given fleet state, it also serves last known state of devices: `GET /devices/{imei}` of a single device
+    and `GET /devices` of all of them, optionally only within `?bbox=<min_longitude>,<min_latitude>,<max_longitude>,<max_latitude>`
+    and seen in the last `?max_age=<seconds>`.
+
+    It is meant to listen on a loopback or otherwise private interface, requests are not authenticated.
+    Routes can be added with `app.router` until the server is started.
+
+    Attributes:
+        host:
+            Interface the server listens on.
+        port:
+            TCP port the server listens on.
+        app:
+            Aiohttp application serving the routes.
+        downlink:
+            Dispatcher commands for devices are submitted to, command routes are not served without it.
+        fleet_state:
+            Last known state of devices, device routes are not served without it.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        metrics_registry: MetricsRegistry,
+        downlink: DownlinkDispatcher | None = None,
+        fleet_state: FleetState | None = None,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.metrics_registry = metrics_registry
+        self.downlink = downlink
+        self.fleet_state = fleet_state
+        self.app = web.Application()
+        self.app.router.add_get('/metrics', self.handle_metrics)
+
+        if downlink is not None:
+            self.app.router.add_post('/devices/{imei}/commands', self.handle_submit_command)
+            self.app.router.add_get('/devices/{imei}/commands', self.handle_device_commands)
+            self.app.router.add_get('/commands/{command_id}', self.handle_command)
+
+        if fleet_state is not None:
+            self.app.router.add_get('/devices', self.handle_devices)
+            self.app.router.add_get('/devices/{imei}', self.handle_device)
+        self._runner: web.AppRunner | None = None
+
+    async def start(self) -> None:
+        """Start serving, must be called from within a running event loop."""
+        # Access log would write a line per scrape, station's own logs are enough.
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info('Local API is serving on %s:%s', self.host, self.port)
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        return web.Response(body=self.metrics_registry.render().encode(), headers={'Content-Type': METRICS_CONTENT_TYPE})
+
+    async def handle_submit_command(self, request: web.Request) -> web.Response:
+        imei = request.match_info['imei']
+
+        try:
+            body = await request.json()
+            wait = float(request.query.get('wait', 0))
+
+            if not isinstance(body, dict):
+                raise ValueError('Expected a JSON object.')
+
+            command_type = body.pop('type', None)
+            command = self.downlink.submit(imei, command_type, body)
+        except ValueError as e:
+            return web.json_response({'error': str(e)}, status=400)
+
+        if wait > 0:
+            try:
+                await asyncio.wait_for(command.finished.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+
+        result = command.to_dict()
+        result['connected'] = imei in self.downlink.connections.by_imei
+        return web.json_response(result, status=200 if command.finished.is_set() else 202)
+
+    async def handle_device_commands(self, request: web.Request) -> web.Response:
+        commands = self.downlink.device_commands(request.match_info['imei'])
+        return web.json_response([command.to_dict() for command in commands])
+
+    async def handle_command(self, request: web.Request) -> web.Response:
+        command = self.downlink.get(request.match_info['command_id'])
+
+        if command is None:
+            return web.json_response({'error': 'Command does not exist or was already forgotten.'}, status=404)
+
+        return web.json_response(command.to_dict())
+
+    async def handle_devices(self, request: web.Request) -> web.Response:
+        try:
+            bbox = tuple(float(value) for value in request.query['bbox'].split(',')) if 'bbox' in request.query else None
+            max_age = float(request.query.get('max_age', 0))
+
+            if bbox is not None and len(bbox) != 4:
+                raise ValueError('Expected bbox of 4 comma separated numbers.')
+        except ValueError as e:
+            return web.json_response({'error': str(e)}, status=400)
+
+        return web.json_response(list(self.fleet_state.query(bbox, max_age)))
+
+    async def handle_device(self, request: web.Request) -> web.Response:
+        device = self.fleet_state.get(request.match_info['imei'])
+
+        if device is None:
+            return web.json_response({'error': 'Device was not heard from or was already forgotten.'}, status=404)
+
+        return web.json_response(device)
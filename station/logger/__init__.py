@@ -1,13 +1,60 @@
 """Package that contains all logging-related configuration of this project."""
 
+import atexit
 import logging
 from logging.config import dictConfig
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict
 
 from .config import config
+from .handlers import NonBlockingQueueHandler, PacketLogSampler
 
 dictConfig(config)
 
 logger = logging.getLogger('logger')
 
-__all__ = ('logger', )
+# Every process (including spawned station workers) imports this package and gets its own listener thread.
+_queue_handler: NonBlockingQueueHandler = logger.handlers[0]
+_listener = QueueListener(_queue_handler.queue, *logging.getLogger('log_writer').handlers, respect_handler_level=True)
+_listener.start()
+atexit.register(_listener.stop)
 
+
+def forward_logs(log_queue: Any) -> None:
+    """Hand records over to another process through `log_queue` instead of writing them to files.
+
+    Meant for station workers, whose supervisor writes their records with `write_forwarded_logs`: rotating
+    the same files from several processes at once would overwrite and lose records. Records are still
+    sampled and enqueued without blocking, only the background listener thread puts them into `log_queue`.
+
+    Args:
+        log_queue:
+            `multiprocessing` queue the other process reads records from.
+    """
+    _listener.handlers = (QueueHandler(log_queue), )
+
+
+def write_forwarded_logs(log_queue: Any) -> QueueListener:
+    """Start a background thread that writes records other processes `forward_logs` to `log_queue` to this process' log files.
+
+    Args:
+        log_queue:
+            `multiprocessing` queue other processes put records into.
+
+    Returns:
+        Started listener, `stop()` it once the other processes exited to write the rest of their records.
+    """
+    listener = QueueListener(log_queue, *logging.getLogger('log_writer').handlers, respect_handler_level=True)
+    listener.start()
+
+    return listener
+
+
+def log_stats() -> Dict[str, int]:
+    """Return counters of log records that were not written."""
+    return {
+        'dropped': _queue_handler.dropped,
+        'suppressed': sum(f.suppressed for f in _queue_handler.filters if isinstance(f, PacketLogSampler)),
+    }
+
+__all__ = ('logger', 'log_stats', 'forward_logs', 'write_forwarded_logs', )
@@ -1,5 +1,9 @@
 import logging
 from typing import Literal, Callable
+
+from settings import get_env_int, get_env_float
+
+from .handlers import NonBlockingQueueHandler, PacketLogSampler
  
 # NOTE: Pyright complains when `Literal[..]` is passed `logging.DEBUG` etc. so we use literal numbers instead.
 def get_filter_for_handler(handler_level: Literal[20, 30, 40, 50]) -> Callable[[logging.LogRecord], bool]:
@@ -27,6 +31,15 @@ def get_filter_for_handler(handler_level: Literal[20, 30, 40, 50]) -> Callable[[
 config = {
     'version': 1,
 
+    'filters': {
+        'packet_sampler': {
+            '()': PacketLogSampler,
+            'burst': get_env_int('LOG_PACKET_BURST', 5),
+            'interval': get_env_float('LOG_PACKET_INTERVAL', 60.0),
+            'sample_rate': get_env_int('LOG_PACKET_SAMPLE_RATE', 100),
+        }
+    },
+
     'formatters': {
         'basic_formatter': {
             'format': '%(asctime)s %(levelname)s - %(message)s'
@@ -34,6 +47,14 @@ config = {
     },
     
     'handlers': {
+        # Only handler of `logger`, it runs on the caller's thread (usually the event loop) so it must never block.
+        # Records are written to files by `QueueListener` running in a background thread, see `logger/__init__.py`.
+        'queue_handler': {
+            '()': NonBlockingQueueHandler,
+            'queue_size': get_env_int('LOG_QUEUE_SIZE', 10_000),
+            'filters': [ 'packet_sampler' ]
+        },
+
         'info_handler': {
             'level': 'INFO',
             'class': 'logging.handlers.RotatingFileHandler',
@@ -41,6 +62,8 @@ config = {
             'backupCount': 5,
             'filename': 'logs/info.log',
             'formatter': 'basic_formatter',
+            # Opened on the first record, station workers forward their records to the supervisor and never write files.
+            'delay': True,
             'filters': [ get_filter_for_handler(20) ]
         },
 
@@ -49,6 +72,7 @@ config = {
             'class': 'logging.FileHandler',
             'filename': 'logs/warning.log',
             'formatter': 'basic_formatter',
+            'delay': True,
             'filters': [ get_filter_for_handler(30) ]
         },
 
@@ -57,6 +81,7 @@ config = {
             'class': 'logging.FileHandler',
             'filename': 'logs/error.log',
             'formatter': 'basic_formatter',
+            'delay': True,
             'filters': [ get_filter_for_handler(40) ]
         },
 
@@ -65,6 +90,7 @@ config = {
             'class': 'logging.FileHandler',
             'filename': 'logs/critical.log',
             'formatter': 'basic_formatter',
+            'delay': True,
             'filters': [ get_filter_for_handler(50) ]
         }
     },
@@ -72,7 +98,14 @@ config = {
     'loggers': {
         'logger': {
             'level': 'INFO',
-            'handlers': [ 'info_handler', 'warning_handler', 'error_handler', 'critical_handler' ]
+            'handlers': [ 'queue_handler' ]
+        },
+
+        # Never logged to directly, only holds file handlers that `QueueListener` dispatches records to.
+        'log_writer': {
+            'level': 'INFO',
+            'handlers': [ 'info_handler', 'warning_handler', 'error_handler', 'critical_handler' ],
+            'propagate': False
         }
     },
 }
@@ -0,0 +1,81 @@
+import logging
+import queue
+from logging.handlers import QueueHandler
+from typing import Dict
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Handler that hands log records over to a background `QueueListener` without ever blocking.
+
+    Unlike `QueueHandler` it does not format records before enqueuing them, listener thread and the
+    handlers it dispatches to take care of that, so `%`-style arguments are only merged into the
+    message once it is actually written. When the queue is full the record is dropped and counted
+    instead of stalling the event loop until file handlers catch up.
+
+    Attributes:
+        dropped:
+            Total amount of records dropped because the queue was full.
+    """
+
+    def __init__(self, queue_size: int = 10_000) -> None:
+        super().__init__(queue.Queue(maxsize=queue_size))
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Listener runs in the same process, record does not have to be made picklable.
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class PacketLogSampler(logging.Filter):
+    """Filter that rate limits and samples log records about individual packets of each device.
+
+    Only records logged with an `imei` attribute (`logger.info(..., extra={'imei': imei})`) are affected.
+    First `burst` records of every device pass in each `interval`, after that only every `sample_rate`-th
+    record does, so a chatty device can not flood the logs while every device still shows up in them.
+    Counters are reset at the start of every interval, which also keeps memory bounded by the amount
+    of devices seen within one interval.
+
+    Attributes:
+        burst:
+            Amount of records per device that pass in each interval before sampling starts.
+        interval:
+            Length of the rate limiting window in seconds.
+        sample_rate:
+            One of every `sample_rate` records over the burst passes, `0` suppresses all of them.
+        suppressed:
+            Total amount of records that were filtered out.
+    """
+
+    def __init__(self, burst: int = 5, interval: float = 60.0, sample_rate: int = 100) -> None:
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self.sample_rate = sample_rate
+        self.suppressed = 0
+        self._counts: Dict[str, int] = {}
+        self._window_end = 0.0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        imei = getattr(record, 'imei', None)
+
+        if imei is None:
+            return True
+
+        if record.created >= self._window_end:
+            self._counts.clear()
+            self._window_end = record.created + self.interval
+
+        count = self._counts.get(imei, 0) + 1
+        self._counts[imei] = count
+
+        if count <= self.burst or (self.sample_rate > 0 and (count - self.burst) % self.sample_rate == 0):
+            return True
+
+        self.suppressed += 1
+        return False
@@ -1,65 +1,395 @@
 import asyncio
 import os
-from typing import Type
+import signal
+from typing import Any, Dict, List, Type
+from urllib.parse import urlsplit
 
-import aiohttp
-
-from logger import logger
-from matcher import match_protocol
+from admission import AdmissionControl, Backpressure
+from capture import CaptureWriter
+from connections import ConnectionRegistry
+from downlink import DownlinkDispatcher
+from fleet import FleetState
+from localapi import LocalApi
+from logger import logger, log_stats, forward_logs
+from matcher import match_protocol, registry
+from metrics import metrics_registry, CONNECTIONS, ACTIVE_CONNECTIONS, CONNECTIONS_REJECTED, UPLINK_QUEUE_DEPTH, READS_PAUSED
+from pipeline import BaseStage, FixFilter, GeofenceTagger, StateRecorder, TrackCompressor
 from protocols import BaseProtocol
+from runtime import TcpOptions, run
+from settings import get_env_str, get_env_int, get_env_float
+from supervisor import Supervisor
+from uplink import UplinkFanout, UplinkQueue, UplinkSpool
+from uplink.sinks import create_sink
+
+# Maximum amount of bytes read from a new connection to identify its protocol.
+HANDSHAKE_SIZE = 512
 
 
 class Station:
 
-    def __init__(self, backend_url: str, client_session: aiohttp.ClientSession) -> None:
-        self.client_session = client_session
-        self.backend_url = backend_url
-        self.stream_writers = {}
+    def __init__(
+        self,
+        uplink: BaseStage | UplinkQueue | UplinkFanout,
+        connections: ConnectionRegistry,
+        admission: AdmissionControl | None = None,
+        backpressure: Backpressure | None = None,
+        tcp_options: TcpOptions | None = None,
+        ack_after_persist: bool = False,
+    ) -> None:
+        self.uplink = uplink
+        self.connections = connections
+        self.admission = admission or AdmissionControl()
+        self.backpressure = backpressure
+        self.tcp_options = tcp_options
+        self.ack_after_persist = ack_after_persist
+        self.connections_total = 0
+        self.connections_active = 0
+
+    def stats(self) -> Dict[str, int]:
+        """Return counters describing state of the station, its connections, uplink and logging."""
+        return {
+            'connections_total': self.connections_total,
+            'connections_active': self.connections_active,
+            **{f'connections_{name}': value for name, value in self.connections.stats().items()},
+            **{f'connections_{name}': value for name, value in self.admission.stats().items()},
+            **{f'uplink_{name}': value for name, value in self.uplink.stats().items()},
+            **({f'reads_{name}': value for name, value in self.backpressure.stats().items()} if self.backpressure is not None else {}),
+            **{f'log_{name}': value for name, value in log_stats().items()},
+        }
 
     async def handle_request(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
-        client_address, client_port = writer.get_extra_info('peername')
-        logger.info(f'Client connected. ({client_address}:{client_port})')
+        rejection = self.admission.admit(self.connections_active)
+
+        # Rejected connections are not logged one by one, there can be tens of thousands of them in a reconnect storm.
+        if rejection is not None:
+            CONNECTIONS_REJECTED.labels(rejection).inc()
+            writer.transport.abort()
+            return
+
+        client_address, client_port = writer.get_extra_info('peername')[:2]
+        logger.info('Client connected. (%s:%s)', client_address, client_port)
+
+        if self.tcp_options is not None:
+            self.tcp_options.apply(writer.get_extra_info('socket'))
+
+        connection = self.connections.register((client_address, client_port), writer)
+        self.connections_total += 1
+        self.connections_active += 1
+        CONNECTIONS.inc()
+        ACTIVE_CONNECTIONS.inc()
+
+        try:
+            try:
+                async with asyncio.timeout(self.admission.handshake_timeout):
+                    initial_data = await read_handshake(reader)
+            except TimeoutError:
+                self.admission.handshake_timeouts += 1
+                CONNECTIONS_REJECTED.labels('handshake_timeout').inc()
+                logger.info('Client did not send enough to identify its protocol in %s seconds. Closing connection. (%s:%s)', self.admission.handshake_timeout, client_address, client_port)
+                writer.transport.abort()
+                return
+
+            connection.received(initial_data)
+            protocol: Type[BaseProtocol] | None = match_protocol(initial_data)
+
+            if protocol is not None:
+                logger.info('Identified protocol of newly connected client. (%s:%s - %s).', client_address, client_port, protocol.__name__)
+                connection.protocol = protocol(reader, writer, self.uplink, initial_data, connection, self.backpressure, self.ack_after_persist)
+                await connection.protocol.loop()
+            else:
+                logger.warning('Could not identify protocol of newly connected client. Closing connection. (%s:%s). data (in bytes): %s', client_address, client_port, list(initial_data))
+                writer.close()
+                await writer.wait_closed()
+        except ConnectionError as e:
+            # Writing to a connection that registry closed (or device reset) while protocol was still using it.
+            logger.info('Connection was closed while it was being served. (%s:%s) %s: %s', client_address, client_port, e.__class__.__name__, e)
+        finally:
+            self.connections.unregister(connection)
+            self.connections_active -= 1
+            ACTIVE_CONNECTIONS.dec()
+
+async def read_handshake(reader: asyncio.StreamReader) -> bytes:
+    """Read bytes a new connection sends first, until their protocol can be identified or they can not belong to any.
+
+    First record of a device may arrive in several TCP segments (e.g. a 45 byte H02 binary record), bytes that
+    could still match a protocol's signature are not rejected until the rest of them is read.
+    """
+    data = await reader.read(HANDSHAKE_SIZE)
+
+    while len(data) < HANDSHAKE_SIZE and registry.incomplete(data):
+        more = await reader.read(HANDSHAKE_SIZE - len(data))
+
+        if not more:
+            break
+
+        data += more
+
+    return data
+
+
+async def report_stats(station: Station, worker_id: int, stats_queue: Any, interval: float) -> None:
+    """Periodically put station's stats into supervisor's stats queue."""
+    while True:
+        await asyncio.sleep(interval)
+        stats_queue.put((worker_id, station.stats()))
+
+def create_uplink(sink_urls: List[str], worker_id: int | None = None, name: str | None = None) -> UplinkFanout:
+    """Create uplink queue (and spool, if enabled) of every sink.
+
+    Args:
+        sink_urls:
+            URLs of sinks, see `create_sink` for supported ones.
+        worker_id:
+            Id of the worker process when running under `Supervisor`.
+        name:
+            Name of an uplink other than the main one (e.g. `history`), its sinks are named after it and spooled in its own directory.
+    """
+    queues = []
+    spool_directory = get_env_str('UPLINK_SPOOL_DIR', '')
+
+    # Spool can not be shared between processes, every worker gets its own.
+    if spool_directory and worker_id is not None:
+        spool_directory = os.path.join(spool_directory, f'worker-{worker_id}')
+
+    if spool_directory and name is not None:
+        spool_directory = os.path.join(spool_directory, name)
+
+    for index, sink_url in enumerate(sink_urls):
+        sink_name = f'{index}-{urlsplit(sink_url).scheme}' if len(sink_urls) > 1 else None
+        sink = create_sink(sink_url, name=f'{name}-{sink_name or urlsplit(sink_url).scheme}' if name is not None else sink_name)
+
+        # With a single sink spool stays where it was before sinks could be fanned out to.
+        sink_spool_directory = os.path.join(spool_directory, sink_name) if spool_directory and sink_name is not None else spool_directory
+
+        spool = UplinkSpool(
+            sink_spool_directory,
+            segment_size=get_env_int('UPLINK_SPOOL_SEGMENT_SIZE', 16_000_000),
+            max_size=get_env_int('UPLINK_SPOOL_MAX_SIZE', 1_000_000_000),
+            fsync_interval=get_env_float('UPLINK_SPOOL_FSYNC_INTERVAL', 1.0),
+        ) if sink_spool_directory else None
+        queues.append(UplinkQueue(
+            sink,
+            max_size=get_env_int('UPLINK_QUEUE_SIZE', 100_000),
+            batch_size=get_env_int('UPLINK_BATCH_SIZE', 500),
+            flush_interval=get_env_float('UPLINK_FLUSH_INTERVAL', 0.2),
+            worker_count=get_env_int('UPLINK_WORKERS', 4),
+            spool=spool,
+        ))
+
+    return UplinkFanout(queues)
+
+def create_pipeline(uplink: UplinkFanout, fleet_state: FleetState | None = None, worker_id: int | None = None) -> BaseStage | UplinkFanout:
+    """Put pipeline stages that are enabled in front of the uplink, `uplink` itself is returned when none of them are.
+
+    Fixes are recorded in `fleet_state`, when given, before any of them are dropped.
+    """
+    pipeline: BaseStage | UplinkFanout = uplink
+    geofence_file = get_env_str('GEOFENCE_FILE', '')
+    history_sink_urls = [url.strip() for url in get_env_str('HISTORY_SINKS', '').split(',') if url.strip()]
+    fix_filter_devices = get_env_int('FIX_FILTER_DEVICES', 100_000)
+
+    # Geofences are looked up after fix filter, so transitions are never attached to a fix that is dropped.
+    if geofence_file:
+        pipeline = GeofenceTagger(
+            pipeline,
+            geofence_file,
+            cell_size=get_env_float('GEOFENCE_CELL_SIZE', 0.01),
+            reload_interval=get_env_float('GEOFENCE_RELOAD_INTERVAL', 5.0),
+            max_devices=get_env_int('GEOFENCE_DEVICES', 100_000),
+        )
 
-        initial_data = await reader.read(512)
-        protocol: Type[BaseProtocol] | None = match_protocol(initial_data)
+    # Tracks are built from fixes left after fix filter, duplicates would only distort them.
+    if history_sink_urls:
+        pipeline = TrackCompressor(
+            pipeline,
+            create_uplink(history_sink_urls, worker_id, name='history'),
+            max_error=get_env_float('TRACK_MAX_ERROR', 10.0),
+            window=get_env_float('TRACK_WINDOW', 300.0),
+            max_points=get_env_int('TRACK_MAX_POINTS', 500),
+            max_devices=get_env_int('TRACK_DEVICES', 100_000),
+        )
 
-        if protocol is not None:
-            logger.info(f'Identified protocol of newly connected client. ({client_address}:{client_port} - {protocol.__name__}).')
-            protocol_instance = protocol(reader, writer, self.client_session, self.backend_url)
-            await protocol_instance.loop()
-        else:
-            logger.warning(f'Could not identify protocol of newly connected client. Closing connection. ({client_address}:{client_port}). data (in bytes): {list(initial_data)}')
-            writer.close()
-            await writer.wait_closed()
+    if fix_filter_devices:
+        pipeline = FixFilter(
+            pipeline,
+            max_devices=fix_filter_devices,
+            window=get_env_int('FIX_FILTER_WINDOW', 8),
+            min_distance=get_env_float('STATIONARY_MIN_DISTANCE', 0.0),
+            min_speed=get_env_float('STATIONARY_MIN_SPEED', 5.0),
+            max_interval=get_env_float('STATIONARY_MAX_INTERVAL', 300.0),
+        )
 
-async def main(backend_url: str, station_port: int):
-    client_session = aiohttp.ClientSession()
-    station = Station(backend_url, client_session)
+    if fleet_state is not None:
+        pipeline = StateRecorder(pipeline, fleet_state)
 
-    server = await asyncio.start_server(station.handle_request, '', station_port)
+    return pipeline
+
+def create_fleet_state(worker_id: int | None = None) -> FleetState | None:
+    """Create last known state of devices unless `FLEET_STATE_DEVICES` is `0`, it is snapshotted if `FLEET_STATE_DIR` is defined."""
+    max_devices = get_env_int('FLEET_STATE_DEVICES', 100_000)
+
+    if not max_devices:
+        return None
+
+    snapshot_directory = get_env_str('FLEET_STATE_DIR', '')
+    snapshot_path = None
+
+    # Every worker keeps state of devices connected to it, so each has its own snapshot.
+    if snapshot_directory:
+        os.makedirs(snapshot_directory, exist_ok=True)
+        snapshot_path = os.path.join(snapshot_directory, f'worker-{worker_id}.snapshot' if worker_id is not None else 'fleet.snapshot')
+
+    return FleetState(
+        max_devices=max_devices,
+        max_age=get_env_float('FLEET_STATE_MAX_AGE', 2_592_000.0),
+        snapshot_path=snapshot_path,
+        snapshot_interval=get_env_float('FLEET_STATE_SNAPSHOT_INTERVAL', 30.0),
+    )
+
+def create_capture(worker_id: int | None = None) -> CaptureWriter | None:
+    """Create writer of raw traffic captures if `CAPTURE_DIR` is defined, `tools/replay_capture.py` replays them."""
+    capture_directory = get_env_str('CAPTURE_DIR', '')
+
+    if not capture_directory:
+        return None
+
+    # Like spool, every worker writes its own segments.
+    if worker_id is not None:
+        capture_directory = os.path.join(capture_directory, f'worker-{worker_id}')
+
+    return CaptureWriter(
+        capture_directory,
+        segment_size=get_env_int('CAPTURE_SEGMENT_SIZE', 64_000_000),
+        max_size=get_env_int('CAPTURE_MAX_SIZE', 10_000_000_000),
+        flush_interval=get_env_float('CAPTURE_FLUSH_INTERVAL', 1.0),
+    )
+
+async def main(sink_urls: List[str], station_port: int, worker_id: int | None = None, stats_queue: Any = None):
+    """Run the station until `SIGTERM` or `SIGINT` is received.
+
+    Args:
+        sink_urls:
+            URLs of sinks every location payload is delivered to.
+        station_port:
+            TCP port devices connect to.
+        worker_id:
+            Id of the worker process when running under `Supervisor`, `None` when station runs in a single process.
+        stats_queue:
+            Supervisor's queue that worker reports its stats to.
+    """
+    loop = asyncio.get_running_loop()
+    stop = asyncio.Event()
+
+    for signal_number in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signal_number, stop.set)
+
+    fleet_state = create_fleet_state(worker_id)
+
+    if fleet_state is not None:
+        fleet_state.start()
+
+    uplink = create_pipeline(create_uplink(sink_urls, worker_id), fleet_state, worker_id)
+    await uplink.start()
+    UPLINK_QUEUE_DEPTH.set_function(lambda: uplink.depth)
+
+    # Devices are not read while uplink is backlogged, by default once its queue is 80% full until it is half empty.
+    uplink_queue_size = get_env_int('UPLINK_QUEUE_SIZE', 100_000)
+    backpressure = Backpressure(
+        uplink,
+        high_water=get_env_int('UPLINK_HIGH_WATER', uplink_queue_size * 8 // 10),
+        low_water=get_env_int('UPLINK_LOW_WATER', uplink_queue_size // 2),
+    )
+    backpressure.start()
+    READS_PAUSED.set_function(lambda: int(backpressure.paused))
+    admission = AdmissionControl(
+        max_connections=get_env_int('MAX_CONNECTIONS', 0),
+        accept_rate=get_env_float('ACCEPT_RATE', 0.0),
+        accept_burst=get_env_int('ACCEPT_BURST', 100),
+        handshake_timeout=get_env_float('HANDSHAKE_TIMEOUT', 10.0),
+    )
+    capture = create_capture(worker_id)
+
+    if capture is not None:
+        capture.start()
+
+    connections = ConnectionRegistry(idle_timeout=get_env_float('CONNECTION_IDLE_TIMEOUT', 600.0), capture=capture)
+    connections.start()
+    downlink = DownlinkDispatcher(
+        connections,
+        reply_timeout=get_env_float('DOWNLINK_REPLY_TIMEOUT', 30.0),
+        max_attempts=get_env_int('DOWNLINK_MAX_ATTEMPTS', 3),
+        command_ttl=get_env_float('DOWNLINK_COMMAND_TTL', 3600.0),
+    )
+    downlink.start()
+    tcp_options = TcpOptions(
+        nodelay=bool(get_env_int('TCP_NODELAY', 1)),
+        keepalive_idle=get_env_int('TCP_KEEPALIVE_IDLE', 120),
+        keepalive_interval=get_env_int('TCP_KEEPALIVE_INTERVAL', 30),
+        keepalive_count=get_env_int('TCP_KEEPALIVE_COUNT', 4),
+    )
+    station = Station(uplink, connections, admission, backpressure, tcp_options, bool(get_env_int('ACK_AFTER_PERSIST', 0)))
+
+    # Every process has its own metrics and connections, workers serve them on consecutive ports starting at `LOCAL_API_PORT`.
+    local_api_port = get_env_int('LOCAL_API_PORT', 0)
+    local_api = LocalApi(get_env_str('LOCAL_API_HOST', '127.0.0.1'), local_api_port + (worker_id or 0), metrics_registry, downlink, fleet_state) if local_api_port else None
+
+    if local_api is not None:
+        await local_api.start()
+
+    # With `reuse_port` every worker binds its own listening socket and kernel balances connections between them.
+    # Records are a few hundred bytes at most, a small reader limit bounds memory of connections that are not being read.
+    server = await asyncio.start_server(
+        station.handle_request,
+        '',
+        station_port,
+        reuse_port=worker_id is not None,
+        backlog=get_env_int('LISTEN_BACKLOG', 1024),
+        limit=get_env_int('STREAM_READER_LIMIT', 16_384),
+    )
 
     address = server.sockets[0].getsockname()
-    logger.info(f'Serving on {address}')
+    logger.info('Serving on %s%s', address, f' (worker {worker_id})' if worker_id is not None else '')
 
-    async with server:
-        await server.serve_forever()
+    stats_task = asyncio.create_task(report_stats(station, worker_id, stats_queue, get_env_float('GPS_STATION_STATS_INTERVAL', 10.0))) if stats_queue is not None else None
 
-if __name__ == '__main__':
-    backend_url = os.getenv('BACKEND_URL')
-    station_port = os.getenv('GPS_STATION_PORT')
+    try:
+        async with server:
+            await stop.wait()
+    finally:
+        if stats_task is not None:
+            stats_task.cancel()
+            stats_queue.put((worker_id, station.stats()))
 
-    if backend_url is None:
-        raise Exception('Backend URL that saves location data is not defined. '
-                        'Define "BACKEND_URL" variable in the environment that you are trying to run gps-station in.')
+        if local_api is not None:
+            await local_api.close()
 
-    if station_port is None:
-        raise Exception('gps-station\'s port is not defined. '
-                        'Define "GPS_STATION_PORT" variable in the environment that you are trying to run gps-station in.')
-    else:
-        try:
-            station_port = int(station_port)
-        except ValueError:
-            raise ValueError(f'Invalid port number. string "{station_port}" could not be cast to int.')
+        await downlink.close()
+        await connections.close()
+        await backpressure.close()
+        await uplink.close()
+
+        if capture is not None:
+            await capture.close()
+
+        if fleet_state is not None:
+            await fleet_state.close()
+
+def get_sink_urls() -> List[str]:
+    """Return URLs of sinks from `UPLINK_SINKS` (comma separated), `BACKEND_BATCH_URL` is used when it is not defined."""
+    sink_urls = [url.strip() for url in get_env_str('UPLINK_SINKS', '').split(',') if url.strip()]
+    return sink_urls or [get_env_str('BACKEND_BATCH_URL')]
 
-    asyncio.run(main(backend_url, station_port))
+def run_worker(worker_id: int, stats_queue: Any, log_queue: Any) -> None:
+    """Entry point of a worker process started by `Supervisor`."""
+    forward_logs(log_queue)
+    run(main(get_sink_urls(), get_env_int('GPS_STATION_PORT'), worker_id, stats_queue), get_env_str('EVENT_LOOP', 'auto'))
 
+if __name__ == '__main__':
+    sink_urls = get_sink_urls()
+    station_port = get_env_int('GPS_STATION_PORT')
+    worker_count = get_env_int('GPS_STATION_WORKERS', 1) or os.cpu_count() or 1
+
+    if worker_count > 1:
+        Supervisor(worker_count, run_worker, stats_interval=get_env_float('GPS_STATION_STATS_INTERVAL', 10.0) * 3).run()
+    else:
+        run(main(sink_urls, station_port), get_env_str('EVENT_LOOP', 'auto'))
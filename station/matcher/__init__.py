@@ -1,6 +1,6 @@
 """Module for protocol identification on initial connection."""
 
-from .matcher import match_protocol
-
-__all__ = ('match_protocol', )
+from .matcher import match_protocol, registry
+from .registry import ProtocolRegistry
 
+__all__ = ('match_protocol', 'registry', 'ProtocolRegistry', )
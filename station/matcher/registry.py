@@ -0,0 +1,68 @@
+from typing import List, Tuple, Type
+
+from protocols import BaseProtocol, ProtocolSignature
+
+
+class ProtocolRegistry:
+    """Registry of protocols that station can identify on initial connection.
+
+    Each registered protocol's `signatures` are put into a table indexed by their leading byte,
+    so identifying protocol of bytes only checks signatures that start with the same byte as the bytes do,
+    instead of trying every protocol one by one. More specific (longer) prefixes are checked first.
+
+    Attributes:
+        protocols:
+            Registered protocols in the order of registration.
+    """
+
+    def __init__(self) -> None:
+        self.protocols: List[Type[BaseProtocol]] = []
+        self._first_byte_table: List[List[Tuple[ProtocolSignature, Type[BaseProtocol]]]] = [[] for _ in range(256)]
+
+    def register(self, protocol: Type[BaseProtocol]) -> Type[BaseProtocol]:
+        """Register a protocol, can be used as a class decorator.
+
+        Args:
+            protocol:
+                `BaseProtocol`'s subclass with at least one signature.
+
+        Returns:
+            `protocol` itself.
+
+        Raises:
+            ValueError: If protocol has no signatures.
+        """
+        if not protocol.signatures:
+            raise ValueError(f'Protocol {protocol.__name__} can not be registered because it does not define any signatures.')
+
+        for signature in protocol.signatures:
+            candidates = self._first_byte_table[signature.prefix[0]]
+            candidates.append((signature, protocol))
+            candidates.sort(key=lambda candidate: len(candidate[0].prefix), reverse=True)
+
+        self.protocols.append(protocol)
+
+        return protocol
+
+    def match(self, raw_bytes: bytes) -> Type[BaseProtocol] | None:
+        """Return protocol that `raw_bytes` match signature of, or `None` if there is no such protocol."""
+        if not raw_bytes:
+            return None
+
+        for signature, protocol in self._first_byte_table[raw_bytes[0]]:
+            if signature.matches(raw_bytes):
+                return protocol
+
+        return None
+
+    def incomplete(self, raw_bytes: bytes) -> bool:
+        """Return whether `raw_bytes` match no protocol, but could once more bytes are read, e.g. a record split between TCP segments."""
+        if not raw_bytes:
+            return False
+
+        candidates = self._first_byte_table[raw_bytes[0]]
+
+        return (
+            not any(signature.matches(raw_bytes) for signature, _ in candidates)
+            and any(signature.may_match(raw_bytes) for signature, _ in candidates)
+        )
@@ -0,0 +1,50 @@
+"""Package with in-process metrics of the station and their Prometheus text rendering."""
+
+from .registry import MetricsRegistry, Counter, Gauge, Histogram
+from .metrics import (
+    metrics_registry,
+    CONNECTIONS,
+    ACTIVE_CONNECTIONS,
+    CONNECTIONS_CLOSED,
+    CONNECTIONS_REJECTED,
+    PACKETS_DECODED,
+    DECODE_ERRORS,
+    UPLINK_RESPONSES,
+    UPLINK_QUEUE_DEPTH,
+    READS_PAUSED,
+    FIXES_DROPPED,
+    GEOFENCE_TRANSITIONS,
+    TRACK_POINTS,
+    DOWNLINK_COMMANDS,
+    READ_TO_DECODE_SECONDS,
+    DECODE_SECONDS,
+    UPLINK_ENQUEUE_SECONDS,
+    UPLINK_RTT_SECONDS,
+    ACK_WRITE_SECONDS,
+)
+
+__all__ = (
+    'MetricsRegistry',
+    'Counter',
+    'Gauge',
+    'Histogram',
+    'metrics_registry',
+    'CONNECTIONS',
+    'ACTIVE_CONNECTIONS',
+    'CONNECTIONS_CLOSED',
+    'CONNECTIONS_REJECTED',
+    'PACKETS_DECODED',
+    'DECODE_ERRORS',
+    'UPLINK_RESPONSES',
+    'UPLINK_QUEUE_DEPTH',
+    'READS_PAUSED',
+    'FIXES_DROPPED',
+    'GEOFENCE_TRANSITIONS',
+    'TRACK_POINTS',
+    'DOWNLINK_COMMANDS',
+    'READ_TO_DECODE_SECONDS',
+    'DECODE_SECONDS',
+    'UPLINK_ENQUEUE_SECONDS',
+    'UPLINK_RTT_SECONDS',
+    'ACK_WRITE_SECONDS',
+)
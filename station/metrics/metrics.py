@@ -0,0 +1,38 @@
+from .registry import MetricsRegistry
+
+# Registry of all metrics of the station process, rendered by `/metrics` endpoint of the local API.
+metrics_registry = MetricsRegistry()
+
+CONNECTIONS = metrics_registry.counter('gps_station_connections_total', 'Connections accepted by the station.')
+ACTIVE_CONNECTIONS = metrics_registry.gauge('gps_station_active_connections', 'Connections that are currently open.')
+CONNECTIONS_CLOSED = metrics_registry.counter(
+    'gps_station_connections_closed_total', 'Connections closed by the station, "idle" ones or "replaced" by a new connection of the same device.', ('reason', ),
+)
+CONNECTIONS_REJECTED = metrics_registry.counter(
+    'gps_station_connections_rejected_total', 'Connections rejected because station was "full", they arrived above accept "rate" or did not send anything in time ("handshake_timeout").', ('reason', ),
+)
+PACKETS_DECODED = metrics_registry.counter('gps_station_packets_decoded_total', 'Packets decoded successfully.', ('protocol', ))
+DECODE_ERRORS = metrics_registry.counter('gps_station_decode_errors_total', 'Packets that could not be decoded.', ('protocol', 'error'))
+UPLINK_RESPONSES = metrics_registry.counter(
+    'gps_station_uplink_responses_total', 'Responses of HTTP sinks to uplink batches by status code, "error" when backend could not be reached.', ('status', ),
+)
+UPLINK_QUEUE_DEPTH = metrics_registry.gauge('gps_station_uplink_queue_depth', 'Payloads waiting in the uplink queue.')
+READS_PAUSED = metrics_registry.gauge('gps_station_reads_paused', '1 while reading devices is paused because uplink is backlogged.')
+FIXES_DROPPED = metrics_registry.counter(
+    'gps_station_fixes_dropped_total', 'Fixes not sent uplink because they were a "duplicate" or the device was "stationary".', ('reason', ),
+)
+GEOFENCE_TRANSITIONS = metrics_registry.counter(
+    'gps_station_geofence_transitions_total', 'Geofences devices crossed, by direction ("enter" or "exit").', ('direction', ),
+)
+TRACK_POINTS = metrics_registry.counter(
+    'gps_station_track_points_total', 'Fixes of track segments sent to history sinks, "kept" in or "dropped" from simplified segments.', ('result', ),
+)
+DOWNLINK_COMMANDS = metrics_registry.counter(
+    'gps_station_downlink_commands_total', 'Commands for devices by the status they finished with, e.g. "confirmed" or "unconfirmed".', ('status', ),
+)
+
+READ_TO_DECODE_SECONDS = metrics_registry.histogram('gps_station_read_to_decode_seconds', 'Time from reading bytes of a packet to having it decoded.', ('protocol', ))
+DECODE_SECONDS = metrics_registry.histogram('gps_station_decode_seconds', 'Time spent decoding a single packet.', ('protocol', ))
+UPLINK_ENQUEUE_SECONDS = metrics_registry.histogram('gps_station_uplink_enqueue_seconds', 'Time spent handing a payload over to the uplink queue.')
+UPLINK_RTT_SECONDS = metrics_registry.histogram('gps_station_uplink_rtt_seconds', 'Round trip time of writing a single uplink batch to a sink.', ('sink', ))
+ACK_WRITE_SECONDS = metrics_registry.histogram('gps_station_ack_write_seconds', 'Time spent writing acknowledgements of records read at once to a device, including draining when its write buffer is full.', ('protocol', ))
@@ -0,0 +1,261 @@
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Callable, Dict, Iterator, List, Tuple
+
+# Buckets of latency histograms in seconds, from 50 microseconds (decoding a packet) to 10 seconds (slow backend).
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# (name suffix, labels, value) of a single line of text exposition format.
+Sample = Tuple[str, Dict[str, str], float]
+
+
+class CounterValue:
+    """Value of a counter with one combination of label values."""
+
+    __slots__ = ('value', )
+
+    def __init__(self) -> None:
+        self.value = 0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+
+class GaugeValue:
+    """Value of a gauge with one combination of label values, `function` is called on every scrape when set."""
+
+    __slots__ = ('value', 'function')
+
+    def __init__(self) -> None:
+        self.value = 0
+        self.function: Callable[[], float] | None = None
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.value -= amount
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        self.function = function
+
+    def get(self) -> float:
+        return self.function() if self.function is not None else self.value
+
+
+class HistogramValue:
+    """Observations of a histogram with one combination of label values.
+
+    Every observation increments exactly one bucket, buckets are only made cumulative when rendered.
+    """
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets: Tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last one is `+Inf`
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+# Value of one label combination of any metric type.
+MetricValue = CounterValue | GaugeValue | HistogramValue
+
+
+class Metric(ABC):
+    """Base class of metric families, i.e. a metric and all of its label combinations.
+
+    Values of label combinations are created on first use by `labels`, hot paths should keep the returned
+    value around instead of looking it up for every observation. Metrics without labels proxy `inc`,
+    `set`, `observe` etc. to their only value. None of the metrics are thread-safe, they are meant
+    to be updated from the event loop thread only.
+
+    Attributes:
+        name:
+            Name of the metric, e.g. `gps_station_connections_total`.
+        documentation:
+            Description of the metric, rendered as `# HELP` line.
+        labelnames:
+            Names of labels that values of the metric are partitioned by.
+    """
+
+    type: str
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[str, ...], MetricValue] = {}
+
+        if not labelnames:
+            self._value = self.labels()
+
+    def labels(self, *labelvalues: str) -> MetricValue:
+        """Return value of the metric for given label values, creating it if necessary.
+
+        Raises:
+            ValueError: If amount of label values is not the same as amount of label names.
+        """
+        value = self._values.get(labelvalues)
+
+        if value is None:
+            if len(labelvalues) != len(self.labelnames):
+                raise ValueError(f'Metric {self.name} expects {len(self.labelnames)} label values, instead got {len(labelvalues)}.')
+
+            value = self._values[labelvalues] = self._create_value()
+
+        return value
+
+    def samples(self) -> Iterator[Sample]:
+        """Yield samples of all label combinations of the metric."""
+        for labelvalues, value in self._values.items():
+            yield from self._samples(dict(zip(self.labelnames, labelvalues)), value)
+
+    @abstractmethod
+    def _create_value(self) -> MetricValue:
+        """Create value of a new label combination."""
+        pass
+
+    @abstractmethod
+    def _samples(self, labels: Dict[str, str], value: MetricValue) -> Iterator[Sample]:
+        """Yield samples of a single label combination's value."""
+        pass
+
+
+class Counter(Metric):
+    """Monotonically increasing value, e.g. amount of decoded packets."""
+
+    type = 'counter'
+
+    def inc(self, amount: float = 1) -> None:
+        self._value.inc(amount)
+
+    def _create_value(self) -> CounterValue:
+        return CounterValue()
+
+    def _samples(self, labels: Dict[str, str], value: CounterValue) -> Iterator[Sample]:
+        yield '', labels, value.value
+
+
+class Gauge(Metric):
+    """Value that can go up and down, e.g. amount of active connections."""
+
+    type = 'gauge'
+
+    def set(self, value: float) -> None:
+        self._value.set(value)
+
+    def inc(self, amount: float = 1) -> None:
+        self._value.inc(amount)
+
+    def dec(self, amount: float = 1) -> None:
+        self._value.dec(amount)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        self._value.set_function(function)
+
+    def _create_value(self) -> GaugeValue:
+        return GaugeValue()
+
+    def _samples(self, labels: Dict[str, str], value: GaugeValue) -> Iterator[Sample]:
+        yield '', labels, value.get()
+
+
+class Histogram(Metric):
+    """Distribution of observed values in fixed buckets, e.g. latency of decoding a packet.
+
+    Attributes:
+        buckets:
+            Sorted upper bounds of buckets, `+Inf` bucket is implicit.
+    """
+
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def observe(self, value: float) -> None:
+        self._value.observe(value)
+
+    def _create_value(self) -> HistogramValue:
+        return HistogramValue(self.buckets)
+
+    def _samples(self, labels: Dict[str, str], value: HistogramValue) -> Iterator[Sample]:
+        cumulative = 0
+
+        for bound, count in zip((*self.buckets, float('inf')), value.counts):
+            cumulative += count
+            yield '_bucket', {**labels, 'le': format_value(bound)}, cumulative
+
+        yield '_sum', labels, value.sum
+        yield '_count', labels, value.count
+
+
+class MetricsRegistry:
+    """Collection of metrics rendered together in Prometheus text exposition format."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        """Add metric to the registry and return it.
+
+        Raises:
+            ValueError: If a metric with the same name is already registered.
+        """
+        if metric.name in self._metrics:
+            raise ValueError(f'Metric {metric.name} is already registered.')
+
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        """Return current values of all metrics in Prometheus text exposition format (version 0.0.4)."""
+        lines: List[str] = []
+
+        for metric in self._metrics.values():
+            lines.append(f'# HELP {metric.name} {escape(metric.documentation, quotes=False)}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+
+            for suffix, labels, value in metric.samples():
+                if labels:
+                    rendered_labels = ','.join(f'{name}="{escape(label)}"' for name, label in labels.items())
+                    lines.append(f'{metric.name}{suffix}{{{rendered_labels}}} {format_value(value)}')
+                else:
+                    lines.append(f'{metric.name}{suffix} {format_value(value)}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def escape(text: str, quotes: bool = True) -> str:
+    """Escape help text or label value as required by the text exposition format."""
+    text = text.replace('\\', '\\\\').replace('\n', '\\n')
+    return text.replace('"', '\\"') if quotes else text
+
+
+def format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+
+    return repr(value)
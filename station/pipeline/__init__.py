@@ -0,0 +1,9 @@
+"""Package with stages location payloads go through on their way from protocols to the uplink."""
+
+from .base import BaseStage
+from .fix_filter import FixFilter
+from .geofence_tagger import GeofenceTagger
+from .state_recorder import StateRecorder
+from .track_compressor import TrackCompressor
+
+__all__ = ('BaseStage', 'FixFilter', 'GeofenceTagger', 'StateRecorder', 'TrackCompressor', )
@@ -0,0 +1,49 @@
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING, Dict
+
+from protocols.payloads import BaseLocationPayload
+
+if TYPE_CHECKING:
+    from uplink import UplinkFanout, UplinkQueue
+
+
+class BaseStage(ABC):
+    """Step location payloads go through between protocols and the uplink.
+
+    Stages are chained in front of the uplink queue (or fan-out) and expose the same interface,
+    so protocols do not know whether payloads they send are filtered or enriched on the way.
+    Each stage handles a payload in `put` and passes it (or not) on to `downstream`, `persist` does the same
+    and also tells whether the payload was stored, a payload a stage drops counts as stored.
+
+    Attributes:
+        downstream:
+            Next stage, or the uplink itself.
+    """
+
+    def __init__(self, downstream: 'BaseStage | UplinkQueue | UplinkFanout') -> None:
+        self.downstream = downstream
+
+    @property
+    def depth(self) -> int:
+        """Number of payloads waiting in the uplink behind the stage."""
+        return self.downstream.depth
+
+    def stats(self) -> Dict[str, int]:
+        """Return counters of downstream, subclasses add their own."""
+        return self.downstream.stats()
+
+    async def start(self) -> None:
+        await self.downstream.start()
+
+    async def close(self) -> None:
+        await self.downstream.close()
+
+    @abstractmethod
+    async def put(self, location_payload: BaseLocationPayload) -> None:
+        """Handle location payload sent by a protocol, waits while downstream is full."""
+        pass
+
+    @abstractmethod
+    async def persist(self, location_payload: BaseLocationPayload) -> bool:
+        """Handle location payload like `put` and wait until downstream stored it, see `UplinkQueue.persist`."""
+        pass
@@ -0,0 +1,225 @@
+import math
+import time
+from array import array
+from collections import OrderedDict
+from dataclasses import fields
+from functools import cache
+from typing import TYPE_CHECKING, Dict, Tuple, Type
+
+from metrics import FIXES_DROPPED
+from protocols.payloads import BaseLocationPayload
+
+from .base import BaseStage
+
+if TYPE_CHECKING:
+    from uplink import UplinkFanout, UplinkQueue
+
+# Meters per degree of latitude, good enough for telling whether a device moved.
+METERS_PER_DEGREE = 111_320.0
+
+fixes_duplicate = FIXES_DROPPED.labels('duplicate')
+fixes_stationary = FIXES_DROPPED.labels('stationary')
+
+
+class DeviceState:
+    """What fix filter remembers about a single device.
+
+    Attributes:
+        latitude:
+            Latitude of the last forwarded fix.
+        longitude:
+            Longitude of the last forwarded fix.
+        status:
+            Status bits of the last received fix, see `status_fields`.
+        forwarded_at:
+            `time.monotonic()` of when the last fix was forwarded.
+        recent:
+            Ring of hashes of the last received fixes, used to recognize records device sends again.
+        position:
+            Index in `recent` the next hash is written to.
+    """
+
+    __slots__ = ('latitude', 'longitude', 'status', 'forwarded_at', 'recent', 'position')
+
+    def __init__(self, window: int) -> None:
+        self.latitude = 0.0
+        self.longitude = 0.0
+        self.status = -1
+        self.forwarded_at = 0.0
+        # Array of machine integers is a fraction of the size of a list or a set of Python integers.
+        self.recent = array('q', bytes(8 * window))
+        self.position = 0
+
+    def remember(self, key: int) -> None:
+        """Add hash of a fix to `recent`, replacing the oldest one."""
+        self.recent[self.position] = key
+        self.position = (self.position + 1) % len(self.recent)
+
+
+class FixFilter(BaseStage):
+    """Drops fixes that the backend already has or does not need.
+
+    A fix is dropped when:
+    - it is an exact duplicate of one of the last `window` fixes of the same device, by (IMEI, time, latitude, longitude),
+      e.g. a record device sends again after reconnecting.
+    - stationary suppression is enabled (`min_distance` > 0), the device moved less than `min_distance` meters from the last
+      forwarded fix, reports speed below `min_speed` and the last fix was forwarded less than `max_interval` seconds ago.
+    Fixes whose status bits (e.g. `cut_fuel`, `shock_alarm`, `battery_cut_off`) differ from the previous fix are always forwarded.
+
+    State is kept for at most `max_devices` devices, the least recently heard from ones are forgotten first,
+    a forgotten device's next fix is forwarded as if it was the first one.
+
+    Attributes:
+        max_devices:
+            Maximum amount of devices state is kept for.
+        window:
+            Amount of the last fixes of each device duplicates are looked for among.
+        min_distance:
+            Meters a parked device has to move for its fix to be forwarded, `0` disables stationary suppression.
+        min_speed:
+            Speed (in units of the payload) at or above which a fix is forwarded regardless of distance.
+        max_interval:
+            Seconds after which a fix of a parked device is forwarded anyway, so backend knows it is still online.
+        devices:
+            State of every remembered device by IMEI, in order of last use.
+        duplicates:
+            Total amount of dropped duplicate fixes.
+        stationary:
+            Total amount of dropped stationary fixes.
+    """
+
+    def __init__(
+        self,
+        downstream: 'BaseStage | UplinkQueue | UplinkFanout',
+        max_devices: int = 100_000,
+        window: int = 8,
+        min_distance: float = 0.0,
+        min_speed: float = 5.0,
+        max_interval: float = 300.0,
+    ) -> None:
+        super().__init__(downstream)
+        self.max_devices = max_devices
+        self.window = window
+        self.min_distance = min_distance
+        self.min_speed = min_speed
+        self.max_interval = max_interval
+        self.devices: OrderedDict[str, DeviceState] = OrderedDict()
+        self.duplicates = 0
+        self.stationary = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            **super().stats(),
+            'fixes_duplicate': self.duplicates,
+            'fixes_stationary': self.stationary,
+            'fix_devices': len(self.devices),
+        }
+
+    async def put(self, location_payload: BaseLocationPayload) -> None:
+        if self.accept(location_payload, time.monotonic()):
+            await self.downstream.put(location_payload)
+
+    async def persist(self, location_payload: BaseLocationPayload) -> bool:
+        # Dropped fixes are either already stored or not needed, device can be told they are. A fix is only
+        # remembered once it is stored, so the device's retransmission of a fix that was not is forwarded again.
+        if not self.accept(location_payload, time.monotonic(), remember=False):
+            return True
+
+        persisted = await self.downstream.persist(location_payload)
+
+        if persisted:
+            self.remember(location_payload)
+
+        return persisted
+
+    def accept(self, location_payload: BaseLocationPayload, now: float, remember: bool = True) -> bool:
+        """Update state of the payload's device and tell whether payload should be forwarded.
+
+        Args:
+            location_payload:
+                Decoded fix.
+            now:
+                `time.monotonic()` of when the fix was received.
+            remember:
+                Whether the fix is remembered right away to recognize it if device sends it again,
+                otherwise `remember` has to be called once it is stored.
+        """
+        imei = location_payload.device_serial_number
+        latitude = location_payload.latitude
+        longitude = location_payload.longitude
+        devices = self.devices
+        state = devices.get(imei)
+
+        if state is None:
+            state = devices[imei] = DeviceState(self.window)
+
+            if len(devices) > self.max_devices:
+                devices.popitem(last=False)
+        else:
+            devices.move_to_end(imei)
+
+        key = fix_key(location_payload)
+
+        if key in state.recent:
+            self.duplicates += 1
+            fixes_duplicate.inc()
+            return False
+
+        if remember:
+            state.remember(key)
+
+        status = status_bits(location_payload)
+        status_changed = status != state.status
+        state.status = status
+
+        if (
+            not status_changed
+            and self.min_distance > 0
+            and getattr(location_payload, 'speed', 0.0) < self.min_speed
+            and now - state.forwarded_at < self.max_interval
+            and distance(state.latitude, state.longitude, latitude, longitude) < self.min_distance
+        ):
+            self.stationary += 1
+            fixes_stationary.inc()
+            return False
+
+        state.latitude = latitude
+        state.longitude = longitude
+        state.forwarded_at = now
+        return True
+
+    def remember(self, location_payload: BaseLocationPayload) -> None:
+        """Remember a fix `accept` was told not to, so that it is dropped if device sends it again."""
+        state = self.devices.get(location_payload.device_serial_number)
+
+        # Device might have been forgotten while the fix was being stored.
+        if state is not None:
+            state.remember(fix_key(location_payload))
+
+
+def fix_key(location_payload: BaseLocationPayload) -> int:
+    """Return hash duplicates of a fix are recognized by, IMEI is not part of it because state is kept per device."""
+    return hash((location_payload.time, location_payload.latitude, location_payload.longitude))
+
+
+@cache
+def status_fields(payload_class: Type) -> Tuple[str, ...]:
+    """Return names of boolean fields of a payload class, they hold device's status bits (and fix validity)."""
+    return tuple(field.name for field in fields(payload_class) if field.type in (bool, 'bool'))
+
+
+def status_bits(location_payload: BaseLocationPayload) -> int:
+    """Return status bits of a payload packed into an integer."""
+    bits = 0
+
+    for name in status_fields(type(location_payload)):
+        bits = bits << 1 | getattr(location_payload, name)
+
+    return bits
+
+
+def distance(latitude_a: float, longitude_a: float, latitude_b: float, longitude_b: float) -> float:
+    """Return approximate distance between two points in meters (equirectangular projection, fine for short distances)."""
+    x = (longitude_b - longitude_a) * math.cos(math.radians((latitude_a + latitude_b) / 2))
+    y = latitude_b - latitude_a
+    return math.hypot(x, y) * METERS_PER_DEGREE
@@ -0,0 +1,177 @@
+import asyncio
+import os
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, Tuple
+
+from geofence import GeofenceFileError, GeofenceIndex, load_geofences
+from logger import logger
+from metrics import GEOFENCE_TRANSITIONS
+from protocols.payloads import BaseLocationPayload
+
+from .base import BaseStage
+
+if TYPE_CHECKING:
+    from uplink import UplinkFanout, UplinkQueue
+
+geofences_entered = GEOFENCE_TRANSITIONS.labels('enter')
+geofences_exited = GEOFENCE_TRANSITIONS.labels('exit')
+
+
+class GeofenceTagger(BaseStage):
+    """Tags fixes with geofences they are in and fences their device entered or exited since its previous fix.
+
+    Fences are loaded from a GeoJSON file (see `load_geofences`) into a grid index, so a fix is only tested
+    against polygons near it. The file is checked for changes every `reload_interval` seconds and reloaded
+    in a thread without stopping the stage; a file that can not be loaded is logged and the previous fences are kept.
+
+    Every tagged payload gets `geofences`, `geofences_entered` and `geofences_exited` are only set when
+    the device crossed a fence. A device's first fix (or the first one after it was forgotten) has no transitions.
+    Fixes that are not valid (`valid` is `False`) are not tagged and do not change device's state.
+
+    State is kept for at most `max_devices` devices, the least recently heard from ones are forgotten first.
+
+    Attributes:
+        path:
+            Path of the GeoJSON file fences are loaded from.
+        cell_size:
+            Size of grid cells of the index in degrees.
+        reload_interval:
+            Seconds between checks whether the file changed, `0` disables reloading.
+        max_devices:
+            Maximum amount of devices state is kept for.
+        index:
+            Index of currently loaded fences.
+        devices:
+            Ids of fences every remembered device was in at its last fix, in order of last use.
+        reloads:
+            Total amount of times the file was reloaded.
+        reload_errors:
+            Total amount of times a changed file could not be loaded.
+        transitions:
+            Total amount of fences entered or exited.
+    """
+
+    def __init__(
+        self,
+        downstream: 'BaseStage | UplinkQueue | UplinkFanout',
+        path: str,
+        cell_size: float = 0.01,
+        reload_interval: float = 5.0,
+        max_devices: int = 100_000,
+    ) -> None:
+        super().__init__(downstream)
+        self.path = path
+        self.cell_size = cell_size
+        self.reload_interval = reload_interval
+        self.max_devices = max_devices
+        # File that can not be loaded at startup is a configuration error, unlike a bad reload.
+        self.index = load_index(path, cell_size)
+        self.devices: OrderedDict[str, Tuple[str, ...]] = OrderedDict()
+        self.reloads = 0
+        self.reload_errors = 0
+        self.transitions = 0
+
+        self._modified_at = os.stat(path).st_mtime_ns
+        self._watch_task: asyncio.Task | None = None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            **super().stats(),
+            'geofences': len(self.index.fences),
+            'geofence_devices': len(self.devices),
+            'geofence_reloads': self.reloads,
+            'geofence_reload_errors': self.reload_errors,
+            'geofence_transitions': self.transitions,
+        }
+
+    async def start(self) -> None:
+        await super().start()
+
+        if self.reload_interval > 0:
+            self._watch_task = asyncio.create_task(self._watch())
+
+    async def close(self) -> None:
+        if self._watch_task is not None:
+            self._watch_task.cancel()
+            await asyncio.gather(self._watch_task, return_exceptions=True)
+            self._watch_task = None
+
+        await super().close()
+
+    async def put(self, location_payload: BaseLocationPayload) -> None:
+        self.tag(location_payload)
+        await self.downstream.put(location_payload)
+
+    async def persist(self, location_payload: BaseLocationPayload) -> bool:
+        self.tag(location_payload)
+        return await self.downstream.persist(location_payload)
+
+    def tag(self, location_payload: BaseLocationPayload) -> None:
+        """Set geofence fields of the payload and remember fences its device is in."""
+        if not getattr(location_payload, 'valid', True):
+            return
+
+        fences = self.index.lookup(location_payload.latitude, location_payload.longitude)
+        location_payload.geofences = fences
+
+        imei = location_payload.device_serial_number
+        devices = self.devices
+        previous = devices.get(imei)
+
+        if previous is None:
+            devices[imei] = fences
+
+            if len(devices) > self.max_devices:
+                devices.popitem(last=False)
+
+            return
+
+        devices.move_to_end(imei)
+
+        if previous == fences:
+            return
+
+        devices[imei] = fences
+        entered = tuple(fence for fence in fences if fence not in previous)
+        exited = tuple(fence for fence in previous if fence not in fences)
+
+        if entered:
+            location_payload.geofences_entered = entered
+            geofences_entered.inc(len(entered))
+
+        if exited:
+            location_payload.geofences_exited = exited
+            geofences_exited.inc(len(exited))
+
+        self.transitions += len(entered) + len(exited)
+
+    async def _watch(self) -> None:
+        """Reload fences whenever the file changes."""
+        while True:
+            await asyncio.sleep(self.reload_interval)
+
+            try:
+                modified_at = os.stat(self.path).st_mtime_ns
+            except OSError:
+                # File is being replaced, or was removed, previous fences stay in use.
+                continue
+
+            if modified_at == self._modified_at:
+                continue
+
+            # A failed load is not retried until the file changes again, e.g. once it is completely written.
+            self._modified_at = modified_at
+
+            try:
+                self.index = await asyncio.to_thread(load_index, self.path, self.cell_size)
+            except GeofenceFileError as e:
+                self.reload_errors += 1
+                logger.error('Could not reload geofences, previous ones are still used. %s', e)
+                continue
+
+            self.reloads += 1
+            logger.info('Reloaded %s geofences from "%s".', len(self.index.fences), self.path)
+
+
+def load_index(path: str, cell_size: float) -> GeofenceIndex:
+    return GeofenceIndex(load_geofences(path), cell_size)
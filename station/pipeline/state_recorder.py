@@ -0,0 +1,39 @@
+from typing import TYPE_CHECKING, Dict
+
+from fleet import FleetState
+from protocols.payloads import BaseLocationPayload
+
+from .base import BaseStage
+
+if TYPE_CHECKING:
+    from uplink import UplinkFanout, UplinkQueue
+
+
+class StateRecorder(BaseStage):
+    """Records every fix as the last known state of its device, see `FleetState`.
+
+    It comes first in the pipeline, so fixes that later stages drop (e.g. of parked devices) still update when
+    a device was last seen.
+
+    Attributes:
+        state:
+            Fleet state fixes are recorded in, served by the local API.
+    """
+
+    def __init__(self, downstream: 'BaseStage | UplinkQueue | UplinkFanout', state: FleetState) -> None:
+        super().__init__(downstream)
+        self.state = state
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            **super().stats(),
+            **{f'fleet_{name}': value for name, value in self.state.stats().items()},
+        }
+
+    async def put(self, location_payload: BaseLocationPayload) -> None:
+        self.state.update(location_payload)
+        await self.downstream.put(location_payload)
+
+    async def persist(self, location_payload: BaseLocationPayload) -> bool:
+        self.state.update(location_payload)
+        return await self.downstream.persist(location_payload)
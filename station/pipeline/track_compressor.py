@@ -0,0 +1,196 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Dict, List
+
+from metrics import TRACK_POINTS
+from protocols.payloads import BaseLocationPayload
+from trajectory import DeviceTrack, TrackSegment
+from trajectory.segment import CLOSED_BY_EVICTION, CLOSED_BY_POINTS, CLOSED_BY_SHUTDOWN, CLOSED_BY_STATUS, CLOSED_BY_WINDOW
+
+from .base import BaseStage
+from .fix_filter import status_bits, status_fields
+
+if TYPE_CHECKING:
+    from uplink import UplinkFanout, UplinkQueue
+
+track_points_kept = TRACK_POINTS.labels('kept')
+track_points_dropped = TRACK_POINTS.labels('dropped')
+
+
+class TrackCompressor(BaseStage):
+    """Simplifies tracks of devices into delta encoded segments and sends them to history sinks.
+
+    Every fix is still passed on to `downstream` unchanged, that is the live path. Valid fixes are also added to
+    their device's current segment (see `DeviceTrack`), which keeps only points needed to reproduce the track
+    within `max_error` meters. A segment is sent to `history` as a `TrackSegment` once it spans `window` seconds or
+    `max_points` fixes, right away when status bits of a fix differ from the segment's, and on close.
+    Segments closed by window or size continue from their last point, so consecutive segments join up.
+    Points are timestamped with the time station received them.
+
+    Segments are kept for at most `max_devices` devices, the least recently heard from one's segment is sent
+    early when a new device comes. Segments of devices that go silent are sent once their window passes.
+
+    Attributes:
+        history:
+            Uplink segments are sent to, started and closed with the stage.
+        max_error:
+            Maximum distance in meters of a dropped fix from the simplified track.
+        window:
+            Seconds a segment spans at most.
+        max_points:
+            Fixes a segment is simplified from at most.
+        max_devices:
+            Maximum amount of devices segments are kept for.
+        tracks:
+            Current segment of every device by IMEI, in order of last use.
+        fixes:
+            Total amount of fixes added to segments.
+        kept:
+            Total amount of points in sent segments.
+        segments:
+            Total amount of sent segments.
+    """
+
+    def __init__(
+        self,
+        downstream: 'BaseStage | UplinkQueue | UplinkFanout',
+        history: 'UplinkQueue | UplinkFanout',
+        max_error: float = 10.0,
+        window: float = 300.0,
+        max_points: int = 500,
+        max_devices: int = 100_000,
+    ) -> None:
+        super().__init__(downstream)
+        self.history = history
+        self.max_error = max_error
+        self.window = window
+        self.max_points = max_points
+        self.max_devices = max_devices
+        self.tracks: OrderedDict[str, DeviceTrack] = OrderedDict()
+        self.fixes = 0
+        self.kept = 0
+        self.segments = 0
+
+        self._sweep_task: asyncio.Task | None = None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            **super().stats(),
+            'track_devices': len(self.tracks),
+            'track_fixes': self.fixes,
+            'track_points': self.kept,
+            'track_segments': self.segments,
+            **{f'history_{name}': value for name, value in self.history.stats().items()},
+        }
+
+    async def start(self) -> None:
+        await super().start()
+        await self.history.start()
+        self._sweep_task = asyncio.create_task(self._sweep_periodically())
+
+    async def close(self) -> None:
+        if self._sweep_task is not None:
+            self._sweep_task.cancel()
+            await asyncio.gather(self._sweep_task, return_exceptions=True)
+            self._sweep_task = None
+
+        # Handlers of connections still open may add tracks while segments are sent, each one is popped before it is sent.
+        while self.tracks:
+            imei, track = self.tracks.popitem(last=False)
+            await self.history.put(self._close(imei, track, CLOSED_BY_SHUTDOWN))
+
+        await self.history.close()
+        await super().close()
+
+    async def put(self, location_payload: BaseLocationPayload) -> None:
+        await self.downstream.put(location_payload)
+
+        for segment in self.add(location_payload, time.time()):
+            await self.history.put(segment)
+
+    async def persist(self, location_payload: BaseLocationPayload) -> bool:
+        # Only the live path decides whether a fix is stored, history segments are sent later anyway.
+        persisted = await self.downstream.persist(location_payload)
+
+        for segment in self.add(location_payload, time.time()):
+            await self.history.put(segment)
+
+        return persisted
+
+    def add(self, location_payload: BaseLocationPayload, now: float) -> List[TrackSegment]:
+        """Add a fix to its device's segment and return segments that were closed because of it.
+
+        Args:
+            location_payload:
+                Decoded fix.
+            now:
+                Unix time the fix was received at.
+        """
+        if not getattr(location_payload, 'valid', True):
+            return []
+
+        imei = location_payload.device_serial_number
+        point = (now, location_payload.latitude, location_payload.longitude, getattr(location_payload, 'speed', 0.0))
+        status = status_bits(location_payload)
+        tracks = self.tracks
+        track = tracks.get(imei)
+        segments: List[TrackSegment] = []
+
+        if track is None:
+            track = tracks[imei] = DeviceTrack(status, status_names(location_payload))
+
+            if len(tracks) > self.max_devices:
+                evicted_imei, evicted_track = tracks.popitem(last=False)
+                segments.append(self._close(evicted_imei, evicted_track, CLOSED_BY_EVICTION))
+        else:
+            tracks.move_to_end(imei)
+
+            if status != track.status:
+                segments.append(self._close(imei, track, CLOSED_BY_STATUS))
+                track = tracks[imei] = DeviceTrack(status, status_names(location_payload))
+            elif track.fixes >= self.max_points or now - track.started_at >= self.window:
+                segments.append(self._close(imei, track, CLOSED_BY_POINTS if track.fixes >= self.max_points else CLOSED_BY_WINDOW))
+                track = tracks[imei] = track.continued()
+
+        track.add(point, self.max_error)
+        self.fixes += 1
+        return segments
+
+    def _close(self, imei: str, track: DeviceTrack, closed_by: str) -> TrackSegment:
+        segment = track.close(imei, closed_by)
+        self.kept += segment.points
+        self.segments += 1
+        track_points_kept.inc(segment.points)
+        # Point carried over from the previous segment is not one of the segment's fixes.
+        track_points_dropped.inc(max(0, segment.fixes - segment.points))
+        return segment
+
+    async def _sweep_periodically(self) -> None:
+        """Send segments whose window passed without a fix that would close them, forget devices that went silent."""
+        while True:
+            await asyncio.sleep(min(self.window / 2, 10.0))
+            started_before = time.time() - self.window
+            segments: List[TrackSegment] = []
+
+            # Segments are closed before any of them is sent, `add` can not change tracks in the meantime.
+            for imei, track in list(self.tracks.items()):
+                if track.started_at > started_before:
+                    continue
+
+                if track.fixes == 0:
+                    # Nothing but the point carried over from the previous segment.
+                    del self.tracks[imei]
+                elif track.last_point[0] <= started_before:
+                    segments.append(self._close(imei, self.tracks.pop(imei), CLOSED_BY_WINDOW))
+                else:
+                    segments.append(self._close(imei, track, CLOSED_BY_WINDOW))
+                    self.tracks[imei] = track.continued()
+
+            for segment in segments:
+                await self.history.put(segment)
+
+
+def status_names(location_payload: BaseLocationPayload) -> tuple:
+    """Return names of status bits (boolean fields) of a payload that are set."""
+    return tuple(name for name in status_fields(type(location_payload)) if getattr(location_payload, name))
@@ -2,6 +2,7 @@
 
 from .base import BaseProtocol
 from .h02 import H02Protocol
+from .signature import ProtocolSignature
 
-__all__ = ('BaseProtocol', 'H02Protocol', )
+__all__ = ('BaseProtocol', 'H02Protocol', 'ProtocolSignature', )
 
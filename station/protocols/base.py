@@ -1,12 +1,22 @@
 from abc import ABC, abstractmethod
 import asyncio
+import time
+from typing import TYPE_CHECKING, Tuple
 
-import aiohttp
-
-from logger import logger
+from metrics import UPLINK_ENQUEUE_SECONDS
  
+from .exceptions import UnsupportedCommandError
 from .packet_decoder import BasePacketDecoder
 from .payloads import BaseLocationPayload
+from .signature import ProtocolSignature
+
+# `uplink` and `connections` depend on this package, importing them at runtime would be circular.
+if TYPE_CHECKING:
+    from admission import Backpressure
+    from connections import Connection
+    from downlink import DownlinkCommand
+    from pipeline import BaseStage
+    from uplink import UplinkFanout, UplinkQueue
 
 class BaseProtocol(ABC):
     """Blueprint for all other protocols to build upon.
@@ -19,54 +29,75 @@ class BaseProtocol(ABC):
     Attributes:
         packet_decoder:
             instance of `BasePacketDecoder`'s subclass used to decode data packets sent by device.
+        signatures:
+            Signatures that data sent first by a device using the protocol matches, used for protocol identification.
         exception_counter:
             Number of exceptions caught during lifetime of the connection - each exception increments this attribute by 1.
         exception_threshold:
             Maximum value `exception_counter` is allowed to reach, connection is closed when threshold value is reached.
         device_imei:
-            IMEI of the connected device, not set initially but after protocol is identified and device is in a loop.
+            IMEI of the connected device, `None` initially, set by `identify_device` once device's first packet is decoded.
         total_sent:
             Total amount of packets sent to the backend in current session.
         stream_writer:
             `asyncio.StreamWriter` instance used to send data to device.
         stream_reader:
             `asyncio.StreamReader` instance used to await and read data sent by devices.
-        session:
-            Aiohttp session shared by all `BaseProtocol` instances, used to send data uplink.
-        backend_url:
-            URL of HTTP server that location payloads should be sent to.
+        uplink:
+            Uplink queue (or fan-out to several sinks, or pipeline stages in front of them) shared by all `BaseProtocol` instances, used to send data to the backend.
+        handshake:
+            Bytes read from the stream when protocol was being identified, they should be processed before reading further.
+        connection:
+            Station's record of the connection, protocols report every read to it so that it is not closed as idle.
+            `None` when protocol is used outside of a station.
+        backpressure:
+            Protocols wait for it before every read, so devices are not read while uplink is backlogged.
+            `None` when protocol is used outside of a station.
+        ack_after_persist:
+            Whether records are acknowledged to the device only once uplink stored them (see `persist_uplink`),
+            instead of right after they are decoded.
+        write_high_water:
+            Bytes waiting in the connection's write buffer above which `write_to_device` waits for them to be sent.
     """
 
     packet_decoder: BasePacketDecoder
+    signatures: Tuple[ProtocolSignature, ...] = ()
     exception_counter: int = 0
     exception_threshold: int = 10
-    device_imei: str
+    device_imei: str | None = None
     total_sent: int = 0
+    write_high_water: int = 65_536
 
     def __init__(
         self,
         stream_reader: asyncio.StreamReader,
         stream_writer: asyncio.StreamWriter,
-        session: aiohttp.ClientSession,
-        backend_url: str
+        uplink: 'BaseStage | UplinkQueue | UplinkFanout',
+        handshake: bytes = b'',
+        connection: 'Connection | None' = None,
+        backpressure: 'Backpressure | None' = None,
+        ack_after_persist: bool = False,
     ) -> None:
         self.stream_reader = stream_reader
         self.stream_writer = stream_writer
-        self.client_session = session
-        self.backend_url = backend_url
+        self.uplink = uplink
+        self.handshake = handshake
+        self.connection = connection
+        self.backpressure = backpressure
+        self.ack_after_persist = ack_after_persist
 
     @classmethod
-    @abstractmethod
     def bytes_is_self(cls, raw_bytes: bytes) -> bool:
         """Determine if bytes belong to calling `BaseProtocol`'s subclass.
 
-        Determine if given list of bytes belong to calling `BaseProtocol`'s subclass.
+        Determine if given list of bytes match one of the `signatures` of calling `BaseProtocol`'s subclass.
+        Nothing is decoded, protocol identification in `matcher` uses the same signatures through a first-byte table.
         Intended usage pseudo code:
         ```python
         bytes = reader.read(100)
 
         if SomeProtocol::bytes_is_self(bytes):
-            SomeProtocol(reader, writer, ...)
+            SomeProtocol(reader, writer, uplink, bytes)
         ```
 
         Args:
@@ -76,7 +107,7 @@ class BaseProtocol(ABC):
         Returns:
             Either `True` or `False`.
         """
-        pass
+        return any(signature.matches(raw_bytes) for signature in cls.signatures)
 
     @abstractmethod
     async def loop(self) -> None:
@@ -90,19 +121,89 @@ class BaseProtocol(ABC):
         """
         pass
 
+    def identify_device(self, imei: str) -> None:
+        """Remember IMEI of the connected device and register the connection under it.
+
+        Station closes previous connection of the same device, if it is still open.
+
+        Args:
+            imei:
+                IMEI reported by the device.
+        """
+        self.device_imei = imei
+
+        if self.connection is not None:
+            self.connection.registry.identify(self.connection, imei)
+
+    def encode_command(self, command: 'DownlinkCommand') -> Tuple[bytes, str]:
+        """Encode a command for the connected device.
+
+        Args:
+            command:
+                Command queued by the station's downlink dispatcher.
+
+        Returns:
+            Bytes to write to the device and a key that device's reply to the command will be reported with (see `command_replied`).
+
+        Raises:
+            UnsupportedCommandError: If protocol (or the device) does not support the command.
+        """
+        raise UnsupportedCommandError(f'{self.__class__.__name__} does not support sending commands to devices.')
+
+    def command_replied(self, reply_key: str, reply: str) -> None:
+        """Report device's reply to a command to the station, which confirms the command in flight.
+
+        Args:
+            reply_key:
+                Key of the replied command, the same one `encode_command` returned for it.
+            reply:
+                Reply as the device sent it.
+        """
+        if self.connection is not None:
+            self.connection.registry.reply_received(self.connection, reply_key, reply)
+
     async def terminate_connection(self) -> None:
         self.stream_writer.close()
         await self.stream_writer.wait_closed()
 
     async def send_uplink(self, location_payload: BaseLocationPayload) -> None:
-        """Sent location data to backend.
+        """Send location data to backend.
+
+        Payload is put into the shared uplink queue and sent in a batch by its workers,
+        this only waits when the queue is full. Time spent waiting is recorded in `UPLINK_ENQUEUE_SECONDS`.
         
         Args:
             location_payload:
                 A `BaseLocationPayload` subclass' instance containing all formatted location data that is stored in database.
         """
-        response = await self.client_session.post(self.backend_url, data=location_payload.__dict__)
+        started_at = time.perf_counter()
+        await self.uplink.put(location_payload)
+        UPLINK_ENQUEUE_SECONDS.observe(time.perf_counter() - started_at)
+
 
-        if response.status != 201:
-            logger.critical(f'Backend returned unexpected status code. Could not save payload. Status code: {response.status}. Payload: {location_payload}')
+    async def persist_uplink(self, location_payload: BaseLocationPayload) -> bool:
+        """Send location data to backend and wait until it is stored.
+
+        Args:
+            location_payload:
+                A `BaseLocationPayload` subclass' instance containing all formatted location data that is stored in database.
+
+        Returns:
+            `True` once payload is written to every sink (or spool), `False` if it could not be delivered.
+        """
+        return await self.uplink.persist(location_payload)
+
+    async def write_to_device(self, data: bytes) -> None:
+        """Write data to the device, waits only while the connection's write buffer is above `write_high_water`.
+
+        Writes are not drained one by one, a device that reads its acknowledgements slowly only
+        holds up its own connection once it has that many bytes waiting for it.
+
+        Args:
+            data:
+                Bytes to send to the device.
+        """
+        self.stream_writer.write(data)
 
+        if self.stream_writer.transport.get_write_buffer_size() > self.write_high_water:
+            await self.stream_writer.drain()
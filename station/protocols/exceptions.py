@@ -15,3 +15,7 @@ class BadProtocolError(Exception):
     """
     pass
 
+
+class UnsupportedCommandError(Exception):
+    """Protocol, or the connected device, does not support a downlink command."""
+    pass
@@ -0,0 +1,60 @@
+import time
+from typing import TYPE_CHECKING, Tuple
+
+from protocols.exceptions import UnsupportedCommandError
+
+# `downlink` depends on `connections` which depends on this package, importing it at runtime would be circular.
+if TYPE_CHECKING:
+    from downlink import DownlinkCommand
+
+# Devices reply to commands with `*HQ,<imei>,V4,<command>,...#`, marker is looked for only near the start of a record.
+REPLY_MARKER = b',V4,'
+REPLY_MARKER_END = 32
+
+
+def encode_h02_command(imei: str, command: 'DownlinkCommand') -> Tuple[bytes, str]:
+    """Encode a command to the ASCII form H02 devices accept in both ASCII and binary mode.
+
+    Args:
+        imei:
+            IMEI of the device, as reported by the device itself.
+        command:
+            Command to encode.
+
+    Returns:
+        Encoded command and name of the H02 command the device's `V4` reply will contain.
+
+    Raises:
+        UnsupportedCommandError: If command type is not supported by H02 devices.
+    """
+    # Devices do not check it, but expect current (UTC) time as the first argument of every command.
+    now = time.strftime('%H%M%S', time.gmtime())
+
+    if command.type == 'cut_fuel':
+        name, arguments = 'S20', '1,1'
+    elif command.type == 'restore_fuel':
+        name, arguments = 'S20', '1,0'
+    elif command.type == 'set_interval':
+        name, arguments = 'D1', str(command.arguments['interval'])
+    else:
+        raise UnsupportedCommandError(f'H02 devices do not support {command.type} command.')
+
+    return f'*HQ,{imei},{name},{now},{arguments}#'.encode(), name
+
+
+def parse_h02_reply(record: bytes) -> Tuple[str, str] | None:
+    """Return name of the replied command and text of the reply if record is a `V4` reply, `None` otherwise."""
+    # Replies are always ASCII, bytes of a binary record may contain the marker by chance.
+    if record[:1] != b'*':
+        return None
+
+    if record.find(REPLY_MARKER, 0, REPLY_MARKER_END) == -1:
+        return None
+
+    reply = record.decode('ascii', errors='replace')
+    fields = reply.split(',', 4)
+
+    if len(fields) < 4:
+        return None
+
+    return fields[3].rstrip('#'), reply
@@ -0,0 +1,98 @@
+from typing import List
+
+ASCII_RECORD_START = ord('*')
+ASCII_RECORD_END = ord('#')
+BINARY_RECORD_START = ord('$')
+BINARY_RECORD_LENGTH = 45
+
+# Bytes some devices append after `#`, they carry no data and are dropped silently.
+RECORD_SEPARATORS = b'\r\n'
+
+
+class H02RecordFramer:
+    """Incrementally split a H02 TCP byte stream into complete records.
+
+    TCP does not preserve message boundaries, a single read can contain several records,
+    a part of one, or both. Framer keeps leftover bytes between reads and returns every
+    record that is complete so far:
+    ASCII mode records start with `*` and end with `#`,
+    binary/standard mode records start with `$` and always have fixed length of 45 bytes.
+
+    Bytes that do not belong to any record are returned as a separate chunk (up to the next
+    record start) so that the decoder rejects them and the caller can account for the error
+    the same way it does for malformed records.
+
+    Attributes:
+        buffer:
+            Bytes received from the stream that do not form a complete record yet.
+        max_ascii_record_length:
+            Maximum length of an unterminated ASCII mode record, anything longer is returned as
+            garbage instead of waiting for `#` that is most likely never coming.
+    """
+
+    def __init__(self, max_ascii_record_length: int = 512) -> None:
+        self.buffer = bytearray()
+        self.max_ascii_record_length = max_ascii_record_length
+
+    def feed(self, data: bytes) -> List[bytes]:
+        """Add bytes read from the stream and return all records completed by them.
+
+        Args:
+            data:
+                Raw bytes read from the stream.
+
+        Returns:
+            Complete records (and garbage chunks) in the order they were received.
+        """
+        buffer = self.buffer
+        buffer += data
+
+        records: List[bytes] = []
+        position = 0
+        length = len(buffer)
+
+        while position < length:
+            first_byte = buffer[position]
+
+            if first_byte == BINARY_RECORD_START:
+                end = position + BINARY_RECORD_LENGTH
+
+                if end > length:
+                    break
+            elif first_byte == ASCII_RECORD_START:
+                terminator = buffer.find(ASCII_RECORD_END, position + 1)
+                next_start = buffer.find(ASCII_RECORD_START, position + 1)
+
+                if next_start != -1 and (terminator == -1 or next_start < terminator):
+                    # Record got cut short and a new one begins, do not glue them together.
+                    end = next_start
+                elif terminator != -1:
+                    end = terminator + 1
+                elif length - position > self.max_ascii_record_length:
+                    end = length
+                else:
+                    break
+            elif first_byte in RECORD_SEPARATORS:
+                position += 1
+                continue
+            else:
+                end = self._find_record_start(position + 1)
+
+            records.append(bytes(buffer[position:end]))
+            position = end
+
+        del buffer[:position]
+
+        return records
+
+    def _find_record_start(self, start: int) -> int:
+        """Return index of the first record start byte at or after `start`, or length of the buffer if there is none."""
+        ascii_start = self.buffer.find(ASCII_RECORD_START, start)
+        binary_start = self.buffer.find(BINARY_RECORD_START, start)
+
+        if ascii_start == -1:
+            return binary_start if binary_start != -1 else len(self.buffer)
+        if binary_start == -1:
+            return ascii_start
+
+        return min(ascii_start, binary_start)
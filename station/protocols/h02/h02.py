@@ -1,67 +1,139 @@
+import asyncio
+import time
+from typing import TYPE_CHECKING, List, Tuple
+
 from logger import logger
+from metrics import PACKETS_DECODED, DECODE_ERRORS, READ_TO_DECODE_SECONDS, DECODE_SECONDS, ACK_WRITE_SECONDS
 from protocols import BaseProtocol
 from protocols.exceptions import RegExMatchError, BadProtocolError
+from protocols.h02.payloads import H02Location
+from protocols.signature import ProtocolSignature
 
+from .commands import encode_h02_command, parse_h02_reply
+from .framer import H02RecordFramer, BINARY_RECORD_LENGTH
 from .packet_decoder import H02PacketDecoder
 
+# `downlink` depends on `connections` which depends on this package, importing it at runtime would be circular.
+if TYPE_CHECKING:
+    from downlink import DownlinkCommand
+
+# Metric values are looked up once, `labels(..)` is too slow to call for every packet.
+packets_decoded = PACKETS_DECODED.labels('H02Protocol')
+read_to_decode_seconds = READ_TO_DECODE_SECONDS.labels('H02Protocol')
+decode_seconds = DECODE_SECONDS.labels('H02Protocol')
+ack_write_seconds = ACK_WRITE_SECONDS.labels('H02Protocol')
+
 class H02Protocol(BaseProtocol):
     """Implementation of H02 protocol, used by SinoTrack ST-901 trackers."""
 
     packet_decoder: H02PacketDecoder = H02PacketDecoder()
+    signatures = (
+        ProtocolSignature(b'*HQ,'),
+        ProtocolSignature(b'$', min_length=BINARY_RECORD_LENGTH),
+    )
+    read_size: int = 4096
+
+    def encode_command(self, command: 'DownlinkCommand') -> Tuple[bytes, str]:
+        """Encode a command for the connected device, `device_imei` must be set (it is once the handshake records are decoded)."""
+        return encode_h02_command(self.device_imei, command)
+
+    async def deliver(self, payloads: List[H02Location]) -> None:
+        """Acknowledge records decoded from a single read to the device and send them uplink.
 
-    @classmethod
-    def bytes_is_self(cls, raw_bytes: bytes) -> bool:
-        try:
-            cls.packet_decoder.decode(raw_bytes)
-        except (RegExMatchError, BadProtocolError, UnicodeDecodeError) as e:
-            logger.warning(f'Could not decode initial bytes sent by a connected device(?). {e.__class__.__name__}: {e}')
-            return False
+        Acknowledgements of all records are written at once, before payloads are handed over to the uplink,
+        so device-facing latency does not include waiting for the uplink queue. With `ack_after_persist`
+        only records the uplink stored are acknowledged, device sends the rest again.
+
+        Args:
+            payloads:
+                Payloads decoded from the read, in the order device sent them.
+        """
+        if self.ack_after_persist:
+            persisted = await asyncio.gather(*(self.persist_uplink(payload) for payload in payloads))
+            acknowledged = [payload for payload, stored in zip(payloads, persisted) if stored]
         else:
-            return True
+            acknowledged = payloads
+
+        if acknowledged:
+            # Purpose of this is not documented anywhere but sinotrackpro.com platform itself
+            # replies with such command if you connect to it ('45.112.204.245', 8090) with TCP socket.
+            ack_started_at = time.perf_counter()
+            await self.write_to_device(b''.join(f'*HQ,{payload.device_serial_number},R12,{payload.time}#'.encode() for payload in acknowledged))
+            ack_write_seconds.observe(time.perf_counter() - ack_started_at)
+
+        for payload in payloads:
+            if not self.ack_after_persist:
+                await self.send_uplink(payload)
+
+            self.total_sent += 1
+            # Logged for every packet, so it is sampled per device and only formatted by the listener thread.
+            logger.info('Processed and queued data sent by IMEI:%s for backend. Total sent: %s', payload.device_serial_number, self.total_sent, extra={'imei': payload.device_serial_number})
 
     async def loop(self):
         client_address, client_port = self.stream_writer.get_extra_info('peername')
+        framer = H02RecordFramer()
+        # Bytes used to identify the protocol are the device's first records, they must not be dropped.
+        data = self.handshake
+        read_at = time.perf_counter()
 
         while True:
-            # FIXME: TCP is a stream-based protocol, instead of expecting "packets" we should
-            # read the first byte, identify which mode device is sending the record with:
-            # if first byte is '*' => ASCII mode, if first byte is '$' => binary mode - also called standard mode.
-            #
-            # After identifying record mode, we should read and add subsequent bytes to a buffer.
-            # We can know that record is complete in different ways for each mode.
-            # We can know that ASCII mode record is complete when '#' byte is sent. (All ASCII mode records end with #).
-            # Binary/standard mode records always have fixed length of 45 bytes including '$'.
-            initial_data = await self.stream_reader.read(128)
-
-            if initial_data == b'':
-                logger.info(f'Client closed connection. ({client_address}:{client_port} - {self.__class__.__name__}).')
+            if data == b'':
+                logger.info('Client closed connection. (%s:%s - %s).', client_address, client_port, self.__class__.__name__)
                 await self.terminate_connection()
                 break
                 #  TODO: exception should be raised so writer can be deleted by the station
 
-            try:
-                payload = self.packet_decoder.decode(initial_data)
-            except (RegExMatchError, BadProtocolError, UnicodeDecodeError) as e:
-                logger.warning(f'Could not decode bytes sent by a connected device(?). {e.__class__.__name__}: {e}')
-                self.exception_counter += 1
-            # Unexpected exceptions should also increment `exception_counter` but, unlike expected ones, they should also bubble up
-            except Exception:
-                self.exception_counter += 1
-                raise
-            else:
-                await self.send_uplink(payload)
+            payloads = []
+
+            for record in framer.feed(data):
+                # Replies to commands are not location packets, they only confirm a command sent by the station.
+                reply = parse_h02_reply(record)
+
+                if reply is not None:
+                    self.command_replied(*reply)
+                    continue
+
+                decode_started_at = time.perf_counter()
+
+                try:
+                    payload = self.packet_decoder.decode(record)
+                except (RegExMatchError, BadProtocolError, UnicodeDecodeError) as e:
+                    DECODE_ERRORS.labels(self.__class__.__name__, e.__class__.__name__).inc()
+                    logger.warning('Could not decode bytes sent by a connected device(?). %s: %s', e.__class__.__name__, e)
+                    self.exception_counter += 1
+                # Unexpected exceptions should also increment `exception_counter` but, unlike expected ones, they should also bubble up
+                except Exception:
+                    self.exception_counter += 1
+                    raise
+                else:
+                    decoded_at = time.perf_counter()
+                    decode_seconds.observe(decoded_at - decode_started_at)
+                    read_to_decode_seconds.observe(decoded_at - read_at)
+                    packets_decoded.inc()
 
-                # Purpose of this is not documented anywhere but sinotrackpro.com platform itself
-                # replies with such command if you connect to it ('45.112.204.245', 8090) with TCP socket.
-                self.stream_writer.write(f'*HQ,{self.device_imei},R12,{payload.time}#'.encode())
-                await self.stream_writer.drain()
+                    if payload.device_serial_number != self.device_imei:
+                        self.identify_device(payload.device_serial_number)
 
-                self.total_sent += 1
-                self.device_imei = payload.device_serial_number
-                logger.info(f'Processed and sent data sent by IMEI:{payload.device_serial_number} to backend. Total sent: {self.total_sent}')
+                    payloads.append(payload)
+
+                if self.exception_counter >= self.exception_threshold:
+                    break
+
+            if payloads:
+                await self.deliver(payloads)
 
             if self.exception_counter >= self.exception_threshold:
-                logger.warning(f'Closing connection with client because exception threshold of {self.exception_threshold} was reached. ({client_address}:{client_port} - {self.__class__.__name__})')
+                logger.warning('Closing connection with client because exception threshold of %s was reached. (%s:%s - %s)', self.exception_threshold, client_address, client_port, self.__class__.__name__)
                 await self.terminate_connection()
                 break
 
+            if self.backpressure is not None:
+                await self.backpressure.wait()
+
+            # A single read may contain several records or only a part of one, `framer` takes
+            # care of putting them together so that a burst of buffered records is drained at once.
+            data = await self.stream_reader.read(self.read_size)
+            read_at = time.perf_counter()
+
+            if self.connection is not None:
+                self.connection.received(data)
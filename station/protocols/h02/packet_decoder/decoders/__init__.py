@@ -1,5 +1,5 @@
 from .ascii_decoder import decode_h02_ascii_packet
 from .binary_decoder import decode_h02_binary_packet
+from .bulk_decoder import H02RecordBatch, decode_h02_binary_records
 
-__all__ = ('decode_h02_ascii_packet', 'decode_h02_binary_packet', )
-
+__all__ = ('decode_h02_ascii_packet', 'decode_h02_binary_packet', 'H02RecordBatch', 'decode_h02_binary_records', )
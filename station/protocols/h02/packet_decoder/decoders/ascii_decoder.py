@@ -1,15 +1,140 @@
 import re
-from typing import Literal
+from typing import Dict, Literal, Tuple
 
 from protocols.exceptions import RegExMatchError
 
 from protocols.h02.payloads import H02Location
 
-REGEX_PATTERN = re.compile(r'^\*HQ,(\d{10}),(V\d),(\d{6}),(A|V),(-?\d{4}.\d{4}),(N|S),(-?\d{4,5}.\d{4}),(E|W),(\d{1,3}.\d{2}),(\d{1,3}),(\d{6}),([0-9A-Fa-f]{8}),(\d+),(\d+),(\d+),(\d+)(,\d+)?#$')
+from .interning import BoundedTable, IMEIS, CELLS
+
+REGEX_PATTERN = re.compile(r'^\*HQ,(\d{10}),(V\d),(\d{6}),(A|V),(-?\d{4}\.\d{4}),(N|S),(-?\d{4,5}\.\d{4}),(E|W),(\d{1,3}\.\d{2}),(\d{1,3}),(\d{6}),([0-9A-Fa-f]{8}),(\d+),(\d+),(\d+),(\d+)(,\d+)?#$')
+LATITUDE_PATTERN = re.compile(r'^(-?\d{2})(\d{2}\.\d{4})$')
+LONGITUDE_PATTERN = re.compile(r'^(-?(\d{3}|0?\d{2}))(\d{2}\.\d{4})$')
+
+# Masks of `vehicle_status` bits as a single 32-bit integer, see `decode_bitmask` for the byte/bit order they come from.
+ACCESSORIES_OFF_MASK = 0b1 << 8 * (4 - 3) + 3 - 1
+CUT_FUEL_MASK = 0b1 << 8 * (4 - 1) + 4 - 1
+SHOCK_ALARM_MASK = 0b1 << 8 * (4 - 2) + 2 - 1
+BATTERY_CUT_OFF_MASK = 0b1 << 8 * (4 - 2) + 4 - 1
+
+HEX_DIGITS = '0123456789ABCDEFabcdef'
+
+def decode_status_flags(vehicle_status: int) -> Tuple[bool, bool, bool, bool]:
+    """Return `(accessories_off, cut_fuel, shock_alarm, battery_cut_off)` of `vehicle_status`, bits use negative logic."""
+    return (
+        not vehicle_status & ACCESSORIES_OFF_MASK,
+        not vehicle_status & CUT_FUEL_MASK,
+        not vehicle_status & SHOCK_ALARM_MASK,
+        not vehicle_status & BATTERY_CUT_OFF_MASK,
+    )
+
+# Devices send a handful of distinct status words, their flags are decoded once per word (8 hex digits).
+STATUS_FLAGS_BY_HEX: Dict[str, Tuple[bool, bool, bool, bool]] = BoundedTable(lambda vehicle_status: decode_status_flags(int(vehicle_status, 16)), 65_536)
 
 def decode_h02_ascii_packet(data_packet: bytes) -> H02Location:
     """Decode ASCII location data packet sent by a device that uses H02 protocol.
 
+    Packet is split on commas once and its fields are validated and converted without regular expressions.
+    Packets that are not in the canonical format (non-ASCII bytes, unexpected separators, signed coordinates,
+    wrong field count, etc.) are handed over to `decode_h02_ascii_packet_regex`, which makes both decoders accept
+    and reject exactly same inputs while well-formed packets, that make up almost all of the traffic, take the fast path.
+
+    Args:
+        data_packet:
+            Raw bytes sent by a device
+
+    Returns:
+        H02Location data class that contains all necessary fields for the data packet to be saved in the backend.
+
+    Raises:
+        RegExMatchError: If packet does not match `REGEX_PATTERN`.
+        UnicodeDecodeError: If `raw_bytes` could not be decoded by UTF-8 codec.
+    """
+    # `\d` of `REGEX_PATTERN` also matches non-ASCII digits, leave such packets (and invalid UTF-8) to the regex decoder.
+    if not data_packet.isascii():
+        return decode_h02_ascii_packet_regex(data_packet)
+
+    raw_data = data_packet.decode('ascii')
+
+    # `$` of `REGEX_PATTERN` matches before a trailing newline too.
+    if raw_data.endswith('#'):
+        fields = raw_data[:-1].split(',')
+    elif raw_data.endswith('#\n'):
+        fields = raw_data[:-2].split(',')
+    else:
+        return decode_h02_ascii_packet_regex(data_packet)
+
+    field_count = len(fields)
+
+    if field_count != 17 and field_count != 18:
+        return decode_h02_ascii_packet_regex(data_packet)
+
+    (
+        maker, device_serial_number, version, time, validity, latitude, north_south, longitude, east_west,
+        speed, direction, date, vehicle_status, mobile_country_code, mobile_network_code, local_area_code, cell_id,
+    ) = fields[:17]
+
+    # Dots are checked by position, removing the first one must leave nothing but digits.
+    latitude_digits = latitude.replace('.', '', 1)
+    longitude_digits = longitude.replace('.', '', 1)
+    speed_digits = speed.replace('.', '', 1)
+
+    if not (
+        maker == '*HQ'
+        and len(device_serial_number) == 10
+        and len(version) == 2 and version[0] == 'V'
+        and len(time) == 6
+        and (validity == 'A' or validity == 'V')
+        and len(latitude) == 9 and latitude[4] == '.'
+        and (north_south == 'N' or north_south == 'S')
+        and 9 <= len(longitude) <= 10 and longitude[-5] == '.'
+        and (east_west == 'E' or east_west == 'W')
+        and 4 <= len(speed) <= 6 and speed[-3] == '.'
+        and 1 <= len(direction) <= 3
+        and len(date) == 6
+        and len(vehicle_status) == 8 and not vehicle_status.strip(HEX_DIGITS)
+        and mobile_country_code and mobile_network_code and local_area_code and cell_id
+        and (field_count == 17 or fields[17])
+        and ''.join((
+            device_serial_number, version[1], time, latitude_digits, longitude_digits, speed_digits, direction, date,
+            mobile_country_code, mobile_network_code, local_area_code, cell_id, fields[17] if field_count == 18 else '0',
+        )).isdigit()
+    ):
+        return decode_h02_ascii_packet_regex(data_packet)
+
+    # Minutes are integers scaled by 10 000, integer division is correctly rounded exactly like `float()` of
+    # the minutes string in `decode_latitude`/`decode_longitude`, and `round` is equivalent to their `format` + `float`.
+    latitude_degrees, latitude_minutes = divmod(int(latitude_digits), 1_000_000)
+    longitude_degrees, longitude_minutes = divmod(int(longitude_digits), 1_000_000)
+    # Values that repeat from packet to packet come from tables, only coordinates and speed are computed.
+    accessories_off, cut_fuel, shock_alarm, battery_cut_off = STATUS_FLAGS_BY_HEX[vehicle_status]
+    mobile_country_code, mobile_network_code, local_area_code, cell_id = CELLS[mobile_country_code, mobile_network_code, local_area_code, cell_id]
+
+    return H02Location(
+        round(latitude_degrees + latitude_minutes / 10_000 / 60, 6),
+        round(longitude_degrees + longitude_minutes / 10_000 / 60, 6),
+        raw_data,
+        'HQ',
+        IMEIS[device_serial_number],
+        time,
+        validity == 'A',
+        round(int(speed_digits) / 100 * 1.852, 2),
+        accessories_off,
+        direction,
+        mobile_country_code,
+        mobile_network_code,
+        local_area_code,
+        cell_id,
+        cut_fuel,
+        shock_alarm,
+        battery_cut_off,
+    )
+
+def decode_h02_ascii_packet_regex(data_packet: bytes) -> H02Location:
+    """Decode ASCII location data packet sent by a device that uses H02 protocol using regular expressions.
+
+    Reference implementation of `decode_h02_ascii_packet`, also used by it for packets that are not in the canonical format.
+
     Args:
         data_packet:
             Raw bytes sent by a device
@@ -67,8 +192,7 @@ def decode_latitude(latitude: str) -> float:
     Raises:
         RegExMatchError: If regex pattern does not match `latitude` parameter. 
     """
-    h02_latitude_pattern = re.compile(r'^(-?\d{2})(\d{2}.\d{4})$')
-    match = h02_latitude_pattern.match(latitude)
+    match = LATITUDE_PATTERN.match(latitude)
 
     if match is None:
         raise RegExMatchError(f'Could not decode H02 protocol\'s latitude parameter: "{latitude}"') 
@@ -96,8 +220,7 @@ def decode_longitude(longitude: str) -> float:
     Raises:
         RegExMatchError: If regex pattern does not match `longitude` parameter. 
     """
-    h02_longitude_pattern = re.compile(r'^(-?(\d{3}|0?\d{2}))(\d{2}.\d{4})$')
-    match = h02_longitude_pattern.match(longitude)
+    match = LONGITUDE_PATTERN.match(longitude)
 
     if match is None:
         raise RegExMatchError(f'Could not decode H02 protocol\'s longitude parameter: "{longitude}".') 
@@ -1,13 +1,28 @@
-from typing import List
-
+from protocols.exceptions import BadProtocolError
 from protocols.h02.payloads.location_payload import H02Location
 
-from .ascii_decoder import decode_bitmask, decode_latitude, decode_longitude, decode_speed
+from typing import Dict, Tuple
+
+from .ascii_decoder import decode_status_flags
+from .interning import BoundedTable, BINARY_IMEIS
+
+BINARY_PACKET_LENGTH = 45
+
+# Flags of `vehicle_status` by its integer value, see `STATUS_FLAGS_BY_HEX` of ASCII decoder.
+STATUS_FLAGS: Dict[int, Tuple[bool, bool, bool, bool]] = BoundedTable(decode_status_flags, 65_536)
+
+# Value of a byte that holds two BCD digits, `-1` if either of its nibbles is not a decimal digit.
+BCD_TABLE = tuple(
+    (byte >> 4) * 10 + (byte & 0xF) if byte >> 4 <= 9 and byte & 0xF <= 9 else -1
+    for byte in range(256)
+)
 
 def decode_h02_binary_packet(raw_bytes: bytes) -> H02Location:
     """Decode binary location data packet sent by a device that uses H02 protocol.
 
     Decode binary data packet, also referred to as "starard mode" packet in the H02 protocol documentation.
+    Coordinates and speed are BCD encoded, their digits are read straight from the packet with `BCD_TABLE`
+    instead of going through hex strings. Raw bytes are kept as they are, `BaseLocationPayload.to_dict` renders them.
 
     Args:
         raw_bytes:
@@ -17,55 +32,55 @@ def decode_h02_binary_packet(raw_bytes: bytes) -> H02Location:
         H02Location data class that contains all necessary fields for the data packet to be saved in the backend.
 
     Raises:
-        RegExMatchError: If one of the `decode_{param}` functions does not receive its argument in expected format.
+        BadProtocolError: If packet is shorter than `BINARY_PACKET_LENGTH` or its coordinates or speed are not valid BCD.
     """
-    bytes_list = list(raw_bytes)
-
-    vehicle_status = bytes_to_hex(bytes_list[0x19:0x1D])
-
-    latitude = bytes_to_hex(bytes_list[0x0C:0x10])
-    latitude = decode_latitude(f'{latitude[0:4]}.{latitude[4:]}')
-    longitude = bytes_to_hex(bytes_list[0x11:0x16])
-    valid = (int(longitude[-1], 16) & 0b1 << 1) != 0  # check H02 docs for clarification (15th byte in standard mode)
-    longitude = decode_longitude(f'{longitude[0:5]}.{longitude[5:-1]}')
-    raw_data = ','.join([str(i) for i in bytes_list])
-    maker = 'HQ'
-    device_serial_number = bytes_to_hex(bytes_list[0x01:0x06])
-    time = bytes_to_hex(bytes_list[0x06:0x09])
-    speed = decode_speed(bytes_to_hex(bytes_list[0x16:0x19])[0:3])
-    accessories_off = decode_bitmask(vehicle_status, 3, 3)
-    direction = '100'  # NOTE: not using this anyways, probably should be removed from database
-    mobile_country_code = '000' # NOTE: standard mode does not specify this value
-    mobile_network_code = '00' # NOTE: standard mode does not specify this value
-    local_area_code = '000' # NOTE: standard mode does not specify this value
-    cell_id = '0000' # NOTE: standard mode does not specify this value
-    cut_fuel = decode_bitmask(vehicle_status, 1, 4)
-    shock_alarm = decode_bitmask(vehicle_status, 2, 2)
-    battery_cut_off = decode_bitmask(vehicle_status, 2, 4)
-
-    return H02Location(latitude, longitude, raw_data, maker, device_serial_number, time, valid, speed, accessories_off, direction, mobile_country_code, mobile_network_code, local_area_code, cell_id, cut_fuel, shock_alarm, battery_cut_off)
-
-def bytes_to_hex(byte_nums: List[int]) -> str:
-    """Convert list of integers (each representing a byte) to their hex representation and stick them together.
-
-    Args:
-        byte_nums:
-            List of integers, each integer represents a byte.
-
-    Returns:
-        Hexadecimal value of each byte combined into a single string.
-        Single-digit values are padded with 0. e.g. `9` => `09`.
-    """
-    result = ''
-    
-    for byte in byte_nums:
-        hex_value = hex(byte).split('0x')[1]
-
-        if len(hex_value) == 1:
-            # single-digit values must be padded for correct interpretation of H02 protocol standard mode
-            result += f'0{hex_value}'
-        else:
-            result += hex_value
-
-    return result
-
+    if len(raw_bytes) < BINARY_PACKET_LENGTH:
+        raise BadProtocolError(f'Expected H02 binary packet to be {BINARY_PACKET_LENGTH} bytes long, instead got {len(raw_bytes)} bytes: {list(raw_bytes)}')
+
+    # Latitude is `DDMM.MMMM` in bytes 0x0C-0x0F.
+    latitude_degrees = BCD_TABLE[raw_bytes[0x0C]]
+    latitude_minutes = (BCD_TABLE[raw_bytes[0x0D]], BCD_TABLE[raw_bytes[0x0E]], BCD_TABLE[raw_bytes[0x0F]])
+
+    # Longitude is `DDDMM.MMMM` followed by a nibble of flags in bytes 0x11-0x15.
+    longitude_high = BCD_TABLE[raw_bytes[0x11]]
+    longitude_middle = BCD_TABLE[raw_bytes[0x12]]
+    longitude_minutes = (BCD_TABLE[raw_bytes[0x13]], BCD_TABLE[raw_bytes[0x14]])
+    longitude_last_digit = raw_bytes[0x15] >> 4
+
+    # Speed is the first three digits of bytes 0x16-0x18, the rest is direction.
+    speed_high = BCD_TABLE[raw_bytes[0x16]]
+    speed_last_digit = raw_bytes[0x17] >> 4
+
+    if (
+        min(latitude_degrees, *latitude_minutes, longitude_high, longitude_middle, *longitude_minutes, speed_high) < 0
+        or longitude_last_digit > 9
+        or speed_last_digit > 9
+    ):
+        raise BadProtocolError(f'Could not decode BCD encoded coordinates or speed of H02 binary packet: {raw_bytes[0x0C:0x19].hex()}')
+
+    # Minutes are integers scaled by 10 000, see `decode_h02_ascii_packet` for why this matches `decode_latitude`/`decode_longitude`.
+    latitude_minutes_scaled = latitude_minutes[0] * 10_000 + latitude_minutes[1] * 100 + latitude_minutes[2]
+    longitude_degrees = longitude_high * 10 + longitude_middle // 10
+    longitude_minutes_scaled = (longitude_middle % 10) * 100_000 + longitude_minutes[0] * 1_000 + longitude_minutes[1] * 10 + longitude_last_digit
+
+    accessories_off, cut_fuel, shock_alarm, battery_cut_off = STATUS_FLAGS[int.from_bytes(raw_bytes[0x19:0x1D], 'big')]
+
+    return H02Location(
+        round(latitude_degrees + latitude_minutes_scaled / 10_000 / 60, 6),
+        round(longitude_degrees + longitude_minutes_scaled / 10_000 / 60, 6),
+        raw_bytes,
+        'HQ',
+        BINARY_IMEIS[raw_bytes[0x01:0x06]],
+        raw_bytes[0x06:0x09].hex(),
+        raw_bytes[0x15] & 0b10 != 0,  # check H02 docs for clarification (15th byte in standard mode)
+        round((speed_high * 10 + speed_last_digit) * 1.852, 2),
+        accessories_off,
+        '100',  # NOTE: not using this anyways, probably should be removed from database
+        '000',  # NOTE: standard mode does not specify this value
+        '00',  # NOTE: standard mode does not specify this value
+        '000',  # NOTE: standard mode does not specify this value
+        '0000',  # NOTE: standard mode does not specify this value
+        cut_fuel,
+        shock_alarm,
+        battery_cut_off,
+    )
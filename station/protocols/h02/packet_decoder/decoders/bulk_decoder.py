@@ -0,0 +1,165 @@
+from dataclasses import dataclass
+from typing import Any, Iterator
+
+try:
+    import numpy
+except ImportError:  # NumPy is optional, only bulk decoding needs it.
+    numpy = None
+
+from protocols.exceptions import BadProtocolError
+from protocols.h02.payloads import H02Location
+
+from .ascii_decoder import ACCESSORIES_OFF_MASK, CUT_FUEL_MASK, SHOCK_ALARM_MASK, BATTERY_CUT_OFF_MASK
+from .binary_decoder import BINARY_PACKET_LENGTH, BCD_TABLE
+
+# `round(speed * 1.852, 2)` for every 3 digit speed, exactly what `decode_h02_binary_packet` returns.
+SPEED_TABLE = tuple(round(speed * 1.852, 2) for speed in range(1000))
+
+HEX_DIGITS = b'0123456789abcdef'
+
+# Layout of a binary (standard mode) record, multi-byte BCD fields stay arrays of bytes, status word is a big-endian integer.
+RECORD_FIELDS = [
+    ('start', 'u1'),
+    ('device_serial_number', 'u1', (5, )),
+    ('time', 'u1', (3, )),
+    ('date', 'u1', (3, )),
+    ('latitude', 'u1', (4, )),
+    ('battery', 'u1'),
+    ('longitude', 'u1', (5, )),  # last nibble holds flags
+    ('speed_direction', 'u1', (3, )),
+    ('vehicle_status', '>u4'),
+    ('unused', 'u1', (BINARY_PACKET_LENGTH - 29, )),
+]
+RECORD_DTYPE = numpy.dtype(RECORD_FIELDS) if numpy is not None else None
+
+
+@dataclass
+class H02RecordBatch:
+    """Columnar representation of decoded H02 binary (standard mode) records.
+
+    Every attribute except `raw_data` is a one-dimensional NumPy array with one item per record.
+    Columns of malformed records hold meaningless values, use `malformed` to filter them out.
+    Iterating over the batch yields `H02Location` of every well-formed record.
+    """
+
+    latitude: Any
+    longitude: Any
+    speed: Any
+    time: Any
+    device_serial_number: Any
+    valid: Any
+    accessories_off: Any
+    cut_fuel: Any
+    shock_alarm: Any
+    battery_cut_off: Any
+    malformed: Any
+    raw_data: Any  # two-dimensional array of record bytes, one row per record
+
+    def __len__(self) -> int:
+        return len(self.malformed)
+
+    def __iter__(self) -> Iterator[H02Location]:
+        columns = zip(
+            self.latitude.tolist(),
+            self.longitude.tolist(),
+            self.speed.tolist(),
+            self.time.tolist(),
+            self.device_serial_number.tolist(),
+            self.valid.tolist(),
+            self.accessories_off.tolist(),
+            self.cut_fuel.tolist(),
+            self.shock_alarm.tolist(),
+            self.battery_cut_off.tolist(),
+            self.malformed.tolist(),
+            self.raw_data,
+        )
+
+        for latitude, longitude, speed, time, device_serial_number, valid, accessories_off, cut_fuel, shock_alarm, battery_cut_off, malformed, raw_data in columns:
+            if malformed:
+                continue
+
+            yield H02Location(
+                latitude, longitude, raw_data.tobytes(), 'HQ', device_serial_number, time, valid, speed, accessories_off,
+                '100', '000', '00', '000', '0000', cut_fuel, shock_alarm, battery_cut_off,
+            )
+
+
+def decode_h02_binary_records(buffer: bytes) -> H02RecordBatch:
+    """Decode a contiguous buffer of H02 binary (standard mode) records at once.
+
+    Buffer is viewed as a NumPy structured array of `RECORD_DTYPE` without copying it, so every part of the records
+    is a column of its own, BCD digits and status bits of all records are decoded with vectorized operations. Values are the same as those of
+    `decode_h02_binary_packet` for every well-formed record.
+
+    Args:
+        buffer:
+            Records back to back, e.g. contents of a device log.
+
+    Returns:
+        Decoded columns of all records.
+
+    Raises:
+        ImportError: If NumPy is not installed.
+        BadProtocolError: If size of `buffer` is not a multiple of `BINARY_PACKET_LENGTH`.
+    """
+    if numpy is None:
+        raise ImportError('Bulk decoding of H02 records requires NumPy, install it with "pip install numpy".')
+
+    if len(buffer) % BINARY_PACKET_LENGTH != 0:
+        raise BadProtocolError(f'Expected buffer of H02 binary records to be a multiple of {BINARY_PACKET_LENGTH} bytes, instead got {len(buffer)} bytes.')
+
+    # Structured view names the fields of every record without copying the buffer, `raw_data` views the same bytes row by row.
+    records = numpy.frombuffer(buffer, dtype=RECORD_DTYPE)
+    raw_data = numpy.frombuffer(buffer, dtype=numpy.uint8).reshape(-1, BINARY_PACKET_LENGTH)
+    bcd_table = numpy.array(BCD_TABLE, dtype=numpy.int64)
+
+    latitude_bcd = bcd_table[records['latitude']]
+    longitude_bcd = bcd_table[records['longitude'][:, :4]]
+    speed_bcd = bcd_table[records['speed_direction'][:, 0]]
+    longitude_last_digit = records['longitude'][:, 4] >> 4
+    speed_last_digit = records['speed_direction'][:, 1] >> 4
+
+    malformed = (
+        (records['start'] != ord('$'))
+        | (latitude_bcd < 0).any(axis=1)
+        | (longitude_bcd < 0).any(axis=1)
+        | (speed_bcd < 0)
+        | (longitude_last_digit > 9)
+        | (speed_last_digit > 9)
+    )
+
+    # Coordinate is `degrees + minutes / 60` where minutes are scaled by 10 000, i.e. `scaled / 600 000`.
+    # Multiplied by 10^6 that is `scaled * 5 / 3`, which is never half way between two integers, so rounding it
+    # to the nearest integer in integer arithmetic gives exactly what `round(coordinate, 6)` gives.
+    latitude_scaled = latitude_bcd[:, 0] * 600_000 + latitude_bcd[:, 1] * 10_000 + latitude_bcd[:, 2] * 100 + latitude_bcd[:, 3]
+    longitude_scaled = (
+        (longitude_bcd[:, 0] * 10 + longitude_bcd[:, 1] // 10) * 600_000
+        + (longitude_bcd[:, 1] % 10) * 100_000 + longitude_bcd[:, 2] * 1_000 + longitude_bcd[:, 3] * 10 + longitude_last_digit
+    )
+    speed_digits = numpy.clip(speed_bcd * 10 + speed_last_digit, 0, 999)
+    vehicle_status = records['vehicle_status']
+
+    return H02RecordBatch(
+        latitude=((latitude_scaled * 10 + 3) // 6) / 1e6,
+        longitude=((longitude_scaled * 10 + 3) // 6) / 1e6,
+        speed=numpy.array(SPEED_TABLE)[speed_digits],
+        time=bytes_to_hex_column(records['time']),
+        device_serial_number=bytes_to_hex_column(records['device_serial_number']),
+        valid=(records['longitude'][:, 4] & 0b10) != 0,
+        accessories_off=(vehicle_status & ACCESSORIES_OFF_MASK) == 0,
+        cut_fuel=(vehicle_status & CUT_FUEL_MASK) == 0,
+        shock_alarm=(vehicle_status & SHOCK_ALARM_MASK) == 0,
+        battery_cut_off=(vehicle_status & BATTERY_CUT_OFF_MASK) == 0,
+        malformed=malformed,
+        raw_data=raw_data,
+    )
+
+
+def bytes_to_hex_column(columns: Any) -> Any:
+    """Return lowercase hex string of every row of a two-dimensional `uint8` array, same as `bytes.hex()` of each row."""
+    hex_digits = numpy.frombuffer(HEX_DIGITS, dtype=numpy.uint8)
+    characters = numpy.empty((columns.shape[0], columns.shape[1] * 2), dtype=numpy.uint8)
+    characters[:, 0::2] = hex_digits[columns >> 4]
+    characters[:, 1::2] = hex_digits[columns & 0xF]
+
+    return characters.view(f'S{characters.shape[1]}').ravel().astype(f'U{characters.shape[1]}')
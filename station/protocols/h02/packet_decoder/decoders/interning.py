@@ -0,0 +1,40 @@
+from typing import Any, Callable, Dict, Tuple
+
+
+class BoundedTable(dict):
+    """Dict that computes (and remembers) values of missing keys, emptied once it holds `max_size` of them.
+
+    Meant for values that repeat across packets: a hit is a single dict lookup done in C, a miss calls `factory`.
+    Emptying the whole table keeps memory bounded without bookkeeping on every hit, the working set refills it quickly.
+
+    Attributes:
+        factory:
+            Function that computes value of a missing key.
+        max_size:
+            Maximum amount of keys.
+    """
+
+    def __init__(self, factory: Callable[[Any], Any], max_size: int) -> None:
+        super().__init__()
+        self.factory = factory
+        self.max_size = max_size
+
+    def __missing__(self, key: Any) -> Any:
+        if len(self) >= self.max_size:
+            self.clear()
+
+        value = self[key] = self.factory(key)
+        return value
+
+
+def same(value: Any) -> Any:
+    return value
+
+
+# Every device sends the same IMEI and a few cells over and over again. Decoders take them from these tables,
+# so payloads in flight share a single instance of each value instead of holding their own copies.
+IMEIS: Dict[str, str] = BoundedTable(same, 200_000)
+# IMEI of binary packets by its BCD encoded bytes.
+BINARY_IMEIS: Dict[bytes, str] = BoundedTable(bytes.hex, 200_000)
+# `(mobile_country_code, mobile_network_code, local_area_code, cell_id)` tuples.
+CELLS: Dict[Tuple[str, str, str, str], Tuple[str, str, str, str]] = BoundedTable(same, 200_000)
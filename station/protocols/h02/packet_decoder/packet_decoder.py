@@ -3,7 +3,7 @@ from protocols.exceptions import RegExMatchError, BadProtocolError
 
 from protocols.h02.payloads import H02Location
 
-from .decoders import decode_h02_ascii_packet, decode_h02_binary_packet
+from .decoders import H02RecordBatch, decode_h02_ascii_packet, decode_h02_binary_packet, decode_h02_binary_records
 
 
 class H02PacketDecoder(BasePacketDecoder):
@@ -24,9 +24,9 @@ class H02PacketDecoder(BasePacketDecoder):
             `H02Location` object that contains all required data to be saved in the backend.
 
         Raises:
-            BadProtocolError: If data packet begins unexpectedly (Neither '*' nor '$').
+            BadProtocolError: If data packet begins unexpectedly (Neither '*' nor '$') or standard mode data packet is malformed.
             UnicodeDecodeError: If ASCII mode data packet can not be decoded properly.
-            RegExMatchError: If one of the decoders fail to decode a certain parameter (both in ASCII and Standard modes, both use regular expressions internally).
+            RegExMatchError: If ASCII mode decoder fails to decode a certain parameter.
         """
         try:
             if raw_bytes.startswith(b'*'):
@@ -38,3 +38,22 @@ class H02PacketDecoder(BasePacketDecoder):
         except (BadProtocolError, UnicodeDecodeError, RegExMatchError):
             raise
 
+    def decode_many(self, buffer: bytes) -> H02RecordBatch:
+        """Decode a contiguous buffer of binary (standard mode) records at once.
+
+        Meant for re-ingesting device logs and spool backlogs, where decoding records one at a time
+        with `decode` is too slow. Requires NumPy.
+
+        Args:
+            buffer:
+                Binary records back to back, each of them 45 bytes long.
+
+        Returns:
+            `H02RecordBatch` with a column of values for each field, iterate over it to get `H02Location` objects.
+
+        Raises:
+            ImportError: If NumPy is not installed.
+            BadProtocolError: If size of `buffer` is not a multiple of 45 bytes.
+        """
+        return decode_h02_binary_records(buffer)
+
@@ -2,7 +2,7 @@ from dataclasses import dataclass
 
 from protocols.payloads import BaseLocationPayload
 
-@dataclass(frozen=True)
+@dataclass(slots=True)
 class H02Location(BaseLocationPayload):
     maker: str
     device_serial_number: str
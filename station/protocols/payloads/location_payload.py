@@ -1,8 +1,42 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field, fields
+from typing import Any, Dict, Tuple
 
-@dataclass(frozen=True) # TODO: require subclasses to define `protocol` field
+from .serializer import json_serializer, msgpack_serializer
+
+# Payloads are slotted and mutable: hundreds of thousands of them can be in flight after a device burst,
+# slots drop the per-instance `__dict__` and a plain `__init__` is much cheaper than a frozen one.
+@dataclass(slots=True) # TODO: require subclasses to define `protocol` field
 class BaseLocationPayload:
     latitude: float
     longitude: float
-    raw_data: str
+    raw_data: str | bytes
+    # Set by the geofence pipeline stage, left out of serialized payloads while `None`.
+    geofences: Tuple[str, ...] | None = field(default=None, kw_only=True)
+    geofences_entered: Tuple[str, ...] | None = field(default=None, kw_only=True)
+    geofences_exited: Tuple[str, ...] | None = field(default=None, kw_only=True)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return fields of the payload in the form they are sent uplink.
+
+        Binary packets keep their raw bytes in `raw_data`, they are only rendered
+        (as comma separated decimal values of each byte) here, when payload is serialized.
+        Geofence fields are only included once they are set.
+        """
+        data = {field.name: getattr(self, field.name) for field in fields(self)}
+
+        for name in ('geofences', 'geofences_entered', 'geofences_exited'):
+            if data[name] is None:
+                del data[name]
+
+        if isinstance(self.raw_data, bytes):
+            data['raw_data'] = ','.join(map(str, self.raw_data))
+
+        return data
+
+    def to_json(self) -> bytes:
+        """Return payload serialized to a JSON object, same as `to_dict` dumped without whitespace."""
+        return json_serializer(type(self))(self)
 
+    def to_msgpack(self) -> bytes:
+        """Return payload serialized to a MessagePack map, `bytes` raw data is kept as it is."""
+        return msgpack_serializer(type(self))(self)
@@ -0,0 +1,221 @@
+import struct
+from dataclasses import fields
+from functools import cache
+from json.encoder import encode_basestring_ascii
+from types import NoneType, UnionType
+from typing import Any, Callable, List, Tuple, Type, Union, get_args, get_origin, get_type_hints
+
+# Serializer of a single payload, compiled once per payload class.
+Serializer = Callable[[object], bytes]
+
+pack_double = struct.Struct('>d').pack
+
+
+@cache
+def json_serializer(payload_class: Type) -> Serializer:
+    """Return function that serializes instances of a dataclass payload to a JSON object.
+
+    Output is byte for byte the same as `json.dumps(payload.to_dict(), separators=(',', ':')).encode()`,
+    but instead of building a dict and walking it, keys are pre-encoded and the code that renders each field
+    according to its annotated type is generated and compiled once per class. `bytes` values (raw data of binary
+    packets) are rendered as comma separated decimal values of each byte, float fields must hold finite numbers.
+    Optional fields (`X | None`) are left out while they are `None`.
+
+    Args:
+        payload_class:
+            Dataclass whose fields are annotated with `float`, `int`, `bool`, `str`, `str | bytes` or `Tuple[str, ...]`, optionally `| None`.
+
+    Returns:
+        Serializer function.
+    """
+    parts: List[str] = []
+
+    for index, (name, field_type) in enumerate(field_types(payload_class)):
+        key = repr(('{' if index == 0 else ',') + encode_basestring_ascii(name) + ':')
+        value_type = optional_type(field_type)
+
+        if value_type is not None:
+            # Optional fields never come first, the first field (latitude) opens the object.
+            parts.append(f"('' if payload.{name} is None else {key} + {json_value(name, value_type)})")
+        else:
+            parts.append(key)
+            parts.append(json_value(name, field_type))
+
+    source = f"def serialize(payload):\n    return ''.join(({', '.join(parts)}, '}}')).encode()\n"
+    return compile_serializer(source, {'encode_string': encode_basestring_ascii, 'encode_string_or_bytes': encode_string_or_bytes, 'encode_strings': encode_strings})
+
+
+@cache
+def msgpack_serializer(payload_class: Type) -> Serializer:
+    """Return function that serializes instances of a dataclass payload to a MessagePack map.
+
+    Keys are field names, pre-packed once per class. Floats are packed as float 64, integers in the smallest
+    int/uint type that fits them, booleans as true/false, strings as str and tuples of strings as arrays. Unlike JSON, `bytes` values are kept
+    as they are (bin type). Optional fields (`X | None`) are left out while they are `None`.
+    The `msgpack` package is not needed, encoding only uses `struct`.
+
+    Args:
+        payload_class:
+            Dataclass whose fields are annotated with `float`, `int`, `bool`, `str`, `str | bytes` or `Tuple[str, ...]`, optionally `| None`.
+
+    Returns:
+        Serializer function.
+    """
+    types = field_types(payload_class)
+    optional_names = [name for name, field_type in types if optional_type(field_type) is not None]
+
+    if optional_names:
+        present = ' + '.join(f'(payload.{name} is not None)' for name in optional_names)
+        parts: List[str] = [f'pack_map_header({len(types) - len(optional_names)} + {present})']
+    else:
+        parts = [repr(pack_map_header(len(types)))]
+
+    for name, field_type in types:
+        key = repr(pack_string(name))
+        value_type = optional_type(field_type)
+
+        if value_type is not None:
+            parts.append(f"(b'' if payload.{name} is None else {key} + {msgpack_value(name, value_type)})")
+        else:
+            parts.append(key)
+            parts.append(msgpack_value(name, field_type))
+
+    source = f"def serialize(payload):\n    return b''.join(({', '.join(parts)}))\n"
+    return compile_serializer(source, {
+        'pack_double': pack_double,
+        'pack_int': pack_int,
+        'pack_map_header': pack_map_header,
+        'pack_string': pack_string,
+        'pack_string_or_bytes': pack_string_or_bytes,
+        'pack_strings': pack_strings,
+    })
+
+
+def json_value(name: str, field_type: Any) -> str:
+    """Return expression that renders field `name` of `payload` to JSON according to its type."""
+    if field_type is bool:
+        return f"('true' if payload.{name} else 'false')"
+    if field_type is float or field_type is int:
+        return f'repr(payload.{name})'
+    if field_type is str:
+        return f'encode_string(payload.{name})'
+    if get_origin(field_type) is tuple:
+        return f'encode_strings(payload.{name})'
+
+    return f'encode_string_or_bytes(payload.{name})'
+
+
+def msgpack_value(name: str, field_type: Any) -> str:
+    """Return expression that packs field `name` of `payload` to MessagePack according to its type."""
+    if field_type is bool:
+        return f"(b'\\xc3' if payload.{name} else b'\\xc2')"
+    if field_type is float:
+        return f"b'\\xcb' + pack_double(payload.{name})"
+    if field_type is int:
+        return f'pack_int(payload.{name})'
+    if field_type is str:
+        return f'pack_string(payload.{name})'
+    if get_origin(field_type) is tuple:
+        return f'pack_strings(payload.{name})'
+
+    return f'pack_string_or_bytes(payload.{name})'
+
+
+def field_types(payload_class: Type) -> List[tuple]:
+    """Return `(name, type)` of every field of a dataclass payload, in declaration order."""
+    type_hints = get_type_hints(payload_class)
+    return [(field.name, type_hints[field.name]) for field in fields(payload_class)]
+
+
+def optional_type(field_type: Any) -> Any:
+    """Return `X` of a field annotated with `X | None`, `None` if the field is not optional."""
+    if get_origin(field_type) not in (Union, UnionType):
+        return None
+
+    arguments = [argument for argument in get_args(field_type) if argument is not NoneType]
+
+    if len(arguments) == len(get_args(field_type)):
+        return None
+
+    return arguments[0] if len(arguments) == 1 else Union[tuple(arguments)]
+
+
+def compile_serializer(source: str, namespace: dict) -> Serializer:
+    exec(compile(source, '<payload serializer>', 'exec'), namespace)
+    return namespace['serialize']
+
+
+def encode_string_or_bytes(value: str | bytes) -> str:
+    if isinstance(value, bytes):
+        return '"' + ','.join(map(str, value)) + '"'
+
+    return encode_basestring_ascii(value)
+
+
+def encode_strings(values: Tuple[str, ...]) -> str:
+    return '[' + ','.join(map(encode_basestring_ascii, values)) + ']'
+
+
+def pack_int(value: int) -> bytes:
+    if 0 <= value < 0x80:
+        return bytes((value, ))
+    if -32 <= value < 0:
+        return bytes((value & 0xff, ))
+    if value >= 0:
+        for type_byte, size in ((b'\xcc', 1), (b'\xcd', 2), (b'\xce', 4), (b'\xcf', 8)):
+            if value < 1 << 8 * size:
+                return type_byte + value.to_bytes(size, 'big')
+
+    for type_byte, size in ((b'\xd0', 1), (b'\xd1', 2), (b'\xd2', 4), (b'\xd3', 8)):
+        if -(1 << 8 * size - 1) <= value:
+            return type_byte + value.to_bytes(size, 'big', signed=True)
+
+    raise OverflowError(f'{value} does not fit in 64 bits.')
+
+
+def pack_map_header(length: int) -> bytes:
+    if length < 16:
+        return bytes((0x80 | length, ))
+
+    return b'\xde' + length.to_bytes(2, 'big')
+
+
+def pack_string(value: str) -> bytes:
+    data = value.encode()
+    length = len(data)
+
+    if length < 32:
+        return bytes((0xa0 | length, )) + data
+    if length < 0x100:
+        return b'\xd9' + bytes((length, )) + data
+    if length < 0x10000:
+        return b'\xda' + length.to_bytes(2, 'big') + data
+
+    return b'\xdb' + length.to_bytes(4, 'big') + data
+
+
+def pack_string_or_bytes(value: str | bytes) -> bytes:
+    if not isinstance(value, bytes):
+        return pack_string(value)
+
+    length = len(value)
+
+    if length < 0x100:
+        return b'\xc4' + bytes((length, )) + value
+    if length < 0x10000:
+        return b'\xc5' + length.to_bytes(2, 'big') + value
+
+    return b'\xc6' + length.to_bytes(4, 'big') + value
+
+
+def pack_strings(values: Tuple[str, ...]) -> bytes:
+    length = len(values)
+
+    if length < 16:
+        header = bytes((0x90 | length, ))
+    elif length < 0x10000:
+        header = b'\xdc' + length.to_bytes(2, 'big')
+    else:
+        header = b'\xdd' + length.to_bytes(4, 'big')
+
+    return header + b''.join(map(pack_string, values))
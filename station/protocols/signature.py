@@ -0,0 +1,31 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class ProtocolSignature:
+    """Cheap check of whether bytes sent first by a device might belong to a protocol.
+
+    Signatures are matched without decoding anything, the first byte of `prefix` is used to
+    dispatch bytes only to protocols that can possibly start with it.
+
+    Attributes:
+        prefix:
+            Magic bytes protocol data starts with, at least the leading byte.
+        min_length:
+            Minimum amount of bytes protocol data must have.
+    """
+
+    prefix: bytes
+    min_length: int = 0
+
+    def __post_init__(self) -> None:
+        if not self.prefix:
+            raise ValueError('Protocol signature must have a prefix of at least one byte.')
+
+    def matches(self, raw_bytes: bytes) -> bool:
+        """Check if `raw_bytes` start with `prefix` and are at least `min_length` bytes long."""
+        return len(raw_bytes) >= self.min_length and raw_bytes.startswith(self.prefix)
+
+    def may_match(self, raw_bytes: bytes) -> bool:
+        """Check if `raw_bytes` do not match yet, but would once more bytes of the same data are read."""
+        return not self.matches(raw_bytes) and raw_bytes[:len(self.prefix)] == self.prefix[:len(raw_bytes)]
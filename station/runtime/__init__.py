@@ -0,0 +1,6 @@
+"""Package with the event loop the station runs in and options of its sockets."""
+
+from .event_loop import EVENT_LOOPS, get_loop_factory, run
+from .sockets import TcpOptions
+
+__all__ = ('EVENT_LOOPS', 'get_loop_factory', 'run', 'TcpOptions', )
@@ -0,0 +1,43 @@
+import asyncio
+from typing import Any, Callable, Coroutine
+
+from logger import logger
+
+EVENT_LOOPS = ('auto', 'asyncio', 'uvloop')
+
+
+def get_loop_factory(event_loop: str = 'auto') -> Callable[[], asyncio.AbstractEventLoop] | None:
+    """Return factory of the event loop to run the station in, `None` for the default asyncio one.
+
+    Args:
+        event_loop:
+            `uvloop` to require uvloop, `asyncio` for the default loop or `auto` to use uvloop when it is installed.
+
+    Raises:
+        ValueError: If `event_loop` is not one of `EVENT_LOOPS`.
+        ImportError: If `uvloop` is required but not installed.
+    """
+    if event_loop not in EVENT_LOOPS:
+        raise ValueError(f'Unknown event loop "{event_loop}", expected one of: {", ".join(EVENT_LOOPS)}.')
+
+    if event_loop == 'asyncio':
+        return None
+
+    try:
+        import uvloop
+    except ImportError:
+        if event_loop == 'uvloop':
+            raise
+
+        return None
+
+    return uvloop.new_event_loop
+
+
+def run(coroutine: Coroutine[Any, Any, Any], event_loop: str = 'auto') -> Any:
+    """Run coroutine until it completes, like `asyncio.run`, in the given kind of event loop (see `get_loop_factory`)."""
+    loop_factory = get_loop_factory(event_loop)
+
+    with asyncio.Runner(loop_factory=loop_factory) as runner:
+        logger.info('Running in %s.%s.', type(runner.get_loop()).__module__, type(runner.get_loop()).__name__)
+        return runner.run(coroutine)
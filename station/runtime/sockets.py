@@ -0,0 +1,46 @@
+import socket
+
+# `TCP_KEEP*` options are not available on every platform, they are skipped where they are not.
+KEEPALIVE_OPTIONS = tuple(
+    getattr(socket, name, None)
+    for name in ('TCP_KEEPIDLE', 'TCP_KEEPINTVL', 'TCP_KEEPCNT')
+)
+
+
+class TcpOptions:
+    """Options of accepted device connections.
+
+    Devices wait for an acknowledgement of every record and retransmit when it is late, so Nagle's
+    algorithm must not hold acknowledgements back. Cellular peers often vanish without closing their
+    connections, keepalive probes detect them within `keepalive_idle + keepalive_interval * keepalive_count` seconds
+    of silence instead of the kernel's default of over two hours.
+
+    Attributes:
+        nodelay:
+            Whether small writes (acknowledgements) are sent right away.
+        keepalive_idle:
+            Seconds of silence before the first keepalive probe, `0` disables keepalive.
+        keepalive_interval:
+            Seconds between keepalive probes.
+        keepalive_count:
+            Amount of unanswered probes after which connection is dropped.
+    """
+
+    def __init__(self, nodelay: bool = True, keepalive_idle: int = 120, keepalive_interval: int = 30, keepalive_count: int = 4) -> None:
+        self.nodelay = nodelay
+        self.keepalive_idle = keepalive_idle
+        self.keepalive_interval = keepalive_interval
+        self.keepalive_count = keepalive_count
+
+    def apply(self, sock: socket.socket) -> None:
+        """Set options on an accepted socket."""
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, int(self.nodelay))
+
+        if not self.keepalive_idle:
+            return
+
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+
+        for option, value in zip(KEEPALIVE_OPTIONS, (self.keepalive_idle, self.keepalive_interval, self.keepalive_count)):
+            if option is not None:
+                sock.setsockopt(socket.IPPROTO_TCP, option, value)
@@ -0,0 +1,5 @@
+"""Package for reading gps-station's settings from the environment."""
+
+from .env import get_env_str, get_env_int, get_env_float
+
+__all__ = ('get_env_str', 'get_env_int', 'get_env_float', )
@@ -0,0 +1,73 @@
+import os
+
+
+def get_env_str(name: str, default: str | None = None) -> str:
+    """Read a string setting from the environment.
+
+    Args:
+        name:
+            Name of the environment variable.
+        default:
+            Value to use when variable is not defined, `None` makes the variable required.
+
+    Returns:
+        Value of the environment variable.
+
+    Raises:
+        Exception: If variable is required and not defined.
+    """
+    value = os.getenv(name, default)
+
+    if value is None:
+        raise Exception(f'Required setting is not defined. '
+                        f'Define "{name}" variable in the environment that you are trying to run gps-station in.')
+
+    return value
+
+
+def get_env_int(name: str, default: int | None = None) -> int:
+    """Read an integer setting from the environment.
+
+    Args:
+        name:
+            Name of the environment variable.
+        default:
+            Value to use when variable is not defined, `None` makes the variable required.
+
+    Returns:
+        Value of the environment variable cast to `int`.
+
+    Raises:
+        Exception: If variable is required and not defined.
+        ValueError: If value of the variable could not be cast to `int`.
+    """
+    value = get_env_str(name, None if default is None else str(default))
+
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f'Invalid value of "{name}". string "{value}" could not be cast to int.')
+
+
+def get_env_float(name: str, default: float | None = None) -> float:
+    """Read a float setting from the environment.
+
+    Args:
+        name:
+            Name of the environment variable.
+        default:
+            Value to use when variable is not defined, `None` makes the variable required.
+
+    Returns:
+        Value of the environment variable cast to `float`.
+
+    Raises:
+        Exception: If variable is required and not defined.
+        ValueError: If value of the variable could not be cast to `float`.
+    """
+    value = get_env_str(name, None if default is None else str(default))
+
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f'Invalid value of "{name}". string "{value}" could not be cast to float.')
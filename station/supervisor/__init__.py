@@ -0,0 +1,5 @@
+"""Package for running station in several worker processes."""
+
+from .supervisor import Supervisor
+
+__all__ = ('Supervisor', )
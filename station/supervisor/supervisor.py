@@ -0,0 +1,166 @@
+import multiprocessing
+import queue
+import signal
+import time
+from typing import Any, Callable, Dict, List
+
+from logger import logger, write_forwarded_logs
+
+# Target of a worker process, called with worker's id, the queue it should report its stats to and the queue it should forward its logs to.
+WorkerTarget = Callable[[int, Any, Any], None]
+
+
+class Supervisor:
+    """Run station in several worker processes and keep them running.
+
+    Each worker is expected to bind the same port with `SO_REUSEPORT`, letting the kernel spread
+    incoming connections between them, so decoding, logging and uplink of different connections
+    run on different cores. Workers that exit unexpectedly are restarted (with a delay that grows
+    while they keep crashing), `SIGTERM`/`SIGINT` are forwarded to workers so they can shut down gracefully.
+    Workers periodically put `(worker_id, stats)` tuples into the stats queue, supervisor logs their sum.
+    Workers forward their log records to the supervisor (see `logger.forward_logs`), which is the only process writing log files.
+
+    Attributes:
+        worker_count:
+            Number of worker processes.
+        target:
+            Function each worker process runs.
+        stats_interval:
+            Seconds between logging aggregated stats of workers.
+        shutdown_timeout:
+            Seconds workers are given to shut down before they are killed.
+        restart_delay:
+            Seconds to wait before restarting a crashed worker, doubled for each consecutive crash.
+        worker_stats:
+            Last stats reported by each worker.
+    """
+
+    def __init__(
+        self,
+        worker_count: int,
+        target: WorkerTarget,
+        stats_interval: float = 30.0,
+        shutdown_timeout: float = 30.0,
+        restart_delay: float = 1.0,
+    ) -> None:
+        self.worker_count = worker_count
+        self.target = target
+        self.stats_interval = stats_interval
+        self.shutdown_timeout = shutdown_timeout
+        self.restart_delay = restart_delay
+        self.worker_stats: Dict[int, Dict[str, int]] = {}
+
+        # Spawned (rather than forked) workers import everything from scratch, so they don't inherit
+        # supervisor's logging threads and other state that does not survive `fork`.
+        self._context = multiprocessing.get_context('spawn')
+        self._stats_queue = self._context.Queue()
+        self._log_queue = self._context.Queue()
+        self._workers: List[Any] = [None] * worker_count
+        self._crashes = [0] * worker_count
+        self._started_at = [0.0] * worker_count
+        self._restart_at = [0.0] * worker_count
+        self._shutting_down = False
+
+    def run(self) -> None:
+        """Start workers and supervise them until `SIGTERM` or `SIGINT` is received."""
+        signal.signal(signal.SIGTERM, self._request_shutdown)
+        signal.signal(signal.SIGINT, self._request_shutdown)
+        log_listener = write_forwarded_logs(self._log_queue)
+
+        for worker_id in range(self.worker_count):
+            self._start_worker(worker_id)
+
+        logger.info('Supervisor started %s workers.', self.worker_count)
+        next_stats_at = time.monotonic() + self.stats_interval
+
+        while not self._shutting_down:
+            self._collect_stats(timeout=1.0)
+            self._restart_crashed_workers()
+
+            if time.monotonic() >= next_stats_at:
+                logger.info('Aggregated stats of %s workers: %s', len(self.worker_stats), self.aggregate_stats())
+                next_stats_at = time.monotonic() + self.stats_interval
+
+        self._stop_workers()
+        # Workers exited, write whatever they logged last.
+        log_listener.stop()
+
+    def aggregate_stats(self) -> Dict[str, int]:
+        """Return sum of the last stats reported by each worker."""
+        aggregated: Dict[str, int] = {}
+
+        for stats in self.worker_stats.values():
+            for name, value in stats.items():
+                aggregated[name] = aggregated.get(name, 0) + value
+
+        return aggregated
+
+    def _start_worker(self, worker_id: int) -> None:
+        worker = self._context.Process(target=self.target, args=(worker_id, self._stats_queue, self._log_queue), name=f'gps-station-worker-{worker_id}')
+        worker.start()
+        self._workers[worker_id] = worker
+        self._started_at[worker_id] = time.monotonic()
+
+    def _collect_stats(self, timeout: float) -> None:
+        try:
+            worker_id, stats = self._stats_queue.get(timeout=timeout)
+        except queue.Empty:
+            return
+
+        self.worker_stats[worker_id] = stats
+
+        while True:
+            try:
+                worker_id, stats = self._stats_queue.get_nowait()
+            except queue.Empty:
+                return
+
+            self.worker_stats[worker_id] = stats
+
+    def _restart_crashed_workers(self) -> None:
+        now = time.monotonic()
+
+        for worker_id, worker in enumerate(self._workers):
+            if worker is None:
+                if now >= self._restart_at[worker_id]:
+                    self._start_worker(worker_id)
+                continue
+
+            if worker.is_alive():
+                continue
+
+            # Worker that ran for a while before crashing is not crash looping, don't keep growing its delay.
+            if now - self._started_at[worker_id] > 60.0:
+                self._crashes[worker_id] = 0
+
+            self._crashes[worker_id] += 1
+            delay = min(self.restart_delay * 2 ** (self._crashes[worker_id] - 1), 60.0)
+            logger.critical('Worker %s exited unexpectedly with exit code %s, restarting it in %s seconds.', worker_id, worker.exitcode, delay)
+            self.worker_stats.pop(worker_id, None)
+            self._workers[worker_id] = None
+            self._restart_at[worker_id] = now + delay
+
+    def _stop_workers(self) -> None:
+        logger.info('Supervisor is shutting down workers.')
+        workers = [worker for worker in self._workers if worker is not None]
+
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()  # sends SIGTERM
+
+        deadline = time.monotonic() + self.shutdown_timeout
+
+        for worker in workers:
+            worker.join(max(deadline - time.monotonic(), 0))
+
+            if worker.is_alive():
+                logger.error('Worker %s did not shut down in %s seconds, killing it.', worker.name, self.shutdown_timeout)
+                worker.kill()
+                worker.join()
+
+        # Workers report their stats one last time while shutting down.
+        self._collect_stats(timeout=0.1)
+        logger.info('Supervisor stopped. Last aggregated stats: %s', self.aggregate_stats())
+
+    def _request_shutdown(self, signum: int, frame: Any) -> None:
+        self._shutting_down = True
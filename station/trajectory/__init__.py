@@ -0,0 +1,7 @@
+"""Package that simplifies tracks of devices into compact segments for history sinks."""
+
+from .encoding import encode_deltas, decode_deltas, encode_path, decode_path
+from .segment import TrackSegment
+from .track import DeviceTrack
+
+__all__ = ('DeviceTrack', 'TrackSegment', 'decode_deltas', 'decode_path', 'encode_deltas', 'encode_path', )
@@ -0,0 +1,75 @@
+"""Delta encoding of track segments, the encoded polyline algorithm.
+
+Every value is stored as the difference from the previous value of the same dimension, zigzag encoded and
+written in 5-bit chunks as printable ASCII characters. Points of a path are `(latitude, longitude)` pairs
+scaled by 10^6, the same format as "polyline6" of routing engines, so backends can decode paths with any
+polyline library. Times and speeds use the same encoding with a single dimension.
+"""
+
+from typing import List, Sequence
+
+
+def encode_deltas(values: Sequence[int], dimensions: int = 1) -> str:
+    """Encode integers as differences from the value `dimensions` places before them.
+
+    Args:
+        values:
+            Integers to encode, interleaved when there is more than one dimension (e.g. latitude, longitude, latitude, ...).
+        dimensions:
+            Amount of interleaved dimensions.
+
+    Returns:
+        Encoded values.
+    """
+    characters: List[str] = []
+
+    for index, value in enumerate(values):
+        delta = value - values[index - dimensions] if index >= dimensions else value
+        delta = ~(delta << 1) if delta < 0 else delta << 1
+
+        while delta >= 0x20:
+            characters.append(chr((0x20 | delta & 0x1f) + 63))
+            delta >>= 5
+
+        characters.append(chr(delta + 63))
+
+    return ''.join(characters)
+
+
+def decode_deltas(encoded: str, dimensions: int = 1) -> List[int]:
+    """Decode integers encoded by `encode_deltas`."""
+    values: List[int] = []
+    delta = 0
+    shift = 0
+
+    for character in encoded:
+        chunk = ord(character) - 63
+        delta |= (chunk & 0x1f) << shift
+        shift += 5
+
+        if chunk >= 0x20:
+            continue
+
+        delta = ~(delta >> 1) if delta & 1 else delta >> 1
+        values.append(values[-dimensions] + delta if len(values) >= dimensions else delta)
+        delta = 0
+        shift = 0
+
+    return values
+
+
+def encode_path(latitudes: Sequence[float], longitudes: Sequence[float]) -> str:
+    """Encode coordinates as a polyline with precision of 6 decimal places."""
+    values: List[int] = []
+
+    for latitude, longitude in zip(latitudes, longitudes):
+        values.append(round(latitude * 1_000_000))
+        values.append(round(longitude * 1_000_000))
+
+    return encode_deltas(values, dimensions=2)
+
+
+def decode_path(encoded: str) -> List[tuple]:
+    """Decode a polyline encoded by `encode_path` to `(latitude, longitude)` points."""
+    values = decode_deltas(encoded, dimensions=2)
+    return [(values[index] / 1_000_000, values[index + 1] / 1_000_000) for index in range(0, len(values), 2)]
@@ -0,0 +1,64 @@
+from dataclasses import dataclass, fields
+from typing import Any, Dict, Tuple
+
+from protocols.payloads.serializer import json_serializer, msgpack_serializer
+
+# Why a segment was closed.
+CLOSED_BY_STATUS = 'status'
+CLOSED_BY_WINDOW = 'window'
+CLOSED_BY_POINTS = 'points'
+CLOSED_BY_EVICTION = 'evicted'
+CLOSED_BY_SHUTDOWN = 'shutdown'
+
+
+@dataclass(slots=True)
+class TrackSegment:
+    """Simplified track of a single device over a window of time, sent to history sinks instead of every fix.
+
+    Serialized like location payloads, so the same sinks and spools deliver it. `path`, `times` and `speeds`
+    are delta encoded, see `trajectory.encoding` (`decode_path`, `decode_deltas`).
+
+    Attributes:
+        device_serial_number:
+            IMEI of the device.
+        started_at:
+            Unix time first point of the segment was received at.
+        ended_at:
+            Unix time last point of the segment was received at.
+        path:
+            Points of the simplified track as a polyline with precision of 6 decimal places.
+        times:
+            Unix time (whole seconds) every point was received at.
+        speeds:
+            Speed of every point in tenths of the payload's units.
+        status:
+            Names of status bits (boolean fields of the payload) that were set during the whole segment.
+        points:
+            Amount of points in `path`.
+        fixes:
+            Amount of fixes the segment was simplified from, not counting its first point when it continues the previous segment.
+        closed_by:
+            Why the segment was closed: status bits changed (`status`), window passed (`window`), segment reached
+            the maximum amount of fixes (`points`), device was forgotten (`evicted`) or station was stopped (`shutdown`).
+    """
+
+    device_serial_number: str
+    started_at: float
+    ended_at: float
+    path: str
+    times: str
+    speeds: str
+    status: Tuple[str, ...]
+    points: int
+    fixes: int
+    closed_by: str
+    protocol: str = 'track'
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {field.name: getattr(self, field.name) for field in fields(self)}
+
+    def to_json(self) -> bytes:
+        return json_serializer(type(self))(self)
+
+    def to_msgpack(self) -> bytes:
+        return msgpack_serializer(type(self))(self)
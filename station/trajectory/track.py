@@ -0,0 +1,108 @@
+import math
+from typing import List, Tuple
+
+from .encoding import encode_deltas, encode_path
+from .segment import TrackSegment
+
+# Meters per degree of latitude, same approximation as fix filter's.
+METERS_PER_DEGREE = 111_320.0
+
+# Unix time, latitude, longitude and speed of a fix.
+Point = Tuple[float, float, float, float]
+
+
+class DeviceTrack:
+    """Segment of a device's track that is being simplified as fixes arrive.
+
+    Fixes are simplified with the opening window algorithm: the last kept point is an anchor and fixes received
+    after it wait in a window. While every fix in the window is within `max_error` meters of the line from the anchor
+    to the newest fix, they can all be dropped; once one is not, the fix before the newest one is kept and becomes
+    the new anchor. Every dropped fix is therefore within `max_error` meters of the simplified track.
+
+    Attributes:
+        status:
+            Status bits of the segment's fixes, see `pipeline.fix_filter.status_bits`.
+        status_names:
+            Names of status bits that are set.
+        kept:
+            Points of the simplified track so far.
+        window:
+            Points received after the last kept one.
+        fixes:
+            Amount of fixes added to the segment, not counting the point it continues from.
+    """
+
+    __slots__ = ('status', 'status_names', 'kept', 'window', 'fixes')
+
+    def __init__(self, status: int, status_names: Tuple[str, ...]) -> None:
+        self.status = status
+        self.status_names = status_names
+        self.kept: List[Point] = []
+        self.window: List[Point] = []
+        self.fixes = 0
+
+    @property
+    def started_at(self) -> float:
+        return self.kept[0][0]
+
+    @property
+    def last_point(self) -> Point:
+        return self.window[-1] if self.window else self.kept[-1]
+
+    def add(self, point: Point, max_error: float) -> bool:
+        """Add a fix to the segment and tell whether a point was kept because of it."""
+        self.fixes += 1
+
+        if not self.kept:
+            self.kept.append(point)
+            return True
+
+        window = self.window
+        window.append(point)
+        anchor = self.kept[-1]
+
+        for candidate in window[:-1]:
+            if distance_to_segment(candidate, anchor, point) > max_error:
+                self.kept.append(window[-2])
+                self.window = [point]
+                return True
+
+        return False
+
+    def continued(self) -> 'DeviceTrack':
+        """Return the next segment of the track, starting at this segment's last point (which is not counted as a fix)."""
+        track = DeviceTrack(self.status, self.status_names)
+        track.kept.append(self.last_point)
+        return track
+
+    def close(self, imei: str, closed_by: str) -> TrackSegment:
+        """Return the segment with its last point kept."""
+        points = self.kept + self.window[-1:]
+        return TrackSegment(
+            imei,
+            points[0][0],
+            points[-1][0],
+            encode_path([point[1] for point in points], [point[2] for point in points]),
+            encode_deltas([int(point[0]) for point in points]),
+            encode_deltas([round(point[3] * 10) for point in points]),
+            self.status_names,
+            len(points),
+            self.fixes,
+            closed_by,
+        )
+
+
+def distance_to_segment(point: Point, start: Point, end: Point) -> float:
+    """Return approximate distance in meters from a point to the line segment between two others."""
+    scale = math.cos(math.radians(start[1])) * METERS_PER_DEGREE
+    # Coordinates in meters relative to `start` (equirectangular projection, fine for short distances).
+    x, y = (point[2] - start[2]) * scale, (point[1] - start[1]) * METERS_PER_DEGREE
+    end_x, end_y = (end[2] - start[2]) * scale, (end[1] - start[1]) * METERS_PER_DEGREE
+    length = end_x * end_x + end_y * end_y
+
+    if length == 0:
+        return math.hypot(x, y)
+
+    # Position of the closest point of the segment, as a fraction of its length.
+    fraction = max(0.0, min(1.0, (x * end_x + y * end_y) / length))
+    return math.hypot(x - fraction * end_x, y - fraction * end_y)
@@ -0,0 +1,7 @@
+"""Package responsible for delivering decoded location payloads to the backend."""
+
+from .fanout import UplinkFanout
+from .queue import UplinkQueue
+from .spool import UplinkSpool
+
+__all__ = ('UplinkFanout', 'UplinkQueue', 'UplinkSpool', )
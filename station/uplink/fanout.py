@@ -0,0 +1,62 @@
+import asyncio
+from typing import Dict, List
+
+from protocols.payloads import BaseLocationPayload
+
+from .queue import UplinkQueue
+
+
+class UplinkFanout:
+    """Delivers every location payload to several sinks, each through its own `UplinkQueue`.
+
+    Every queue batches, retries and spools independently, so a slow or unavailable sink only
+    holds back the others once its own queue (and spool, if any) can not take more payloads.
+    Exposes the same interface as `UplinkQueue`, protocols do not know how many sinks there are.
+
+    Attributes:
+        queues:
+            Queue of every sink.
+    """
+
+    def __init__(self, queues: List[UplinkQueue]) -> None:
+        self.queues = queues
+
+    @property
+    def depth(self) -> int:
+        """Number of payloads currently waiting in all queues."""
+        return sum(queue.depth for queue in self.queues)
+
+    def stats(self) -> Dict[str, int]:
+        """Return counters of all queues summed up, `max_depth` is the highest of them."""
+        stats: Dict[str, int] = {}
+
+        for queue in self.queues:
+            for name, value in queue.stats().items():
+                stats[name] = max(stats.get(name, 0), value) if name == 'max_depth' else stats.get(name, 0) + value
+
+        return stats
+
+    async def start(self) -> None:
+        """Start all sinks and their queues."""
+        for queue in self.queues:
+            await queue.start()
+
+    async def close(self) -> None:
+        """Deliver (or spool) payloads that are still waiting and close all sinks."""
+        await asyncio.gather(*(queue.close() for queue in self.queues))
+
+    async def put(self, location_payload: BaseLocationPayload) -> None:
+        """Enqueue location payload to every sink, waits while any of the queues is full."""
+        if len(self.queues) == 1:
+            await self.queues[0].put(location_payload)
+            return
+
+        for queue in self.queues:
+            await queue.put(location_payload)
+
+    async def persist(self, location_payload: BaseLocationPayload) -> bool:
+        """Enqueue location payload to every sink and wait until all of them stored it, see `UplinkQueue.persist`."""
+        if len(self.queues) == 1:
+            return await self.queues[0].persist(location_payload)
+
+        return all(await asyncio.gather(*(queue.persist(location_payload) for queue in self.queues)))
@@ -0,0 +1,346 @@
+import asyncio
+import time
+from typing import Dict, List
+
+from logger import logger
+from metrics import UPLINK_RTT_SECONDS
+from protocols.payloads import BaseLocationPayload
+
+from .sinks import BaseSink, SinkError, SinkRejectedError
+from .spool import UplinkSpool
+
+
+class UplinkQueue:
+    """Station-wide queue of location payloads waiting to be written to a sink.
+
+    Connections enqueue decoded payloads and move on, worker tasks collect them into batches
+    and write each batch to the sink at once, so a slow backend no longer stalls device read loops.
+    A batch is flushed when it reaches `batch_size` payloads or `flush_interval` seconds after its first
+    payload, whichever comes first. Failed batches are retried with exponential backoff.
+
+    When `spool` is given, batches that could not be delivered after all retries are written to it
+    instead of being dropped, and so are new payloads while the spool is not empty or the queue is full.
+    A separate task replays spooled payloads in order once sink accepts them again, so connections
+    keep being served at full rate through backend outages.
+
+    `put` returns as soon as the payload is enqueued, `persist` also waits until it is written to the sink
+    (or synced to the spool on disk), for protocols that acknowledge records to devices only once they are stored.
+
+    Attributes:
+        sink:
+            Destination batches are written to, started and closed together with the queue.
+        queue:
+            Bounded queue of payloads waiting to be sent, `put` waits when it is full.
+        batch_size:
+            Maximum number of payloads sent in a single request.
+        flush_interval:
+            Maximum amount of seconds a payload waits for its batch to fill up.
+        worker_count:
+            Number of batches that can be in flight at the same time.
+        max_retries:
+            Number of times a failed batch is retried before it is given up on.
+        retry_backoff:
+            Seconds to wait before the first retry, doubled on each subsequent one.
+        max_retry_backoff:
+            Upper limit of seconds to wait between retries.
+        spool:
+            Optional on-disk spool for payloads that could not be sent yet.
+        sent:
+            Total amount of payloads accepted by the backend.
+        failed:
+            Total amount of payloads that could not be delivered.
+        retried:
+            Total amount of batch retries.
+        spooled:
+            Total amount of payloads written to the spool.
+        max_depth:
+            Highest number of payloads that were waiting in the queue at once.
+    """
+
+    def __init__(
+        self,
+        sink: BaseSink,
+        max_size: int = 100_000,
+        batch_size: int = 500,
+        flush_interval: float = 0.2,
+        worker_count: int = 4,
+        max_retries: int = 5,
+        retry_backoff: float = 0.5,
+        max_retry_backoff: float = 10.0,
+        spool: UplinkSpool | None = None,
+    ) -> None:
+        self.sink = sink
+        self.queue: asyncio.Queue[BaseLocationPayload] = asyncio.Queue(max_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.worker_count = worker_count
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.max_retry_backoff = max_retry_backoff
+        self.spool = spool
+
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self.spooled = 0
+        self.max_depth = 0
+
+        self._persisting: Dict[int, asyncio.Future] = {}
+        self._workers: List[asyncio.Task] = []
+        self._replay_task: asyncio.Task | None = None
+        self._rtt_seconds = UPLINK_RTT_SECONDS.labels(sink.name)
+
+    @property
+    def depth(self) -> int:
+        """Number of payloads currently waiting in the queue."""
+        return self.queue.qsize()
+
+    def stats(self) -> Dict[str, int]:
+        """Return counters describing state of the queue."""
+        return {
+            'depth': self.depth,
+            'max_depth': self.max_depth,
+            'sent': self.sent,
+            'failed': self.failed,
+            'retried': self.retried,
+            'spooled': self.spooled,
+            'spool_size': self.spool.size if self.spool is not None else 0,
+        }
+
+    async def start(self) -> None:
+        """Start the sink and worker tasks."""
+        await self.sink.start()
+
+        for _ in range(self.worker_count):
+            self._workers.append(asyncio.create_task(self._work()))
+
+        if self.spool is not None:
+            self.spool.start()
+            self._replay_task = asyncio.create_task(self._replay())
+
+    async def close(self) -> None:
+        """Send (or spool) payloads that are still in the queue, stop worker tasks and close the sink."""
+        await self.queue.join()
+
+        tasks = [*self._workers, self._replay_task] if self._replay_task is not None else self._workers
+
+        for task in tasks:
+            task.cancel()
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers.clear()
+        self._replay_task = None
+
+        if self.spool is not None:
+            await self.spool.close()
+
+        await self.sink.close()
+        logger.info('Uplink queue of %s sink closed. %s', self.sink.name, self.stats())
+
+    async def put(self, location_payload: BaseLocationPayload) -> None:
+        """Enqueue location payload to be sent uplink, waits if the queue is full.
+
+        Args:
+            location_payload:
+                A `BaseLocationPayload` subclass' instance containing all formatted location data that is stored in database.
+        """
+        # Once something is spooled, everything after it goes through the spool too, so that payloads are delivered in order.
+        if self.spool is not None and (self.spool.has_pending or self.queue.full()):
+            self.spool.append([serialize_payload(location_payload)])
+            self.spooled += 1
+            await self._resolve_spooled([location_payload])
+            return
+
+        await self.queue.put(location_payload)
+
+        depth = self.queue.qsize()
+
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    async def persist(self, location_payload: BaseLocationPayload) -> bool:
+        """Enqueue location payload like `put` and wait until it is written to the sink or the spool.
+
+        Args:
+            location_payload:
+                A `BaseLocationPayload` subclass' instance containing all formatted location data that is stored in database.
+
+        Returns:
+            `True` once payload is written to the sink or synced to the spool, `False` if it could not be delivered.
+        """
+        # Payloads are kept alive by the queue until they are sent, so their ids are unique while they are waited for.
+        future = asyncio.get_running_loop().create_future()
+        self._persisting[id(location_payload)] = future
+
+        try:
+            await self.put(location_payload)
+        except BaseException:
+            del self._persisting[id(location_payload)]
+            raise
+
+        return await future
+
+    def _resolve(self, batch: List[BaseLocationPayload], persisted: bool) -> None:
+        """Tell whether payloads were stored to whoever `persist`ed them."""
+        if not self._persisting:
+            return
+
+        for location_payload in batch:
+            future = self._persisting.pop(id(location_payload), None)
+
+            if future is not None and not future.done():
+                future.set_result(persisted)
+
+    async def _resolve_spooled(self, batch: List[BaseLocationPayload]) -> None:
+        """Tell whether spooled payloads were stored to whoever `persist`ed them, once spool synced them to disk."""
+        assert self.spool is not None
+
+        if not any(id(location_payload) in self._persisting for location_payload in batch):
+            return
+
+        try:
+            await self.spool.sync()
+        except OSError as e:
+            logger.critical('Could not sync uplink spool of %s sink to disk. %s: %s', self.sink.name, e.__class__.__name__, e)
+            self._resolve(batch, False)
+            return
+
+        self._resolve(batch, True)
+
+    async def _work(self) -> None:
+        while True:
+            batch = await self._collect_batch()
+
+            try:
+                await self._send_batch(batch)
+            except Exception as e:
+                self.failed += len(batch)
+                self._resolve(batch, False)
+                logger.critical('Got an unexpected exception when sending batch uplink. %s: %s. Payloads: %s', e.__class__.__name__, e, batch, exc_info=True)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def _collect_batch(self) -> List[BaseLocationPayload]:
+        """Wait for at least one payload and collect more until batch is full or flush interval passes."""
+        batch = [await self.queue.get()]
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+
+            timeout = deadline - loop.time()
+
+            if timeout <= 0:
+                break
+
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _send_batch(self, batch: List[BaseLocationPayload]) -> None:
+        records = [serialize_payload(location_payload) for location_payload in batch]
+        error: SinkError | None = None
+
+        for attempt in range(self.max_retries + 1):
+            if attempt > 0:
+                self.retried += 1
+                await asyncio.sleep(min(self.retry_backoff * 2 ** (attempt - 1), self.max_retry_backoff))
+
+            error = await self._write(records)
+
+            if error is None:
+                self.sent += len(records)
+                self._resolve(batch, True)
+                return
+
+            if isinstance(error, SinkRejectedError):
+                break
+
+        if self.spool is not None and not isinstance(error, SinkRejectedError):
+            self.spool.append(records)
+            self.spooled += len(records)
+            logger.error('Spooled batch of %s payloads that could not be sent uplink.', len(records))
+            await self._resolve_spooled(batch)
+            return
+
+        self.failed += len(records)
+        self._resolve(batch, False)
+        logger.critical('Could not save batch of %s payloads. Payloads: %s', len(records), batch)
+
+    async def _replay(self) -> None:
+        """Send spooled payloads uplink in the order they were spooled."""
+        assert self.spool is not None
+        backoff = self.retry_backoff
+
+        while True:
+            await self.spool.wait_for_records()
+
+            try:
+                backoff = await self._replay_batch(backoff)
+            except Exception as e:
+                # Replay must outlive any error, payloads that are put after it would wait in the spool until restart otherwise.
+                self.retried += 1
+                logger.critical('Got an unexpected exception when replaying spooled payloads uplink. %s: %s', e.__class__.__name__, e, exc_info=True)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.max_retry_backoff)
+
+    async def _replay_batch(self, backoff: float) -> float:
+        """Send the oldest batch of spooled payloads uplink, return seconds to wait before the next retry."""
+        assert self.spool is not None
+        # Reading a batch from the spool does blocking file I/O, but it is small and sequential.
+        records, cursor = self.spool.read_batch(self.batch_size)
+
+        if not records:
+            # Only a partially written record is there, give it time to be completed.
+            await asyncio.sleep(self.flush_interval)
+            return backoff
+
+        error = await self._write(records)
+
+        if error is None:
+            self.sent += len(records)
+            self.spool.acknowledge(cursor)
+            return self.retry_backoff
+
+        if not isinstance(error, SinkRejectedError):
+            self.retried += 1
+            await asyncio.sleep(backoff)
+            return min(backoff * 2, self.max_retry_backoff)
+
+        # Retrying a batch that sink rejects would block the spool forever.
+        self.failed += len(records)
+        self.spool.acknowledge(cursor)
+        logger.critical('%s sink rejected batch of %s spooled payloads. %s. Payloads: %s', self.sink.name, len(records), error, records)
+        return backoff
+
+    async def _write(self, records: List[bytes]) -> SinkError | None:
+        """Write serialized payloads to the sink.
+
+        Returns:
+            Error raised by the sink, or `None` if the batch was written.
+        """
+        started_at = time.perf_counter()
+
+        try:
+            await self.sink.write(records)
+        except SinkError as e:
+            logger.error('Could not write batch of %s payloads to %s sink. %s: %s', len(records), self.sink.name, e.__class__.__name__, e)
+            return e
+
+        self._rtt_seconds.observe(time.perf_counter() - started_at)
+        return None
+
+
+def serialize_payload(location_payload: BaseLocationPayload) -> bytes:
+    """Serialize location payload to a single line of JSON."""
+    return location_payload.to_json()
@@ -0,0 +1,21 @@
+"""Package with destinations that location payloads can be delivered to."""
+
+from .base import BaseSink
+from .exceptions import SinkError, SinkRejectedError, SinkUnavailableError
+from .factory import create_sink
+from .file import NdjsonFileSink
+from .http import HttpBatchSink
+from .redis import RedisStreamSink
+from .unix import UnixSocketSink
+
+__all__ = (
+    'BaseSink',
+    'SinkError',
+    'SinkRejectedError',
+    'SinkUnavailableError',
+    'create_sink',
+    'NdjsonFileSink',
+    'HttpBatchSink',
+    'RedisStreamSink',
+    'UnixSocketSink',
+)
@@ -0,0 +1,41 @@
+from abc import ABC, abstractmethod
+from typing import List
+
+
+class BaseSink(ABC):
+    """Destination that serialized location payloads are delivered to.
+
+    Sinks only know how to write a batch, batching, retries, spooling and backpressure are
+    provided by the `UplinkQueue` each sink is wrapped in, so every sink gets its own queue
+    and a slow sink does not hold back batches of the others until its queue fills up.
+    `write` may be called by several queue workers at once, sinks that can not handle
+    concurrent writes must serialize them themselves.
+
+    Attributes:
+        name:
+            Short name of the sink used in logs, metrics and spool directory names.
+    """
+
+    name: str
+
+    async def start(self) -> None:
+        """Prepare the sink for writing, called from within a running event loop before the first `write`."""
+        pass
+
+    async def close(self) -> None:
+        """Release resources held by the sink, called after the last `write`."""
+        pass
+
+    @abstractmethod
+    async def write(self, records: List[bytes]) -> None:
+        """Write a batch of payloads.
+
+        Args:
+            records:
+                Payloads serialized to single lines of JSON.
+
+        Raises:
+            SinkUnavailableError: If the batch could not be written but might be accepted later.
+            SinkRejectedError: If the sink refused the batch.
+        """
+        pass
@@ -0,0 +1,16 @@
+"""Module for exceptions that sinks raise when a batch of payloads could not be written."""
+
+
+class SinkError(Exception):
+    """Batch of payloads could not be written to a sink."""
+    pass
+
+
+class SinkUnavailableError(SinkError):
+    """Sink could not be reached or is temporarily unable to accept payloads, the same batch can be retried later."""
+    pass
+
+
+class SinkRejectedError(SinkError):
+    """Sink refused the batch, retrying the same batch would fail again."""
+    pass
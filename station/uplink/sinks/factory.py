@@ -0,0 +1,63 @@
+from urllib.parse import parse_qs, urlsplit
+
+from .base import BaseSink
+from .file import NdjsonFileSink
+from .http import HttpBatchSink
+from .redis import RedisStreamSink
+from .unix import UnixSocketSink
+
+
+def create_sink(url: str, name: str | None = None) -> BaseSink:
+    """Create a sink from its URL.
+
+    Supported URLs:
+        - `http://host/path`, `https://host/path`: `HttpBatchSink` posting to the URL itself.
+        - `file:///path/to/payloads.ndjson?max_bytes=100000000&backup_count=5&fsync=0`: `NdjsonFileSink`.
+        - `redis://host:6379/stream?maxlen=1000000`: `RedisStreamSink` adding entries to `stream`.
+        - `unix:///path/to/socket`: `UnixSocketSink`.
+
+    Args:
+        url:
+            URL of the sink, query parameters are optional.
+        name:
+            Name of the sink, defaults to the URL scheme.
+
+    Returns:
+        Sink that was not started yet.
+
+    Raises:
+        ValueError: If scheme of the URL is not supported or a required part of it is missing.
+    """
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    options = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+    name = name or ('http' if scheme == 'https' else scheme)
+
+    match scheme:
+        case 'http' | 'https':
+            return HttpBatchSink(url, name=name)
+        case 'file':
+            if not parts.path:
+                raise ValueError(f'File sink URL must contain a path, instead got "{url}".')
+
+            return NdjsonFileSink(
+                parts.path,
+                max_bytes=int(options.get('max_bytes', 100_000_000)),
+                backup_count=int(options.get('backup_count', 5)),
+                fsync=options.get('fsync', '0') not in ('0', 'false', ''),
+                name=name,
+            )
+        case 'redis':
+            stream = parts.path.lstrip('/')
+
+            if not stream:
+                raise ValueError(f'Redis sink URL must contain name of the stream as its path, instead got "{url}".')
+
+            return RedisStreamSink(parts.hostname or 'localhost', parts.port or 6379, stream, maxlen=int(options.get('maxlen', 0)), name=name)
+        case 'unix':
+            if not parts.path:
+                raise ValueError(f'Unix socket sink URL must contain a path, instead got "{url}".')
+
+            return UnixSocketSink(parts.path, name=name)
+        case _:
+            raise ValueError(f'Unsupported sink URL scheme "{parts.scheme}" in "{url}". Expected one of: http, https, file, redis, unix.')
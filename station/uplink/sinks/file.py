@@ -0,0 +1,86 @@
+import asyncio
+import os
+from typing import BinaryIO, List
+
+from .base import BaseSink
+from .exceptions import SinkUnavailableError
+
+
+class NdjsonFileSink(BaseSink):
+    """Sink that appends payloads to a newline-delimited JSON file, rotating it like `RotatingFileHandler`.
+
+    When the file would grow past `max_bytes` it is renamed to `<path>.1` (older files shift to `.2`, `.3`, ...
+    and the one past `backup_count` is deleted) and a new file is started. Blocking file I/O runs in the default
+    executor and batches are written one at a time, so lines of different batches never interleave.
+
+    Attributes:
+        path:
+            Path of the file payloads are appended to.
+        max_bytes:
+            Size in bytes after which the file is rotated, `0` disables rotation.
+        backup_count:
+            Number of rotated files that are kept.
+        fsync:
+            Whether every batch is synced to disk before `write` returns.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 100_000_000, backup_count: int = 5, fsync: bool = False, name: str = 'file') -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.fsync = fsync
+        self.name = name
+        self._file: BinaryIO | None = None
+        self._lock = asyncio.Lock()
+
+    async def start(self) -> None:
+        directory = os.path.dirname(self.path)
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._file = open(self.path, 'ab')
+
+    async def close(self) -> None:
+        async with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    async def write(self, records: List[bytes]) -> None:
+        data = b'\n'.join(records) + b'\n'
+
+        async with self._lock:
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, self._write, data)
+            except OSError as e:
+                raise SinkUnavailableError(f'Could not write to {self.path}. {e.__class__.__name__}: {e}') from e
+
+    def _write(self, data: bytes) -> None:
+        assert self._file is not None, 'Sink must be started before writing to it.'
+
+        if self.max_bytes and self._file.tell() > 0 and self._file.tell() + len(data) > self.max_bytes:
+            self._rotate()
+
+        self._file.write(data)
+        self._file.flush()
+
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def _rotate(self) -> None:
+        assert self._file is not None
+        self._file.close()
+
+        if self.backup_count > 0:
+            for index in range(self.backup_count - 1, 0, -1):
+                source = f'{self.path}.{index}'
+
+                if os.path.exists(source):
+                    os.replace(source, f'{self.path}.{index + 1}')
+
+            os.replace(self.path, f'{self.path}.1')
+        else:
+            os.remove(self.path)
+
+        self._file = open(self.path, 'ab')
@@ -0,0 +1,57 @@
+import asyncio
+from typing import List
+
+import aiohttp
+
+from metrics import UPLINK_RESPONSES
+
+from .base import BaseSink
+from .exceptions import SinkRejectedError, SinkUnavailableError
+
+# Status codes that mean backend might accept the same batch later.
+RETRYABLE_STATUS_CODES = frozenset({408, 429, 500, 502, 503, 504})
+
+
+class HttpBatchSink(BaseSink):
+    """Sink that posts every batch to an HTTP endpoint as a single JSON array.
+
+    Attributes:
+        url:
+            URL of HTTP server endpoint that accepts a JSON array of location payloads.
+        client_session:
+            Aiohttp session used to send batches, created by `start`.
+    """
+
+    def __init__(self, url: str, name: str = 'http') -> None:
+        self.url = url
+        self.name = name
+        self.client_session: aiohttp.ClientSession | None = None
+
+    async def start(self) -> None:
+        self.client_session = aiohttp.ClientSession()
+
+    async def close(self) -> None:
+        if self.client_session is not None:
+            await self.client_session.close()
+            self.client_session = None
+
+    async def write(self, records: List[bytes]) -> None:
+        assert self.client_session is not None, 'Sink must be started before writing to it.'
+        data = b'[' + b','.join(records) + b']'
+
+        try:
+            async with self.client_session.post(self.url, data=data, headers={'Content-Type': 'application/json'}) as response:
+                status = response.status
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            UPLINK_RESPONSES.labels('error').inc()
+            raise SinkUnavailableError(f'Could not reach backend. {e.__class__.__name__}: {e}') from e
+
+        UPLINK_RESPONSES.labels(str(status)).inc()
+
+        if status in (200, 201):
+            return
+
+        if status in RETRYABLE_STATUS_CODES:
+            raise SinkUnavailableError(f'Backend returned status code {status}.')
+
+        raise SinkRejectedError(f'Backend returned status code {status}.')
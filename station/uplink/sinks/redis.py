@@ -0,0 +1,98 @@
+import asyncio
+from typing import List
+
+from .base import BaseSink
+from .exceptions import SinkRejectedError, SinkUnavailableError
+
+
+def encode_bulk_string(value: bytes) -> bytes:
+    return b'$%d\r\n%s\r\n' % (len(value), value)
+
+
+def encode_command(*arguments: bytes) -> bytes:
+    """Encode a command as a RESP array of bulk strings."""
+    return b'*%d\r\n' % len(arguments) + b''.join(map(encode_bulk_string, arguments))
+
+
+class RedisStreamSink(BaseSink):
+    """Sink that appends payloads to a Redis stream, speaking RESP directly over a single connection.
+
+    Every payload becomes one `XADD <stream> [MAXLEN ~ <maxlen>] * payload <json>` entry. Commands of a batch
+    are pipelined in one write and their replies are read afterwards, batches are sent one at a time. Any server
+    that implements `XADD` over RESP (Redis, KeyDB, Dragonfly, ...) can be used. Connection is (re)opened lazily,
+    so a batch whose connection broke half way through is retried whole and some entries might be added twice.
+
+    Attributes:
+        host:
+            Host of the server.
+        port:
+            Port of the server.
+        stream:
+            Key of the stream payloads are added to.
+        maxlen:
+            Approximate maximum length of the stream, older entries are trimmed by the server. `0` disables trimming.
+        timeout:
+            Seconds to wait for connecting and for replies of a batch.
+    """
+
+    def __init__(self, host: str, port: int, stream: str, maxlen: int = 0, timeout: float = 10.0, name: str = 'redis') -> None:
+        self.host = host
+        self.port = port
+        self.stream = stream
+        self.maxlen = maxlen
+        self.timeout = timeout
+        self.name = name
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+        self._lock = asyncio.Lock()
+
+        trim = (b'MAXLEN', b'~', str(maxlen).encode()) if maxlen else ()
+        # Everything but the payload is the same for every command, encode it once.
+        self._command_prefix = encode_command(b'XADD', stream.encode(), *trim, b'*', b'payload', b'').removesuffix(encode_bulk_string(b''))
+
+    async def close(self) -> None:
+        async with self._lock:
+            await self._disconnect()
+
+    async def write(self, records: List[bytes]) -> None:
+        data = b''.join(self._command_prefix + encode_bulk_string(record) for record in records)
+
+        async with self._lock:
+            try:
+                await asyncio.wait_for(self._write(data, len(records)), self.timeout)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+                await self._disconnect()
+                raise SinkUnavailableError(f'Could not add payloads to stream {self.stream} at {self.host}:{self.port}. {e.__class__.__name__}: {e}') from e
+
+    async def _write(self, data: bytes, reply_count: int) -> None:
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+
+        assert self._reader is not None
+        self._writer.write(data)
+        await self._writer.drain()
+
+        errors: List[str] = []
+
+        # Every reply has to be read, even after an error, otherwise they would be mistaken for replies to the next batch.
+        for _ in range(reply_count):
+            reply = await self._reader.readuntil(b'\r\n')
+
+            if reply.startswith(b'$'):
+                await self._reader.readexactly(int(reply[1:-2]) + 2)
+            elif reply.startswith(b'-'):
+                errors.append(reply[1:-2].decode(errors='replace'))
+
+        if errors:
+            raise SinkRejectedError(f'Server rejected {len(errors)} of {reply_count} payloads. First error: {errors[0]}')
+
+    async def _disconnect(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+
+            try:
+                await self._writer.wait_closed()
+            except OSError:
+                pass
+
+        self._reader, self._writer = None, None
@@ -0,0 +1,60 @@
+import asyncio
+from typing import List
+
+from .base import BaseSink
+from .exceptions import SinkUnavailableError
+
+
+class UnixSocketSink(BaseSink):
+    """Sink that streams payloads as newline-delimited JSON to a local Unix socket.
+
+    Meant for a consumer running on the same host, e.g. a sidecar that forwards payloads to a message broker.
+    There are no acknowledgements, a batch counts as written once it is handed over to the kernel, so
+    backpressure comes from the socket buffer (`drain`) when the consumer falls behind. Connection is
+    (re)opened lazily and batches are written one at a time, so lines of different batches never interleave.
+
+    Attributes:
+        path:
+            Filesystem path of the socket.
+        timeout:
+            Seconds to wait for connecting and for the consumer to accept a batch.
+    """
+
+    def __init__(self, path: str, timeout: float = 10.0, name: str = 'unix') -> None:
+        self.path = path
+        self.timeout = timeout
+        self.name = name
+        self._writer: asyncio.StreamWriter | None = None
+        self._lock = asyncio.Lock()
+
+    async def close(self) -> None:
+        async with self._lock:
+            await self._disconnect()
+
+    async def write(self, records: List[bytes]) -> None:
+        data = b'\n'.join(records) + b'\n'
+
+        async with self._lock:
+            try:
+                await asyncio.wait_for(self._write(data), self.timeout)
+            except (OSError, asyncio.TimeoutError) as e:
+                await self._disconnect()
+                raise SinkUnavailableError(f'Could not write to socket {self.path}. {e.__class__.__name__}: {e}') from e
+
+    async def _write(self, data: bytes) -> None:
+        if self._writer is None:
+            _, self._writer = await asyncio.open_unix_connection(self.path)
+
+        self._writer.write(data)
+        await self._writer.drain()
+
+    async def _disconnect(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+
+            try:
+                await self._writer.wait_closed()
+            except OSError:
+                pass
+
+        self._writer = None
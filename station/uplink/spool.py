@@ -0,0 +1,299 @@
+import asyncio
+import os
+from typing import BinaryIO, List, Tuple
+
+from logger import logger
+
+SEGMENT_SUFFIX = '.spool'
+CURSOR_FILENAME = 'cursor'
+
+# (segment id, offset in bytes), points at the first record that was not acknowledged yet.
+Cursor = Tuple[int, int]
+
+
+class UplinkSpool:
+    """Append-only, segmented on-disk log of serialized location payloads waiting to be sent uplink.
+
+    Records are stored one per line in segment files named after their sequence number, a new segment
+    is started once the current one reaches `segment_size`. Appends are buffered and synced to disk
+    in batches by a background task, so durability costs one `fsync` per `fsync_interval` instead of
+    one per payload. Records are read back in the order they were appended, segments whose records were
+    all acknowledged are deleted. When total size of the spool exceeds `max_size`, oldest segments are
+    dropped, that keeps disk usage bounded during long backend outages.
+
+    Attributes:
+        directory:
+            Directory that holds segment files and the acknowledgement cursor.
+        segment_size:
+            Size in bytes after which a new segment is started.
+        max_size:
+            Maximum total size of all segments in bytes.
+        fsync_interval:
+            Maximum amount of seconds appended records can stay in OS buffers.
+        cursor:
+            Position of the first record that was not acknowledged yet.
+        dropped:
+            Total amount of segments dropped because `max_size` was exceeded.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        segment_size: int = 16_000_000,
+        max_size: int = 1_000_000_000,
+        fsync_interval: float = 1.0,
+    ) -> None:
+        self.directory = directory
+        self.segment_size = segment_size
+        self.max_size = max_size
+        self.fsync_interval = fsync_interval
+        self.dropped = 0
+
+        os.makedirs(directory, exist_ok=True)
+
+        self._segments: List[int] = sorted(
+            int(filename.removesuffix(SEGMENT_SUFFIX)) for filename in os.listdir(directory) if filename.endswith(SEGMENT_SUFFIX)
+        )
+        self._segment_sizes = {segment_id: os.path.getsize(self._segment_path(segment_id)) for segment_id in self._segments}
+        self.cursor: Cursor = self._load_cursor()
+        self._records_available = asyncio.Event()
+        # Appends are counted, so that `sync` can tell whether records appended before it was called are on disk yet.
+        self._appended = 0
+        self._synced = 0
+        self._sync_future: asyncio.Future | None = None
+        self._sync_task: asyncio.Task | None = None
+
+        # Last segment might end with a partially written record if station crashed, never append after it.
+        if not self._segments or self._segment_ends_with_partial_record(self._segments[-1]):
+            self._segments.append(self._segments[-1] + 1 if self._segments else 0)
+            self._segment_sizes[self._segments[-1]] = 0
+
+        self._write_file: BinaryIO = open(self._segment_path(self._segments[-1]), 'ab')
+
+        if self.has_pending:
+            self._records_available.set()
+
+    @property
+    def has_pending(self) -> bool:
+        """Whether spool contains records that were not acknowledged yet."""
+        return self.cursor != (self._segments[-1], self._segment_sizes[self._segments[-1]])
+
+    @property
+    def size(self) -> int:
+        """Total size of all segments in bytes."""
+        return sum(self._segment_sizes.values())
+
+    def start(self) -> None:
+        """Start background task that syncs appended records to disk, must be called from within a running event loop."""
+        self._sync_task = asyncio.create_task(self._sync_periodically())
+
+    async def close(self) -> None:
+        """Sync appended records to disk and close the spool."""
+        if self._sync_task is not None:
+            self._sync_task.cancel()
+            await asyncio.gather(self._sync_task, return_exceptions=True)
+
+        await self.sync()
+        self._write_file.close()
+
+    def append(self, records: List[bytes]) -> None:
+        """Append serialized records to the spool.
+
+        Records are written to OS buffers right away and synced to disk by the background task, or by `sync`.
+
+        Args:
+            records:
+                Serialized location payloads, none of them may contain a newline.
+        """
+        data = b'\n'.join(records) + b'\n'
+        segment_id = self._segments[-1]
+
+        self._write_file.write(data)
+        self._segment_sizes[segment_id] += len(data)
+        self._appended += 1
+        self._records_available.set()
+
+        if self._segment_sizes[segment_id] >= self.segment_size:
+            self._start_new_segment()
+
+        if self.size > self.max_size:
+            self._drop_oldest_segments()
+
+    def read_batch(self, max_records: int) -> Tuple[List[bytes], Cursor]:
+        """Read oldest records that were not acknowledged yet.
+
+        Args:
+            max_records:
+                Maximum amount of records to read.
+
+        Returns:
+            Records in the order they were appended, and the cursor that should be passed
+            to `acknowledge` once they are delivered.
+        """
+        self._write_file.flush()
+
+        records: List[bytes] = []
+        segment_id, offset = self._current_cursor(self.cursor)
+
+        while True:
+            with open(self._segment_path(segment_id), 'rb') as segment:
+                segment.seek(offset)
+
+                for line in segment:
+                    # Partially written record, either still being written or left behind by a crash.
+                    if not line.endswith(b'\n'):
+                        break
+
+                    records.append(line[:-1])
+                    offset += len(line)
+
+                    if len(records) >= max_records:
+                        return records, (segment_id, offset)
+
+            if segment_id == self._segments[-1]:
+                return records, (segment_id, offset)
+
+            segment_id = self._segments[self._segments.index(segment_id) + 1]
+            offset = 0
+
+    def acknowledge(self, cursor: Cursor) -> None:
+        """Mark records up to `cursor` as delivered and delete segments that no longer hold any pending records.
+
+        Args:
+            cursor:
+                Cursor returned by `read_batch`.
+        """
+        # Records were read before `max_size` dropped their segment and moved the cursor past them, nothing is left to acknowledge.
+        if cursor < self.cursor:
+            return
+
+        segment_id, offset = cursor
+
+        # Segment that was read to its end will never get new records, move on so that it can be deleted.
+        if segment_id != self._segments[-1] and offset >= self._segment_sizes[segment_id]:
+            cursor = (self._segments[self._segments.index(segment_id) + 1], 0)
+
+        self.cursor = cursor
+
+        while self._segments[0] < cursor[0]:
+            self._delete_segment(self._segments[0])
+
+        self._save_cursor()
+
+        if not self.has_pending:
+            self._records_available.clear()
+
+    async def wait_for_records(self) -> None:
+        """Wait until spool has records that were not acknowledged yet."""
+        await self._records_available.wait()
+
+    async def sync(self) -> None:
+        """Flush appended records to disk, returns once every record appended before the call is synced.
+
+        Concurrent calls share a single `fsync`, a call made while one is in progress waits for it and starts the next one.
+
+        Raises:
+            OSError: If records could not be synced.
+        """
+        appended = self._appended
+
+        while self._synced < appended:
+            if self._sync_future is None:
+                self._sync_future = asyncio.ensure_future(self._fsync())
+
+            # Shielded, so that a cancelled caller does not cancel `fsync` other callers wait for.
+            await asyncio.shield(self._sync_future)
+
+    async def _fsync(self) -> None:
+        appended = self._appended
+
+        try:
+            self._write_file.flush()
+            # Segment may be closed by an append while it is being synced, its own descriptor keeps the file open.
+            await asyncio.get_running_loop().run_in_executor(None, fsync_descriptor, os.dup(self._write_file.fileno()))
+            # Records of previous segments were synced when they were closed.
+            self._synced = max(self._synced, appended)
+        finally:
+            self._sync_future = None
+
+    async def _sync_periodically(self) -> None:
+        while True:
+            await asyncio.sleep(self.fsync_interval)
+
+            try:
+                await self.sync()
+            except OSError as e:
+                logger.critical('Could not sync uplink spool to disk. %s: %s', e.__class__.__name__, e)
+
+    def _start_new_segment(self) -> None:
+        self._write_file.flush()
+        os.fsync(self._write_file.fileno())
+        self._write_file.close()
+
+        segment_id = self._segments[-1] + 1
+        self._segments.append(segment_id)
+        self._segment_sizes[segment_id] = 0
+        self._write_file = open(self._segment_path(segment_id), 'ab')
+
+    def _drop_oldest_segments(self) -> None:
+        while self.size > self.max_size and len(self._segments) > 1:
+            segment_id = self._segments[0]
+            self._delete_segment(segment_id)
+            self.dropped += 1
+            logger.critical('Uplink spool exceeded its maximum size of %s bytes. Dropped segment %s with payloads that were not sent.', self.max_size, segment_id)
+
+            if self.cursor[0] <= segment_id:
+                self.cursor = (self._segments[0], 0)
+                self._save_cursor()
+
+    def _current_cursor(self, cursor: Cursor) -> Cursor:
+        """Return `cursor`, or start of the oldest segment if the segment `cursor` points at was already dropped."""
+        if cursor[0] not in self._segment_sizes:
+            return (self._segments[0], 0)
+
+        return cursor
+
+    def _delete_segment(self, segment_id: int) -> None:
+        os.remove(self._segment_path(segment_id))
+        self._segments.remove(segment_id)
+        del self._segment_sizes[segment_id]
+
+    def _segment_path(self, segment_id: int) -> str:
+        return os.path.join(self.directory, f'{segment_id:020d}{SEGMENT_SUFFIX}')
+
+    def _segment_ends_with_partial_record(self, segment_id: int) -> bool:
+        if self._segment_sizes[segment_id] == 0:
+            return False
+
+        with open(self._segment_path(segment_id), 'rb') as segment:
+            segment.seek(-1, os.SEEK_END)
+            return segment.read(1) != b'\n'
+
+    def _load_cursor(self) -> Cursor:
+        try:
+            with open(os.path.join(self.directory, CURSOR_FILENAME)) as cursor_file:
+                segment_id, offset = (int(value) for value in cursor_file.read().split())
+        except FileNotFoundError:
+            segment_id, offset = -1, 0
+
+        # Segment that cursor points at might have been deleted or never existed.
+        if segment_id not in self._segment_sizes:
+            return (self._segments[0], 0) if self._segments else (0, 0)
+
+        return segment_id, offset
+
+    def _save_cursor(self) -> None:
+        path = os.path.join(self.directory, CURSOR_FILENAME)
+
+        with open(f'{path}.tmp', 'w') as cursor_file:
+            cursor_file.write(f'{self.cursor[0]} {self.cursor[1]}')
+
+        os.replace(f'{path}.tmp', path)
+
+
+def fsync_descriptor(descriptor: int) -> None:
+    """Sync a file to disk and close the descriptor."""
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
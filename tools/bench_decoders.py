@@ -0,0 +1,187 @@
+"""Differential check and microbenchmark of H02 packet decoders.
+
+Checks that `decode_h02_ascii_packet` returns the same payload (or raises the same exception)
+as the reference `decode_h02_ascii_packet_regex` on a corpus of valid and malformed packets,
+then reports packets/sec of each ASCII decoder and of `decode_h02_binary_packet`.
+With `--output`, results are also written to a JSON file so they can be compared across commits
+(`--compare` prints the change against such a file).
+By default every packet has random IMEI, status and cell, `--devices N` draws them from N simulated devices instead,
+like real traffic where every device sends the same IMEI and a few status words and cells over and over again.
+
+Run from the repository root: `python tools/bench_decoders.py`
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from typing import Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'station'))
+
+from protocols.h02.packet_decoder.decoders.ascii_decoder import decode_h02_ascii_packet, decode_h02_ascii_packet_regex  # noqa: E402
+from protocols.h02.packet_decoder.decoders.binary_decoder import decode_h02_binary_packet  # noqa: E402
+
+
+# IMEI (10 digits), status word (8 hex digits) and cell (MCC, MNC, LAC, cell ID) of a simulated device.
+Device = Tuple[str, str, Tuple[str, str, str, str]]
+
+
+def generate_device(rng: random.Random) -> Device:
+    """Generate random values a device repeats in its packets."""
+    return (
+        f'{rng.randint(0, 10 ** 10 - 1):010d}',
+        ''.join(rng.choice('0123456789ABCDEFabcdef') for _ in range(8)),
+        (str(rng.randint(0, 999)), str(rng.randint(0, 99)), str(rng.randint(0, 65535)), str(rng.randint(0, 65535))),
+    )
+
+
+def generate_ascii_packet(rng: random.Random, devices: List[Device]) -> bytes:
+    """Generate a valid H02 ASCII mode packet with random field values, repeated ones come from `devices` if any."""
+    imei, status, cell = rng.choice(devices) if devices else generate_device(rng)
+    # Devices report hemisphere with N/S and E/W, signed coordinates are rare.
+    sign = '-' if rng.random() < 0.02 else ''
+    latitude = f'{sign}{rng.randint(0, 89):02d}{rng.randint(0, 59):02d}.{rng.randint(0, 9999):04d}'
+    longitude_degrees = rng.randint(0, 179)
+    longitude_degrees = f'{longitude_degrees:03d}' if rng.random() < 0.8 else f'{longitude_degrees % 100:02d}'
+    longitude = f'{sign}{longitude_degrees}{rng.randint(0, 59):02d}.{rng.randint(0, 9999):04d}'
+    speed = f'{rng.randint(0, 10 ** rng.randint(1, 3) - 1):0{rng.randint(1, 3)}d}.{rng.randint(0, 99):02d}'
+    fields = [
+        '*HQ',
+        imei,
+        f'V{rng.randint(0, 9)}',
+        f'{rng.randint(0, 235959):06d}',
+        rng.choice('AV'),
+        latitude,
+        rng.choice('NS'),
+        longitude,
+        rng.choice('EW'),
+        speed,
+        str(rng.randint(0, 359)),
+        f'{rng.randint(0, 311299):06d}',
+        status,
+        *cell,
+    ]
+
+    if rng.random() < 0.3:
+        fields.append(str(rng.randint(0, 99)))
+
+    return (','.join(fields) + rng.choice(['#', '#', '#', '#\n'])).encode()
+
+
+def generate_binary_packet(rng: random.Random, devices: List[Device]) -> bytes:
+    """Generate a valid H02 binary (standard) mode packet with random field values, repeated ones come from `devices` if any."""
+    imei, status, _ = rng.choice(devices) if devices else generate_device(rng)
+    digits = (
+        f'{imei}'  # IMEI
+        f'{rng.randint(0, 235959):06d}{rng.randint(0, 311299):06d}'  # time and date
+        f'{rng.randint(0, 89):02d}{rng.randint(0, 59):02d}{rng.randint(0, 9999):04d}'  # latitude
+        f'{rng.randint(0, 99):02d}'  # battery
+        f'{rng.randint(0, 179):03d}{rng.randint(0, 59):02d}{rng.randint(0, 9999):04d}{rng.randint(0, 15):x}'  # longitude and flags
+        f'{rng.randint(0, 999):03d}{rng.randint(0, 359):03d}'  # speed and direction
+    )
+
+    # Status word is followed by bytes that are not decoded.
+    return b'$' + bytes.fromhex(digits) + bytes.fromhex(status) + rng.randbytes(16)
+
+
+def corrupt_packet(rng: random.Random, packet: bytes) -> bytes:
+    """Apply a random corruption to a packet."""
+    position = rng.randrange(len(packet))
+
+    match rng.randint(0, 5):
+        case 0:
+            return packet[:position]
+        case 1:
+            return packet[:position] + bytes([rng.randrange(256)]) + packet[position + 1:]
+        case 2:
+            return packet[:position] + rng.choice([b',', b'.', b'#', b'-', b'x', b'\n']) + packet[position:]
+        case 3:
+            return packet[:position] + packet[position + 1:]
+        case 4:
+            # Non-ASCII digit that `\d` matches.
+            return packet[:position] + '٣'.encode() + packet[position + 1:]
+        case _:
+            return packet[:position] + rng.choice([b'.', b',', b'/']) + packet[position + 1:]
+
+
+def decode_or_exception(decoder: Callable[[bytes], object], packet: bytes) -> object:
+    try:
+        return decoder(packet)
+    except Exception as e:
+        return (e.__class__, str(e))
+
+
+def check_corpus(corpus: List[bytes]) -> int:
+    """Return number of packets that decoders disagree on, printing each of them."""
+    mismatches = 0
+
+    for packet in corpus:
+        expected = decode_or_exception(decode_h02_ascii_packet_regex, packet)
+        actual = decode_or_exception(decode_h02_ascii_packet, packet)
+
+        if expected != actual:
+            mismatches += 1
+            print(f'MISMATCH {packet!r}\n  regex: {expected}\n  fast:  {actual}')
+
+    return mismatches
+
+
+def benchmark(decoder: Callable[[bytes], object], corpus: List[bytes], repeat: int) -> float:
+    """Return packets/sec of `decoder` on valid `corpus`."""
+    started = time.perf_counter()
+
+    for _ in range(repeat):
+        for packet in corpus:
+            decoder(packet)
+
+    return len(corpus) * repeat / (time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--packets', type=int, default=20_000, help='number of valid packets to generate')
+    parser.add_argument('--devices', type=int, default=0, help='draw IMEI, status and cell of packets from this many devices, 0 for random ones')
+    parser.add_argument('--repeat', type=int, default=5, help='benchmark passes over the valid packets')
+    parser.add_argument('--output', help='write packets/sec of every decoder to a JSON file')
+    parser.add_argument('--compare', help='JSON file written by `--output` (e.g. on another commit) to compare results with')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    devices = [generate_device(rng) for _ in range(args.devices)]
+    valid = [generate_ascii_packet(rng, devices) for _ in range(args.packets)]
+    corrupted = [corrupt_packet(rng, packet) for packet in valid]
+
+    mismatches = check_corpus(valid + corrupted)
+    print(f'differential check: {len(valid) + len(corrupted)} packets, {mismatches} mismatches')
+
+    binary = [generate_binary_packet(rng, devices) for _ in range(args.packets)]
+    baseline: Dict[str, float] = {}
+    results: Dict[str, float] = {}
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+
+    for name, decoder, corpus in (
+        ('regex', decode_h02_ascii_packet_regex, valid),
+        ('fast', decode_h02_ascii_packet, valid),
+        ('binary', decode_h02_binary_packet, binary),
+    ):
+        results[name] = benchmark(decoder, corpus, args.repeat)
+        change = f' ({results[name] / baseline[name] - 1:+.1%})' if name in baseline else ''
+        print(f'{name:>6}: {results[name]:,.0f} packets/sec{change}')
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
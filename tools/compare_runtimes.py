@@ -0,0 +1,117 @@
+"""Compare ACK latency and throughput of the station running in different runtime modes.
+
+Starts a stub backend (`stub_sinks.py`), then for every mode starts the station with that mode's environment,
+puts it under the same simulated fleet (`load_fleet.py`) and prints a table of the results.
+Modes are combinations of `EVENT_LOOP` (`asyncio`, `uvloop`) and `TCP_NODELAY` (`0`, `1`),
+modes that need uvloop are skipped when it is not installed.
+
+Run from the repository root: `python tools/compare_runtimes.py --devices 2000 --rate 1 --duration 30`
+"""
+
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from importlib.util import find_spec
+from typing import Dict, List
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+MODES = (
+    {'EVENT_LOOP': 'asyncio', 'TCP_NODELAY': '0'},
+    {'EVENT_LOOP': 'asyncio', 'TCP_NODELAY': '1'},
+    {'EVENT_LOOP': 'uvloop', 'TCP_NODELAY': '0'},
+    {'EVENT_LOOP': 'uvloop', 'TCP_NODELAY': '1'},
+)
+
+
+def run_mode(mode: Dict[str, str], args: argparse.Namespace, directory: str) -> Dict:
+    """Run the station in a mode under load and return results reported by `load_fleet.py`."""
+    output = os.path.join(directory, 'results.json')
+    environment = {
+        **os.environ,
+        **mode,
+        'PYTHONPATH': os.path.join(ROOT, 'station'),
+        'GPS_STATION_PORT': str(args.port),
+        'GPS_STATION_WORKERS': str(args.workers),
+        'BACKEND_BATCH_URL': f'http://127.0.0.1:{args.backend_port}/batch',
+    }
+    # Station writes its logs to `logs/` of its working directory.
+    os.makedirs(os.path.join(directory, 'logs'), exist_ok=True)
+    station = subprocess.Popen([sys.executable, os.path.join(ROOT, 'station', 'main.py')], cwd=directory, env=environment, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    try:
+        time.sleep(args.startup)
+        subprocess.run([
+            sys.executable, os.path.join(ROOT, 'tools', 'load_fleet.py'),
+            '--port', str(args.port),
+            '--devices', str(args.devices),
+            '--rate', str(args.rate),
+            '--duration', str(args.duration),
+            '--ramp-up', str(args.ramp_up),
+            '--interval', str(args.duration),
+            '--stub-port', '0',
+            '--pid', str(station.pid),
+            '--output', output,
+        ], check=True, stdout=subprocess.DEVNULL)
+    finally:
+        station.send_signal(signal.SIGTERM)
+
+        try:
+            station.wait(30)
+        except subprocess.TimeoutExpired:
+            station.kill()
+
+    with open(output) as file:
+        return json.load(file)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8190, help='port station listens on')
+    parser.add_argument('--backend-port', type=int, default=8765, help='port of the stub backend')
+    parser.add_argument('--workers', type=int, default=1, help='worker processes of the station')
+    parser.add_argument('--devices', type=int, default=1000)
+    parser.add_argument('--rate', type=float, default=1.0, help='records per second of every device')
+    parser.add_argument('--duration', type=float, default=20.0)
+    parser.add_argument('--ramp-up', type=float, default=5.0)
+    parser.add_argument('--startup', type=float, default=2.0, help='seconds to give the station to start')
+    parser.add_argument('--output', help='write results of every mode to a JSON file')
+    args = parser.parse_args()
+
+    backend = subprocess.Popen([sys.executable, os.path.join(ROOT, 'tools', 'stub_sinks.py'), '--http-port', str(args.backend_port), '--resp-port', '0', '--unix-path', os.path.join(tempfile.gettempdir(), f'gps-station-compare-{os.getpid()}.sock')], stdout=subprocess.DEVNULL)
+    results: List[Dict] = []
+
+    try:
+        for mode in MODES:
+            if mode['EVENT_LOOP'] == 'uvloop' and find_spec('uvloop') is None:
+                print(f'Skipping {mode}, uvloop is not installed.')
+                continue
+
+            with tempfile.TemporaryDirectory() as directory:
+                result = run_mode(mode, args, directory)
+
+            results.append({'mode': mode, **result})
+            latency = result['ack_latency_ms']
+            cpu = sum(process['cpu_percent'] for process in result['processes'].values())
+            rss = sum(process['max_rss_bytes'] for process in result['processes'].values())
+            print(
+                f'EVENT_LOOP={mode["EVENT_LOOP"]:<7} TCP_NODELAY={mode["TCP_NODELAY"]}: acked {result["acked_per_second"]:>8,.0f}/s  '
+                f'ack p50 {latency.get("p50", 0):6.2f}ms p99 {latency.get("p99", 0):7.2f}ms p99.9 {latency.get("p99.9", 0):7.2f}ms  '
+                f'cpu {cpu:4.0f}%  rss {rss / 1_048_576:5.0f}MB',
+                flush=True,
+            )
+    finally:
+        backend.terminate()
+        backend.wait()
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    main()
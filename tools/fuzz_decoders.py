@@ -0,0 +1,421 @@
+"""Fuzzing and differential correctness harness of H02 decoding, with throughput of every decoder.
+
+Records are generated from known field values by a reference encoder and every check compares what
+station code makes of them with what they were built from:
+
+- round trip: ASCII and binary records decode to the values they were encoded from, with both ASCII decoders;
+- differential: fast and regex ASCII decoders (and the NumPy bulk decoder against the binary one) agree on valid and corrupted records;
+- robustness: corrupted and truncated records only ever raise `RegExMatchError`, `BadProtocolError` or `UnicodeDecodeError`;
+- framing: a stream of records, separators and garbage split into reads at random gives the same records as reading it at once;
+- matching: protocol identification never raises, recognizes every record and rejects bytes that are not H02.
+
+Decoders under test can be swapped with `--ascii-decoder`/`--binary-decoder module:function`, so a faster decoder
+is checked against the same records before it replaces the current one. Packets/sec of every decoder is reported
+for valid and corrupted records, `--output`/`--compare` work like in `bench_decoders.py`.
+Failing records are printed with the seed and round that produced them, exit status is 1 if any check failed.
+
+Run from the repository root: `python tools/fuzz_decoders.py --rounds 10`
+"""
+
+import argparse
+import importlib
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter
+from decimal import Decimal
+from typing import Callable, Dict, List, NamedTuple, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'station'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_decoders import corrupt_packet  # noqa: E402
+from matcher import registry  # noqa: E402
+from protocols import H02Protocol  # noqa: E402
+from protocols.exceptions import RegExMatchError, BadProtocolError  # noqa: E402
+from protocols.h02.framer import H02RecordFramer, BINARY_RECORD_LENGTH  # noqa: E402
+from protocols.h02.packet_decoder.decoders.ascii_decoder import decode_h02_ascii_packet_regex  # noqa: E402
+from protocols.h02.packet_decoder.decoders.bulk_decoder import numpy, decode_h02_binary_records  # noqa: E402
+
+# Exceptions decoders are allowed to raise on malformed records, anything else would escape the protocol loop.
+EXPECTED_EXCEPTIONS = (RegExMatchError, BadProtocolError, UnicodeDecodeError)
+
+# `(byte, bit)` of every flag in the status word, counted from 1 like H02 documentation does, flags use negative logic.
+STATUS_BITS = {
+    'accessories_off': (3, 3),
+    'cut_fuel': (1, 4),
+    'shock_alarm': (2, 2),
+    'battery_cut_off': (2, 4),
+}
+
+# Failing records printed per check, the rest are only counted.
+MAX_REPORTED = 5
+
+
+class Fix(NamedTuple):
+    """Field values a record is encoded from, coordinates are minutes scaled by 10 000 like devices send them."""
+
+    imei: str
+    time: str
+    date: str
+    valid: bool
+    latitude_degrees: int
+    latitude_minutes: int
+    longitude_degrees: int
+    longitude_minutes: int
+    speed: int  # ASCII mode: hundredths of a knot, binary mode: knots
+    direction: int
+    status: int
+    cell: Tuple[str, str, str, str]
+
+
+def generate_fix(rng: random.Random, binary: bool = False) -> Fix:
+    """Generate field values of a record, edge values (zeros, maximums) are drawn more often than uniformly."""
+
+    def number(maximum: int) -> int:
+        return rng.choice((0, maximum, rng.randint(0, maximum), rng.randint(0, maximum), rng.randint(0, maximum)))
+
+    return Fix(
+        f'{number(10 ** 10 - 1):010d}',
+        f'{number(23):02d}{number(59):02d}{number(59):02d}',
+        f'{number(31):02d}{number(12):02d}{number(99):02d}',
+        rng.random() < 0.8,
+        number(89),
+        number(599_999),
+        number(179),
+        number(599_999),
+        number(999) if binary else number(10 ** rng.randint(1, 3) * 100 - 1),
+        number(359),
+        number(2 ** 32 - 1),
+        (str(number(999)), str(number(99)), str(number(65535)), str(number(65535))),
+    )
+
+
+def encode_ascii_record(rng: random.Random, fix: Fix) -> bytes:
+    """Encode `fix` as an ASCII mode record, optional parts of the format (padding, trailing field, newline) are random."""
+    latitude = f'{fix.latitude_degrees:02d}{fix.latitude_minutes // 10_000:02d}.{fix.latitude_minutes % 10_000:04d}'
+    # Longitude degrees have three digits, some devices only send two below 100.
+    longitude_width = 2 if fix.longitude_degrees < 100 and rng.random() < 0.3 else 3
+    longitude = f'{fix.longitude_degrees:0{longitude_width}d}{fix.longitude_minutes // 10_000:02d}.{fix.longitude_minutes % 10_000:04d}'
+    knots, hundredths = divmod(fix.speed, 100)
+    fields = [
+        '*HQ',
+        fix.imei,
+        f'V{rng.randint(0, 9)}',
+        fix.time,
+        'A' if fix.valid else 'V',
+        latitude,
+        rng.choice('NS'),
+        longitude,
+        rng.choice('EW'),
+        f'{knots:0{rng.randint(len(str(knots)), 3)}d}.{hundredths:02d}',
+        f'{fix.direction:0{rng.randint(len(str(fix.direction)), 3)}d}',
+        fix.date,
+        f'{fix.status:08X}' if rng.random() < 0.5 else f'{fix.status:08x}',
+        *fix.cell,
+    ]
+
+    if rng.random() < 0.3:
+        fields.append(str(rng.randint(0, 99)))
+
+    return (','.join(fields) + rng.choice(('#', '#', '#\n'))).encode()
+
+
+def encode_binary_record(rng: random.Random, fix: Fix) -> bytes:
+    """Encode `fix` as a binary (standard mode) record, bytes that are not decoded are random."""
+    # Flags nibble: bit 1 is validity, the others are hemispheres and battery state that are not decoded.
+    flags = rng.randint(0, 15) & ~0b10 | (0b10 if fix.valid else 0)
+    digits = (
+        f'{fix.imei}{fix.time}{fix.date}'
+        f'{fix.latitude_degrees:02d}{fix.latitude_minutes:06d}'
+        f'{rng.randint(0, 99):02d}'  # battery
+        f'{fix.longitude_degrees:03d}{fix.longitude_minutes:06d}{flags:x}'
+        f'{fix.speed:03d}{fix.direction:03d}'
+    )
+
+    return b'$' + bytes.fromhex(digits) + fix.status.to_bytes(4, 'big') + rng.randbytes(BINARY_RECORD_LENGTH - 29)
+
+
+def expected_fields(fix: Fix, binary: bool) -> Dict[str, object]:
+    """Return values payload decoded from a record of `fix` must have, computed without any decoder code."""
+    status_bytes = fix.status.to_bytes(4, 'big')
+    knots = Decimal(fix.speed) if binary else Decimal(fix.speed) / 100
+
+    return {
+        # Decoders do not apply hemispheres, coordinates are always positive.
+        'latitude': fix.latitude_degrees + Decimal(fix.latitude_minutes) / 600_000,
+        'longitude': fix.longitude_degrees + Decimal(fix.longitude_minutes) / 600_000,
+        'speed': knots * Decimal('1.852'),
+        'device_serial_number': fix.imei,
+        'time': fix.time,
+        'valid': fix.valid,
+        **{name: not status_bytes[byte - 1] >> bit - 1 & 1 for name, (byte, bit) in STATUS_BITS.items()},
+        **({} if binary else {
+            'direction': fix.direction,
+            'mobile_country_code': fix.cell[0],
+            'mobile_network_code': fix.cell[1],
+            'local_area_code': fix.cell[2],
+            'cell_id': fix.cell[3],
+        }),
+    }
+
+
+def field_mismatches(expected: Dict[str, object], payload) -> List[str]:
+    """Return `field: expected != actual` for every field of `payload` that does not match, exact values are rounded to the decoders' precision."""
+    mismatches = []
+
+    for name, value in expected.items():
+        actual = getattr(payload, name)
+
+        if name == 'direction':
+            # Direction is kept as the device sent it, zero padding included.
+            matches = actual.isdigit() and int(actual) == value
+        elif isinstance(value, Decimal):
+            # Coordinates have 6 decimal places and speed has 2, only rounding of the last one may differ on ties.
+            places = 2 if name == 'speed' else 6
+            matches = abs(Decimal(repr(actual)) - value) <= Decimal(5) / 10 ** (places + 1) and round(actual, places) == actual
+        else:
+            matches = actual == value
+
+        if not matches:
+            mismatches.append(f'{name}: {value} != {actual!r}')
+
+    return mismatches
+
+
+def decode_or_exception(decoder: Callable[[bytes], object], record: bytes) -> object:
+    try:
+        return decoder(record)
+    except Exception as e:
+        return (e.__class__, str(e))
+
+
+class Report:
+    """Counts of checked records and failures of every check, prints the first failures of each."""
+
+    def __init__(self) -> None:
+        self.checked: Counter = Counter()
+        self.failed: Counter = Counter()
+
+    def check(self, name: str, ok: bool, record: bytes, details: object = '') -> None:
+        self.checked[name] += 1
+
+        if not ok:
+            self.failed[name] += 1
+
+            if self.failed[name] <= MAX_REPORTED:
+                print(f'FAIL {name} {record!r}\n  {details}')
+
+
+def check_round_trip(report: Report, rng: random.Random, records: int, ascii_decoder: Callable, binary_decoder: Callable) -> Tuple[List[bytes], List[bytes]]:
+    """Check that records decode to values they were encoded from, return the records."""
+    ascii_records = []
+    binary_records = []
+
+    for _ in range(records):
+        fix = generate_fix(rng)
+        record = encode_ascii_record(rng, fix)
+        ascii_records.append(record)
+
+        for name, decoder in (('round trip ascii', ascii_decoder), ('round trip ascii regex', decode_h02_ascii_packet_regex)):
+            payload = decode_or_exception(decoder, record)
+
+            if isinstance(payload, tuple):
+                report.check(name, False, record, payload)
+            else:
+                mismatches = field_mismatches(expected_fields(fix, False), payload)
+                # Raw data is the whole record as text, trailing newline included.
+                if payload.raw_data != record.decode():
+                    mismatches.append(f'raw_data: {record.decode()!r} != {payload.raw_data!r}')
+                report.check(name, not mismatches, record, mismatches)
+
+        fix = generate_fix(rng, binary=True)
+        record = encode_binary_record(rng, fix)
+        binary_records.append(record)
+        payload = decode_or_exception(binary_decoder, record)
+
+        if isinstance(payload, tuple):
+            report.check('round trip binary', False, record, payload)
+        else:
+            mismatches = field_mismatches(expected_fields(fix, True), payload)
+            report.check('round trip binary', not mismatches, record, mismatches)
+
+    return ascii_records, binary_records
+
+
+def check_corrupted(report: Report, rng: random.Random, ascii_records: List[bytes], binary_records: List[bytes], ascii_decoder: Callable, binary_decoder: Callable) -> Tuple[List[bytes], List[bytes]]:
+    """Check decoders on corrupted and truncated records, return the corrupted records."""
+    corrupted_ascii = [corrupt_packet(rng, record) for record in ascii_records]
+    # Binary records are mostly corrupted in place, like bit errors, a `$` record cut short is the rest.
+    corrupted_binary = [
+        record[:rng.randrange(len(record))] if rng.random() < 0.2 else corrupt_packet(rng, record)[:BINARY_RECORD_LENGTH].ljust(BINARY_RECORD_LENGTH, b'\0')
+        for record in binary_records
+    ]
+
+    for record in corrupted_ascii:
+        actual = decode_or_exception(ascii_decoder, record)
+        expected = decode_or_exception(decode_h02_ascii_packet_regex, record)
+        report.check('differential ascii', actual == expected, record, f'regex: {expected}\n  tested: {actual}')
+        report.check('exceptions ascii', not isinstance(actual, tuple) or issubclass(actual[0], EXPECTED_EXCEPTIONS), record, actual)
+
+    for record in corrupted_binary:
+        actual = decode_or_exception(binary_decoder, record)
+        report.check('exceptions binary', not isinstance(actual, tuple) or issubclass(actual[0], EXPECTED_EXCEPTIONS), record, actual)
+
+    if numpy is not None:
+        complete = [record for record in binary_records + corrupted_binary if len(record) == BINARY_RECORD_LENGTH]
+        batch = decode_h02_binary_records(b''.join(complete))
+        # Batch only yields well-formed records, unlike the binary decoder it also checks the leading `$`.
+        bulk_payloads = iter(batch)
+
+        for record, malformed in zip(complete, batch.malformed.tolist()):
+            payload = decode_or_exception(binary_decoder, record)
+            rejected = isinstance(payload, tuple) or record[0] != ord('$')
+            bulk_payload = None if malformed else next(bulk_payloads)
+            report.check('differential bulk', rejected == malformed and (rejected or payload == bulk_payload), record, f'binary: {payload}\n  bulk: {bulk_payload}')
+
+    return corrupted_ascii, corrupted_binary
+
+
+def split_garbage(chunks: List[bytes]) -> Tuple[List[bytes], bytes]:
+    """Return records among framed `chunks` and bytes of the rest without record separators."""
+    records = [chunk for chunk in chunks if chunk[:1] in (b'*', b'$')]
+    garbage = b''.join(chunk for chunk in chunks if chunk[:1] not in (b'*', b'$'))
+
+    return records, garbage.replace(b'\r', b'').replace(b'\n', b'')
+
+
+def check_framing(report: Report, rng: random.Random, ascii_records: List[bytes], binary_records: List[bytes]) -> None:
+    """Check that records are framed the same no matter how the stream is split into reads."""
+    records = ascii_records + binary_records
+    rng.shuffle(records)
+    stream = bytearray()
+    sent = []
+
+    for record in records:
+        if rng.random() < 0.05:
+            # Garbage between records, framer returns it as a chunk of its own.
+            stream += bytes(rng.choice(b'0123456789,.#ABC\r\n') for _ in range(rng.randint(1, 20)))
+
+        stream += record
+        # Newline after `#` is a separator, not a part of the record.
+        sent.append(record[:-1] if record[:1] == b'*' and record.endswith(b'#\n') else record)
+
+    whole = H02RecordFramer().feed(bytes(stream))
+    framer = H02RecordFramer()
+    chunked = []
+    position = 0
+
+    while position < len(stream):
+        size = rng.choice((1, rng.randint(1, 64), rng.randint(1, 4096)))
+        chunked += framer.feed(bytes(stream[position:position + size]))
+        position += size
+
+    # Garbage is returned up to the end of what was read so far, only its bytes have to match, not its chunks.
+    whole_records, whole_garbage = split_garbage(whole)
+    chunked_records, chunked_garbage = split_garbage(chunked)
+    report.check('framing reads', chunked_records == whole_records and chunked_garbage == whole_garbage, bytes(stream[:200]), f'{len(whole_records)} records when read at once, {len(chunked_records)} in chunks')
+    framed = iter(whole_records)
+    report.check('framing records', all(record in framed for record in sent), bytes(stream[:200]), 'records are missing or out of order')
+    # A `$` record cut short stays buffered until the rest of it is read.
+    partial = H02RecordFramer()
+    report.check('framing partial', partial.feed(binary_records[0][:-1]) == [] and partial.feed(binary_records[0][-1:]) == [binary_records[0]], binary_records[0])
+
+
+def check_matching(report: Report, rng: random.Random, ascii_records: List[bytes], binary_records: List[bytes], corrupted: List[bytes]) -> None:
+    """Check that protocol identification never raises and tells H02 records apart from other bytes."""
+    for record in ascii_records + binary_records:
+        report.check('matching records', decode_or_exception(registry.match, record) is H02Protocol, record)
+
+    for record in corrupted + [rng.randbytes(rng.randint(0, 64)) for _ in range(len(corrupted))]:
+        prefix = record[:rng.randint(0, len(record))]
+        protocol = decode_or_exception(registry.match, prefix)
+        expected = H02Protocol if prefix.startswith(b'*HQ,') or (prefix.startswith(b'$') and len(prefix) >= BINARY_RECORD_LENGTH) else None
+        report.check('matching bytes', protocol is expected, prefix, protocol)
+
+
+def benchmark(decoder: Callable[[bytes], object], corpus: List[bytes], repeat: int) -> float:
+    """Return records/sec of `decoder` on `corpus`, records it rejects included."""
+    started = time.perf_counter()
+
+    for _ in range(repeat):
+        for record in corpus:
+            try:
+                decoder(record)
+            except EXPECTED_EXCEPTIONS:
+                pass
+
+    return len(corpus) * repeat / (time.perf_counter() - started)
+
+
+def load_decoder(path: str) -> Callable[[bytes], object]:
+    """Import `module:function`, modules are looked up in `station/` like station code does."""
+    module, _, function = path.partition(':')
+    return getattr(importlib.import_module(module), function)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--records', type=int, default=10_000, help='records of each mode generated per round')
+    parser.add_argument('--rounds', type=int, default=1, help='rounds of checks, each with new records')
+    parser.add_argument('--repeat', type=int, default=3, help='benchmark passes over records of the first round')
+    parser.add_argument('--ascii-decoder', default='protocols.h02.packet_decoder.decoders.ascii_decoder:decode_h02_ascii_packet')
+    parser.add_argument('--binary-decoder', default='protocols.h02.packet_decoder.decoders.binary_decoder:decode_h02_binary_packet')
+    parser.add_argument('--output', help='write correctness counts and records/sec of every decoder to a JSON file')
+    parser.add_argument('--compare', help='JSON file written by `--output` (e.g. on another commit) to compare throughput with')
+    args = parser.parse_args()
+
+    ascii_decoder = load_decoder(args.ascii_decoder)
+    binary_decoder = load_decoder(args.binary_decoder)
+    report = Report()
+    corpora: Dict[str, Tuple[Callable, List[bytes]]] = {}
+
+    for round_number in range(args.rounds):
+        rng = random.Random(f'{args.seed}-{round_number}')
+        failed_before = sum(report.failed.values())
+        ascii_records, binary_records = check_round_trip(report, rng, args.records, ascii_decoder, binary_decoder)
+        corrupted_ascii, corrupted_binary = check_corrupted(report, rng, ascii_records, binary_records, ascii_decoder, binary_decoder)
+        check_framing(report, rng, ascii_records, binary_records)
+        check_matching(report, rng, ascii_records, binary_records, corrupted_ascii + corrupted_binary)
+
+        if sum(report.failed.values()) > failed_before:
+            print(f'round {round_number} of seed {args.seed} failed, rerun with `--seed {args.seed} --rounds {round_number + 1}`')
+
+        if not corpora:
+            corpora = {
+                'regex': (decode_h02_ascii_packet_regex, ascii_records),
+                'ascii': (ascii_decoder, ascii_records),
+                'binary': (binary_decoder, binary_records),
+                'regex corrupted': (decode_h02_ascii_packet_regex, corrupted_ascii),
+                'ascii corrupted': (ascii_decoder, corrupted_ascii),
+                'binary corrupted': (binary_decoder, corrupted_binary),
+            }
+
+    for name in report.checked:
+        print(f'{name:>24}: {report.checked[name]:,} checked, {report.failed[name]:,} failed')
+
+    baseline: Dict[str, float] = {}
+    results: Dict[str, object] = {'checked': dict(report.checked), 'failed': dict(report.failed), 'records_per_second': {}}
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)['records_per_second']
+
+    for name, (decoder, corpus) in corpora.items():
+        rate = results['records_per_second'][name] = benchmark(decoder, corpus, args.repeat)
+        change = f' ({rate / baseline[name] - 1:+.1%})' if name in baseline else ''
+        print(f'{name:>24}: {rate:,.0f} records/sec{change}')
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    if report.failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,359 @@
+"""Load generator that simulates a fleet of H02 devices connected to a running station.
+
+Every simulated device keeps its own connection (reconnecting when station closes it) and sends records
+with its own IMEI at a configurable rate: ASCII and binary mode ones, sometimes several of them in a single
+write (like devices flushing their buffer), sometimes a record split across writes and now and then a malformed one.
+Latency of every acknowledgement (`R12`) is measured from the moment the record started being written.
+
+Unless disabled, an HTTP stub backend (see `stub_sinks.py`) is served in the same process and payloads it receives
+are counted, so sustained throughput is what actually reached the backend. RSS and CPU usage of the station's
+processes (the one given with `--pid` and its children, i.e. workers) are sampled from `/proc`.
+
+    BACKEND_BATCH_URL=http://127.0.0.1:8765/batch GPS_STATION_PORT=8090 python station/main.py &
+    python tools/load_fleet.py --port 8090 --devices 5000 --rate 1 --duration 60 --pid $!
+
+Run from the repository root: `python tools/load_fleet.py --help`
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import sys
+import time
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from typing import Deque, Dict, List
+
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import stub_sinks  # noqa: E402
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+# Latencies kept for percentiles of the whole run, a uniform sample of them is kept beyond it.
+LATENCY_SAMPLE_SIZE = 1_000_000
+
+
+@dataclass
+class FleetStats:
+    sent: int = 0
+    malformed: int = 0
+    acked: int = 0
+    connected: int = 0
+    connects: int = 0
+    connect_errors: int = 0
+    disconnects: int = 0
+    latencies: List[float] = field(default_factory=list)
+    window_latencies: List[float] = field(default_factory=list)
+    latencies_seen: int = 0
+
+    def record_latency(self, latency: float, rng: random.Random) -> None:
+        self.window_latencies.append(latency)
+        self.latencies_seen += 1
+
+        if len(self.latencies) < LATENCY_SAMPLE_SIZE:
+            self.latencies.append(latency)
+        else:
+            index = rng.randrange(self.latencies_seen)
+
+            if index < LATENCY_SAMPLE_SIZE:
+                self.latencies[index] = latency
+
+
+class SimulatedDevice:
+    """A single device moving around and reporting its position."""
+
+    def __init__(self, index: int, args: argparse.Namespace) -> None:
+        self.args = args
+        self.rng = random.Random(args.seed * 1_000_003 + index)
+        self.imei = f'{4_100_000_000 + index:010d}'
+        self.binary = self.rng.random() < args.binary_ratio
+        self.latitude = self.rng.uniform(-60, 60)
+        self.longitude = self.rng.uniform(-170, 170)
+        self.seconds = self.rng.randrange(86_400)
+
+    def next_record(self) -> bytes:
+        """Move device a bit and return its next record."""
+        self.seconds = (self.seconds + max(int(1 / self.args.rate), 1)) % 86_400
+        self.latitude = min(max(self.latitude + self.rng.uniform(-0.001, 0.001), -89.0), 89.0)
+        self.longitude = min(max(self.longitude + self.rng.uniform(-0.001, 0.001), -179.0), 179.0)
+        hours, rest = divmod(self.seconds, 3600)
+        clock = f'{hours:02d}{rest // 60:02d}{rest % 60:02d}'
+        latitude = f'{int(abs(self.latitude)):02d}{abs(self.latitude) % 1 * 60:07.4f}'
+        longitude = f'{int(abs(self.longitude)):03d}{abs(self.longitude) % 1 * 60:07.4f}'
+
+        if self.binary:
+            # `$`, then IMEI, time, date, latitude, battery, longitude with flags nibble, speed and direction as BCD, then status bytes.
+            digits = (
+                f'{self.imei}{clock}181023{latitude.replace(".", "")}99{longitude.replace(".", "")}'
+                f'{(self.longitude >= 0) << 3 | (self.latitude >= 0) << 2 | 2:x}{self.rng.randint(0, 120):03d}{self.rng.randint(0, 359):03d}'
+            )
+            return b'$' + bytes.fromhex(digits) + b'\xff\xff\xfb\xff\x00\x00\x00\x00\x01\x1a\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00'
+
+        return (
+            f'*HQ,{self.imei},V1,{clock},A,{latitude},{"N" if self.latitude >= 0 else "S"},{longitude},{"E" if self.longitude >= 0 else "W"},'
+            f'{self.rng.randint(0, 120):03d}.{self.rng.randint(0, 99):02d},{self.rng.randint(0, 359)},181023,FFFFFBFF,282,01,0,0,6#'
+        ).encode()
+
+    def malformed_record(self) -> bytes:
+        return f'*HQ,{self.imei},V1,{"".join(self.rng.choices("XYZ!?", k=12))}#'.encode()
+
+    async def run(self, stats: FleetStats, stop: asyncio.Event) -> None:
+        args = self.args
+        # Devices do not connect (or report) all at the same moment.
+        await asyncio.sleep(self.rng.uniform(0, args.ramp_up))
+
+        while not stop.is_set():
+            try:
+                reader, writer = await asyncio.open_connection(args.host, args.port)
+            except OSError:
+                stats.connect_errors += 1
+                await asyncio.sleep(1.0)
+                continue
+
+            stats.connects += 1
+            stats.connected += 1
+            pending: Deque[float] = deque()
+            ack_task = asyncio.create_task(self.read_acks(reader, pending, stats))
+
+            try:
+                await self.send_records(writer, pending, stats, stop, ack_task)
+            except (ConnectionError, OSError):
+                pass
+            finally:
+                stats.connected -= 1
+                ack_task.cancel()
+                writer.close()
+
+            if not stop.is_set():
+                stats.disconnects += 1
+                await asyncio.sleep(self.rng.uniform(0.5, 2.0))
+
+    async def send_records(self, writer: asyncio.StreamWriter, pending: Deque[float], stats: FleetStats, stop: asyncio.Event, ack_task: asyncio.Task) -> None:
+        args = self.args
+
+        while not stop.is_set() and not ack_task.done():
+            count = self.rng.randint(2, args.coalesce) if args.coalesce > 1 and self.rng.random() < args.coalesce_ratio else 1
+            records = []
+            started_at = time.perf_counter()
+
+            for _ in range(count):
+                if self.rng.random() < args.malformed_ratio:
+                    records.append(self.malformed_record())
+                    stats.malformed += 1
+                else:
+                    records.append(self.next_record())
+                    pending.append(started_at)
+                    stats.sent += 1
+
+            data = b''.join(records)
+
+            if self.rng.random() < args.fragment_ratio:
+                split = self.rng.randrange(1, len(data))
+                writer.write(data[:split])
+                await writer.drain()
+                await asyncio.sleep(self.rng.uniform(0.001, 0.05))
+                writer.write(data[split:])
+            else:
+                writer.write(data)
+
+            await writer.drain()
+            await asyncio.sleep(count / args.rate * self.rng.uniform(0.9, 1.1))
+
+    async def read_acks(self, reader: asyncio.StreamReader, pending: Deque[float], stats: FleetStats) -> None:
+        buffer = b''
+
+        while True:
+            data = await reader.read(4096)
+
+            if not data:
+                return
+
+            *acks, buffer = (buffer + data).split(b'#')
+            now = time.perf_counter()
+
+            for ack in acks:
+                if b',R12,' in ack and pending:
+                    stats.acked += 1
+                    stats.record_latency(now - pending.popleft(), self.rng)
+
+
+def read_process(pid: int) -> tuple:
+    """Return CPU seconds and resident memory in bytes of a process."""
+    with open(f'/proc/{pid}/stat') as file:
+        fields = file.read().rsplit(')', 1)[1].split()
+
+    with open(f'/proc/{pid}/statm') as file:
+        resident_pages = int(file.read().split()[1])
+
+    return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS, resident_pages * PAGE_SIZE
+
+
+def station_processes(pid: int) -> List[int]:
+    """Return `pid` and pids of its children, e.g. supervisor and its workers."""
+    children = []
+
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+
+        try:
+            with open(f'/proc/{entry}/stat') as file:
+                parent = int(file.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, ValueError):
+            continue
+
+        if parent == pid:
+            children.append(int(entry))
+
+    return [pid, *sorted(children)]
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+
+    values = sorted(values)
+    return {f'p{p}': values[min(int(len(values) * p / 100), len(values) - 1)] * 1000 for p in (50, 95, 99, 99.9)}
+
+
+def format_percentiles(values: List[float]) -> str:
+    return ' '.join(f'{name}={value:.1f}ms' for name, value in percentiles(values).items()) or 'no acks'
+
+
+async def report(args: argparse.Namespace, stats: FleetStats, stop: asyncio.Event, results: Dict) -> None:
+    started_at = previous_at = time.perf_counter()
+    previous_sent = previous_acked = previous_received = 0
+    previous_cpu: Dict[int, float] = {}
+    samples: Dict[int, List[tuple]] = {}
+
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), args.interval)
+        except asyncio.TimeoutError:
+            pass
+
+        now = time.perf_counter()
+        elapsed = now - previous_at
+        received = stub_sinks.received['http']
+        line = (
+            f'[{now - started_at:6.1f}s] devices {stats.connected}, sent {(stats.sent - previous_sent) / elapsed:,.0f}/s, '
+            f'acked {(stats.acked - previous_acked) / elapsed:,.0f}/s, ack {format_percentiles(stats.window_latencies)}'
+        )
+
+        if args.stub_port:
+            line += f', backend {(received - previous_received) / elapsed:,.0f}/s'
+
+        if args.pid:
+            for pid in station_processes(args.pid):
+                try:
+                    cpu, rss = read_process(pid)
+                except OSError:
+                    continue
+
+                if pid in previous_cpu:
+                    cpu_percent = (cpu - previous_cpu[pid]) / elapsed * 100
+                    samples.setdefault(pid, []).append((cpu_percent, rss))
+                    line += f', pid {pid} cpu {cpu_percent:.0f}% rss {rss / 1_048_576:.0f}MB'
+
+                previous_cpu[pid] = cpu
+
+        print(line, flush=True)
+        previous_at, previous_sent, previous_acked, previous_received = now, stats.sent, stats.acked, received
+        stats.window_latencies = []
+
+    elapsed = time.perf_counter() - started_at
+    results.update({
+        'devices': args.devices,
+        'duration': elapsed,
+        'sent_per_second': stats.sent / elapsed,
+        'acked_per_second': stats.acked / elapsed,
+        'backend_per_second': stub_sinks.received['http'] / elapsed if args.stub_port else None,
+        'ack_latency_ms': percentiles(stats.latencies),
+        'processes': {
+            pid: {
+                'cpu_percent': sum(cpu for cpu, _ in values) / len(values),
+                'max_rss_bytes': max(rss for _, rss in values),
+            }
+            for pid, values in samples.items()
+        },
+        **{name: value for name, value in asdict(stats).items() if not isinstance(value, list)},
+    })
+
+
+async def start_stub_backend(host: str, port: int) -> web.AppRunner:
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app.router.add_post('/{path:.*}', stub_sinks.handle_batch)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1', help='station address')
+    parser.add_argument('--port', type=int, default=8090, help='station port')
+    parser.add_argument('--devices', type=int, default=1000)
+    parser.add_argument('--rate', type=float, default=0.2, help='records per second of every device')
+    parser.add_argument('--duration', type=float, default=30.0, help='seconds to run for after ramp up')
+    parser.add_argument('--ramp-up', type=float, default=5.0, help='seconds over which devices connect')
+    parser.add_argument('--binary-ratio', type=float, default=0.2, help='share of devices using binary mode')
+    parser.add_argument('--coalesce', type=int, default=5, help='maximum records in a single write')
+    parser.add_argument('--coalesce-ratio', type=float, default=0.05, help='share of writes carrying several records')
+    parser.add_argument('--fragment-ratio', type=float, default=0.05, help='share of writes split in two')
+    parser.add_argument('--malformed-ratio', type=float, default=0.001, help='share of malformed records')
+    parser.add_argument('--stub-port', type=int, default=8765, help='port of in-process stub backend, 0 to not start it')
+    parser.add_argument('--pid', type=int, help='pid of the station, its children are sampled too')
+    parser.add_argument('--interval', type=float, default=5.0, help='seconds between reports')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='write results to a JSON file, to compare them across commits')
+    args = parser.parse_args()
+
+    # Every device is a socket, default soft limit of 1024 descriptors is not enough.
+    soft_limit, hard_limit = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard_limit, hard_limit))
+
+    if args.devices + 100 > hard_limit:
+        print(f'Open file limit is {hard_limit}, not enough for {args.devices} devices.', file=sys.stderr)
+
+    runner = await start_stub_backend('127.0.0.1', args.stub_port) if args.stub_port else None
+    stats = FleetStats()
+    stop = asyncio.Event()
+    results: Dict = {}
+    devices = [SimulatedDevice(index, args) for index in range(args.devices)]
+    tasks = [asyncio.create_task(device.run(stats, stop)) for device in devices]
+    reporter = asyncio.create_task(report(args, stats, stop, results))
+
+    try:
+        await asyncio.sleep(args.ramp_up + args.duration)
+    finally:
+        stop.set()
+        await reporter
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        if runner is not None:
+            await runner.cleanup()
+
+    print(
+        f'\n{results["devices"]} devices for {results["duration"]:.0f}s: sent {results["sent_per_second"]:,.0f}/s, '
+        f'acked {results["acked_per_second"]:,.0f}/s, ack latency {format_percentiles(stats.latencies)}'
+        + (f', backend {results["backend_per_second"]:,.0f}/s' if args.stub_port else '')
+        + f', disconnects {stats.disconnects}, connect errors {stats.connect_errors}'
+    )
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+
+if __name__ == '__main__':
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
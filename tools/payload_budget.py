@@ -0,0 +1,98 @@
+"""Memory budget of in-flight location payloads and cost of serializing them.
+
+Decodes a corpus of H02 packets, keeps the payloads alive the way the uplink queue does during a burst
+and reports retained bytes and allocated blocks per payload, size of each serialized form and payloads/sec
+of the JSON and MessagePack serializers. Exits with status 1 if a payload retains more memory than its budget,
+so regressions (e.g. a payload class losing its `__slots__`) show up before they reach production.
+
+Run from the repository root: `python tools/payload_budget.py`
+"""
+
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+from typing import Callable, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'station'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_decoders import generate_ascii_packet, generate_binary_packet, generate_device  # noqa: E402
+from protocols.h02.packet_decoder.decoders.ascii_decoder import decode_h02_ascii_packet  # noqa: E402
+from protocols.h02.packet_decoder.decoders.binary_decoder import decode_h02_binary_packet  # noqa: E402
+
+# Bytes retained by a single decoded payload, including its field values and raw data.
+ASCII_PAYLOAD_BUDGET = 1_200
+BINARY_PAYLOAD_BUDGET = 900
+
+
+def measure_retained(decoder: Callable[[bytes], object], packets: List[bytes]) -> tuple:
+    """Return bytes and memory blocks retained per payload while all of them are alive."""
+    gc.collect()
+    tracemalloc.start()
+    blocks_before = sys.getallocatedblocks()
+    before, _ = tracemalloc.get_traced_memory()
+
+    payloads = [decoder(packet) for packet in packets]
+
+    after, _ = tracemalloc.get_traced_memory()
+    blocks_after = sys.getallocatedblocks()
+    tracemalloc.stop()
+
+    # List holding the payloads is not part of their cost.
+    list_size = sys.getsizeof(payloads)
+    count = len(payloads)
+    del payloads
+
+    return (after - before - list_size) / count, (blocks_after - blocks_before - 1) / count
+
+
+def benchmark(serializer: Callable[[], bytes], repeat: int) -> float:
+    started = time.perf_counter()
+
+    for _ in range(repeat):
+        serializer()
+
+    return repeat / (time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--packets', type=int, default=100_000, help='number of payloads kept in flight')
+    parser.add_argument('--devices', type=int, default=0, help='draw IMEI, status and cell of packets from this many devices, 0 for random ones')
+    parser.add_argument('--repeat', type=int, default=100_000, help='serializer calls per benchmark')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    devices = [generate_device(rng) for _ in range(args.devices)]
+    over_budget = False
+
+    for name, generate, decoder, budget in (
+        ('ascii', generate_ascii_packet, decode_h02_ascii_packet, ASCII_PAYLOAD_BUDGET),
+        ('binary', generate_binary_packet, decode_h02_binary_packet, BINARY_PAYLOAD_BUDGET),
+    ):
+        packets = [generate(rng, devices) for _ in range(args.packets)]
+        retained_bytes, retained_blocks = measure_retained(decoder, packets)
+        payload = decoder(packets[0])
+
+        print(f'{name}:')
+        print(f'  retained per payload: {retained_bytes:,.0f} bytes in {retained_blocks:.1f} blocks (budget {budget:,} bytes)')
+        print(f'  {args.packets:,} payloads in flight: {retained_bytes * args.packets / 1_000_000:,.1f} MB')
+        print(f'  serialized: json {len(payload.to_json())} bytes, msgpack {len(payload.to_msgpack())} bytes')
+        print(f'  to_json: {benchmark(payload.to_json, args.repeat):,.0f} payloads/sec')
+        print(f'  to_msgpack: {benchmark(payload.to_msgpack, args.repeat):,.0f} payloads/sec')
+
+        if retained_bytes > budget:
+            over_budget = True
+            print(f'  OVER BUDGET by {retained_bytes - budget:,.0f} bytes')
+
+    if over_budget:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+"""Replay raw traffic captured by the station (see `CAPTURE_DIR`) through the H02 decoder and, optionally, the uplink.
+
+Records of every captured connection are put back together with the same framer the station uses and decoded
+with `H02PacketDecoder`; decode errors are counted by exception and can be printed with the offending bytes.
+Captures of several runs (and workers) are merged by timestamp and replayed either at maximum speed or paced
+like the original traffic (`--speed 1` for real time, `--speed 10` for ten times faster).
+
+Without `--sink` payloads are only decoded, which makes a replay a throughput regression test on real traffic.
+With one or more `--sink` URLs payloads are delivered like the station delivers them (queue settings are read from
+the same environment variables, `--pipeline` also puts enabled pipeline stages in front), e.g. to backfill a sink
+after an outage. Connections are sharded between `--processes` worker processes by connection.
+
+Run from the repository root: `python tools/replay_capture.py captures/ --processes 4`
+"""
+
+import argparse
+import asyncio
+import heapq
+import multiprocessing
+import os
+import sys
+import time
+import zlib
+from collections import Counter
+from typing import Dict, Iterator, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'station'))
+
+from capture import CaptureRecord, read_segment, SEGMENT_SUFFIX, RECEIVED, CLOSED  # noqa: E402
+from main import create_pipeline, create_uplink  # noqa: E402
+from matcher import match_protocol  # noqa: E402
+from protocols import H02Protocol  # noqa: E402
+from protocols.exceptions import RegExMatchError, BadProtocolError  # noqa: E402
+from protocols.h02.commands import parse_h02_reply  # noqa: E402
+from protocols.h02.framer import H02RecordFramer  # noqa: E402
+from protocols.h02.packet_decoder import H02PacketDecoder  # noqa: E402
+
+
+def find_runs(paths: List[str]) -> Dict[str, List[str]]:
+    """Return segment files of every capture run found in `paths` (files or directories), in order."""
+    segments: List[str] = []
+
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, _, filenames in os.walk(path):
+                segments.extend(os.path.join(directory, filename) for filename in filenames if filename.endswith(SEGMENT_SUFFIX))
+        else:
+            segments.append(path)
+
+    runs: Dict[str, List[str]] = {}
+
+    # Segments are named `<run>-<sequence>.capture`, run is unique within a directory.
+    for segment in sorted(segments):
+        run = os.path.join(os.path.dirname(segment), os.path.basename(segment).rsplit('-', 1)[0])
+        runs.setdefault(run, []).append(segment)
+
+    return runs
+
+
+def read_run(run: str, segments: List[str]) -> Iterator[Tuple[float, str, CaptureRecord]]:
+    for segment in segments:
+        with open(segment, 'rb') as file:
+            for record in read_segment(file):
+                yield record.timestamp, run, record
+
+
+async def replay(shard: int, args: argparse.Namespace) -> Dict:
+    """Replay connections of a single shard and return counters describing the replay."""
+    runs = find_runs(args.paths)
+    uplink = None
+
+    if args.sink:
+        uplink = create_uplink(args.sink)
+
+        if args.pipeline:
+            uplink = create_pipeline(uplink)
+
+        await uplink.start()
+
+    decoder = H02PacketDecoder()
+    framers: Dict[Tuple[str, int], H02RecordFramer | None] = {}
+    counters: Counter = Counter()
+    errors: Counter = Counter()
+    started_at = time.perf_counter()
+    first_timestamp = None
+
+    # Records of all runs are merged by timestamp, so pacing follows the original traffic of all workers at once.
+    for timestamp, run, record in heapq.merge(*(read_run(run, segments) for run, segments in runs.items()), key=lambda item: item[0]):
+        key = (run, record.connection_id)
+
+        if args.processes > 1 and zlib.crc32(f'{run}:{record.connection_id}'.encode()) % args.processes != shard:
+            continue
+
+        if args.speed > 0:
+            if first_timestamp is None:
+                first_timestamp = timestamp
+
+            delay = (timestamp - first_timestamp) / args.speed - (time.perf_counter() - started_at)
+
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        if record.kind == CLOSED:
+            framers.pop(key, None)
+            continue
+
+        if record.kind != RECEIVED or not record.data:
+            continue
+
+        counters['bytes'] += len(record.data)
+
+        if key not in framers:
+            counters['connections'] += 1
+            # Like the station, connections whose first bytes are not H02 are not decoded at all.
+            framers[key] = H02RecordFramer() if match_protocol(record.data) is H02Protocol else None
+
+        framer = framers[key]
+
+        if framer is None:
+            counters['unidentified'] += 1
+            continue
+
+        for raw_record in framer.feed(record.data):
+            if parse_h02_reply(raw_record) is not None:
+                counters['replies'] += 1
+                continue
+
+            try:
+                payload = decoder.decode(raw_record)
+            except (RegExMatchError, BadProtocolError, UnicodeDecodeError) as e:
+                errors[e.__class__.__name__] += 1
+
+                if args.show_errors:
+                    print(f'{e.__class__.__name__}: {e} ({run}, connection {record.connection_id}) {list(raw_record)}')
+
+                continue
+
+            counters['decoded'] += 1
+
+            if uplink is not None:
+                await uplink.put(payload)
+
+    if uplink is not None:
+        await uplink.close()
+        counters.update({f'uplink_{name}': value for name, value in uplink.stats().items() if name != 'max_depth'})
+
+    counters['seconds'] = time.perf_counter() - started_at
+    return {'counters': counters, 'errors': errors}
+
+
+def run_shard(shard: int, args: argparse.Namespace) -> Dict:
+    return asyncio.run(replay(shard, args))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='+', help='capture segment files or directories with them')
+    parser.add_argument('--speed', type=float, default=0.0, help='pace replay like the original traffic, N times faster, 0 for maximum speed')
+    parser.add_argument('--processes', type=int, default=1, help='worker processes connections are sharded between')
+    parser.add_argument('--sink', action='append', default=[], help='URL of a sink to deliver payloads to (see UPLINK_SINKS), can be repeated')
+    parser.add_argument('--pipeline', action='store_true', help='put pipeline stages enabled in the environment in front of sinks')
+    parser.add_argument('--show-errors', action='store_true', help='print every record that could not be decoded')
+    args = parser.parse_args()
+
+    started_at = time.perf_counter()
+
+    if args.processes > 1:
+        with multiprocessing.get_context('spawn').Pool(args.processes) as pool:
+            results = pool.starmap(run_shard, [(shard, args) for shard in range(args.processes)])
+    else:
+        results = [run_shard(0, args)]
+
+    elapsed = time.perf_counter() - started_at
+    counters: Counter = Counter()
+    errors: Counter = Counter()
+
+    for result in results:
+        counters.update({name: value for name, value in result['counters'].items() if name != 'seconds'})
+        errors.update(result['errors'])
+
+    print(
+        f'{counters["connections"]:,} connections, {counters["bytes"]:,} bytes, {counters["decoded"]:,} decoded '
+        f'({counters["decoded"] / elapsed:,.0f}/s over {elapsed:.1f}s with {args.processes} processes), '
+        f'{counters["replies"]:,} command replies, {sum(errors.values()):,} errors {dict(errors) if errors else ""}'
+    )
+
+    if args.sink:
+        print(', '.join(f'{name}: {value:,}' for name, value in sorted(counters.items()) if name.startswith('uplink_')))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,137 @@
+"""Local stand-ins for every kind of sink the station can deliver payloads to.
+
+Serves an HTTP batch endpoint, a RESP server that understands `XADD` (and `PING`) and a Unix socket
+that reads newline-delimited JSON, then prints how many payloads each of them received every second.
+Every received payload is checked to be a valid JSON object. Point the station at them with e.g.:
+
+    UPLINK_SINKS=http://127.0.0.1:8765/batch,redis://127.0.0.1:6390/locations,unix:///tmp/gps-station.sock,file:///tmp/gps-station.ndjson
+
+Run from the repository root: `python tools/stub_sinks.py`
+"""
+
+import argparse
+import asyncio
+import json
+import os
+from collections import Counter
+
+from aiohttp import web
+
+received: Counter = Counter()
+errors: Counter = Counter()
+
+
+async def handle_batch(request: web.Request) -> web.Response:
+    try:
+        payloads = json.loads(await request.read())
+        assert isinstance(payloads, list) and all(isinstance(payload, dict) for payload in payloads)
+    except (ValueError, AssertionError):
+        errors['http'] += 1
+        return web.Response(status=400)
+
+    received['http'] += len(payloads)
+    return web.Response(status=201)
+
+
+async def read_command(reader: asyncio.StreamReader) -> list:
+    header = await reader.readuntil(b'\r\n')
+
+    if not header.startswith(b'*'):
+        raise ValueError(f'Expected a RESP array, got {header!r}')
+
+    arguments = []
+
+    for _ in range(int(header[1:-2])):
+        length = await reader.readuntil(b'\r\n')
+        arguments.append((await reader.readexactly(int(length[1:-2]) + 2))[:-2])
+
+    return arguments
+
+
+async def handle_resp(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    sequence = 0
+
+    try:
+        while True:
+            command = await read_command(reader)
+            name = command[0].upper()
+
+            if name == b'PING':
+                writer.write(b'+PONG\r\n')
+            elif name == b'XADD':
+                try:
+                    assert isinstance(json.loads(command[-1]), dict)
+                except (ValueError, AssertionError):
+                    errors['redis'] += 1
+                    writer.write(b'-ERR payload is not a JSON object\r\n')
+                    continue
+
+                sequence += 1
+                entry_id = b'%d-%d' % (int(asyncio.get_running_loop().time() * 1000), sequence)
+                writer.write(b'$%d\r\n%s\r\n' % (len(entry_id), entry_id))
+                received['redis'] += 1
+            else:
+                writer.write(b'-ERR unknown command\r\n')
+
+            if writer.transport.get_write_buffer_size() > 65536:
+                await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def handle_unix(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        async for line in reader:
+            try:
+                assert isinstance(json.loads(line), dict)
+                received['unix'] += 1
+            except (ValueError, AssertionError):
+                errors['unix'] += 1
+    finally:
+        writer.close()
+
+
+async def report(interval: float) -> None:
+    previous: Counter = Counter()
+
+    while True:
+        await asyncio.sleep(interval)
+        rates = ', '.join(f'{name}: {received[name] - previous[name]}/{interval:g}s (total {received[name]})' for name in sorted(received))
+        print(rates or 'nothing received', f'errors: {dict(errors)}' if errors else '', flush=True)
+        previous = received.copy()
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--http-port', type=int, default=8765)
+    parser.add_argument('--resp-port', type=int, default=6390)
+    parser.add_argument('--unix-path', default='/tmp/gps-station.sock')
+    parser.add_argument('--interval', type=float, default=1.0, help='seconds between reports')
+    args = parser.parse_args()
+
+    app = web.Application(client_max_size=64 * 1024 * 1024)
+    app.router.add_post('/{path:.*}', handle_batch)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, args.host, args.http_port).start()
+
+    resp_server = await asyncio.start_server(handle_resp, args.host, args.resp_port)
+
+    if os.path.exists(args.unix_path):
+        os.remove(args.unix_path)
+
+    unix_server = await asyncio.start_unix_server(handle_unix, args.unix_path)
+    print(f'HTTP on http://{args.host}:{args.http_port}/, RESP on {args.host}:{args.resp_port}, Unix socket at {args.unix_path}', flush=True)
+
+    async with resp_server, unix_server:
+        await report(args.interval)
+
+
+if __name__ == '__main__':
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass